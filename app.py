@@ -4,42 +4,475 @@ Flask Web 服务器 - 颜色校正系统后端
 """
 
 import os
+import io
 import json
 import base64
+import shutil
+import zipfile
+import uuid
+import hashlib
+import tempfile
+import threading
 import numpy as np
 import cv2
 from io import BytesIO
-from flask import Flask, request, jsonify, send_file
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from flask import Flask, Request, request, jsonify, send_file, Response, stream_with_context, g
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from PIL import Image
 import traceback
 
-from src.pipeline import ColorCorrectionPipeline
+from src.metrics import REGISTRY, timed, resident_memory_bytes
+from src.pipeline import ColorCorrectionPipeline, PREVIEW_MAX_SIDE, downscale
 from src.color_checker_detector import ColorCheckerDetector
+from src.color_corrector import METHODS
 from src.color_space import ColorSpace
+from src.model_io import bake_lut, format_cube, serialize_model, model_fingerprint
+from src.profiles import get_default_registry
+from src.warmup import warm_up
+from src.color_difference import METRICS as DIFFERENCE_METRICS, SAMPLE_SIZE as DIFFERENCE_SAMPLE_SIZE
+from src.conversion_cache import ConversionCache
 
 # 初始化 Flask 应用
 app = Flask(__name__)
 CORS(app)
 
+
+class UploadRequest(Request):
+    """
+    单图像上传接口限制整个请求体的大小：Werkzeug 解析 multipart 时按该上限读取，
+    没有 Content-Length 的分块上传超出上限时同样在解析过程中中止 (抛出 RequestEntityTooLarge)
+    """
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'upload_image':
+            return MAX_FILE_SIZE + MULTIPART_OVERHEAD
+        return super().max_content_length
+
+
+app.request_class = UploadRequest
+
 # 配置
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'bmp', 'tiff'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MULTIPART_OVERHEAD = 64 * 1024  # multipart 边界和表单字段的余量
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 分块写入磁盘的大小
+OUTPUT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 编码结果缓存上限
+CONVERSION_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 目标图像 LAB 转换结果缓存上限
+DOWNLOAD_FORMATS = {
+    'jpg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'png': ('.png', 'image/png', None),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+MAX_BATCH_FILES = 500
+BATCH_MAX_WORKERS = os.cpu_count() or 4
+PROGRESSIVE_MAX_WORKERS = 2  # 渐进式校正的后台全分辨率校正线程数
+MAX_PROGRESSIVE_JOBS = 8  # 保留的渐进式校正任务数 (超出时丢弃最早的已结束任务)
 
 # 创建上传文件夹
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 运行指标
+HTTP_REQUESTS = REGISTRY.counter(
+    'color_correction_http_requests_total',
+    'HTTP 请求数',
+    ('endpoint', 'http_method', 'status')
+)
+CORRECTIONS = REGISTRY.counter(
+    'color_correction_corrections_total',
+    '按校正方法统计的校正请求数',
+    ('method',)
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'color_correction_requests_in_flight',
+    '正在处理的 HTTP 请求数'
+)
+BATCH_QUEUE_DEPTH = REGISTRY.gauge(
+    'color_correction_batch_queue_depth',
+    '批量接口中等待或正在校正的图像数'
+)
+RESIDENT_MEMORY = REGISTRY.gauge(
+    'process_resident_memory_bytes',
+    '进程常驻内存 (字节)'
+)
+RESIDENT_MEMORY.set_function(resident_memory_bytes)
+WARMUP_SECONDS = REGISTRY.gauge(
+    'color_correction_warmup_seconds',
+    '启动预热耗时 (秒)'
+)
+
+# 预热状态: pending / running / done，完成后附带 WarmupReport 的内容
+warmup_status = {'state': 'pending'}
+
 # 全局变量存储当前会话的数据
 session_data = {
     'calibration_image': None,
     'target_image': None,
     'pipeline': None,
-    'correction_method': 'polynomial'
+    'correction_method': 'polynomial',
+    'result_id': None
 }
 
 
+def warm_up_server():
+    """
+    启动预热：导入依赖、触发编解码首次调用、加载已注册的校准配置并预跑各校正方法
+    在开始接受请求前调用 (直接运行本文件时自动执行，WSGI 部署时设置 COLOR_CORRECT_WARMUP=1)
+    """
+    warmup_status.clear()
+    warmup_status['state'] = 'running'
+    report = warm_up(get_default_registry())
+    WARMUP_SECONDS.set(report.seconds)
+    warmup_status.update(report.to_dict())
+    warmup_status['state'] = 'done'
+    return report
+
+
+class OutputCache:
+    """
+    编码结果的 LRU 缓存
+    键为 (结果 id, 类型, 格式, 质量)，值为 (字节, 强 ETag)，按总字节数淘汰
+    """
+
+    def __init__(self, max_bytes=OUTPUT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data):
+        etag = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = (data, etag)
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data, etag
+
+    def get_or_create(self, key, producer):
+        """命中则直接返回，否则调用 producer() 生成字节并缓存"""
+        entry = self.get(key)
+        if entry is None:
+            entry = self.put(key, producer())
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+output_cache = OutputCache()
+
+# 同一目标图像依次尝试不同校正方法时复用 LAB 转换结果 (按图像内容区分，重新上传后旧结果按 LRU 淘汰)
+conversion_cache = ConversionCache(CONVERSION_CACHE_MAX_BYTES)
+
+# 渐进式校正: 预览图随校正请求返回，全分辨率校正在后台线程池中完成，按任务 id 查询
+progressive_executor = ThreadPoolExecutor(max_workers=PROGRESSIVE_MAX_WORKERS,
+                                          thread_name_prefix='color-progressive')
+progressive_jobs = OrderedDict()
+progressive_lock = threading.Lock()
+
+
+def encode_image_bytes(image_rgb, fmt='jpg', quality=None):
+    """将 RGB 图像编码为指定格式的字节"""
+    extension, _, quality_flag = DOWNLOAD_FORMATS[fmt]
+    params = [quality_flag, int(quality)] if quality_flag is not None and quality is not None else []
+    with timed('encode'):
+        ok, buffer = cv2.imencode(extension, cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise ValueError('图像编码失败')
+    return buffer.tobytes()
+
+
+def parse_download_options(args):
+    """
+    解析下载参数 format / quality
+
+    Returns:
+        (格式, 质量, 错误信息)
+    """
+    fmt = args.get('format', 'jpg').lower()
+    if fmt == 'jpeg':
+        fmt = 'jpg'
+    if fmt not in DOWNLOAD_FORMATS:
+        return None, None, f'不支持的格式: {fmt}'
+
+    quality = args.get('quality')
+    if quality is not None:
+        try:
+            quality = int(quality)
+        except ValueError:
+            return None, None, '质量参数必须是整数'
+        if not 1 <= quality <= 100:
+            return None, None, '质量参数范围为 1-100'
+    elif DOWNLOAD_FORMATS[fmt][2] is not None:
+        quality = 95
+
+    return fmt, quality, None
+
+
+LUT_FORMATS = {
+    'cube': ('text/plain', 'cube'),
+    'model': ('application/octet-stream', 'ccm'),
+}
+
+
+def parse_lut_options(args, pipeline=None):
+    """
+    解析 LUT 导出参数 format / size
+
+    Args:
+        pipeline: 导出的管道，用于检查其模型能否保存为二进制模型文件
+
+    Returns:
+        (格式, 尺寸, 错误信息)
+    """
+    fmt = args.get('format', 'cube').lower()
+    if fmt not in LUT_FORMATS:
+        return None, None, f'不支持的格式: {fmt}'
+    if fmt == 'model' and pipeline is not None and pipeline.corrector.method == 'auto':
+        return None, None, 'auto 方法的模型不能导出为模型文件，请使用 cube 格式'
+
+    try:
+        size = int(args.get('size', 33))
+    except ValueError:
+        return None, None, '尺寸参数必须是整数'
+    if not 2 <= size <= 65:
+        return None, None, '尺寸参数范围为 2-65'
+
+    return fmt, size, None
+
+
+def export_lut_bytes(pipeline, fmt, size, info=None):
+    """
+    导出当前校正模型：.cube 3D LUT 或二进制模型文件
+
+    auto 方法烘焙校正目标图像时选择的方法 (info['plan'])
+    """
+    corrector = pipeline.corrector
+    if fmt == 'model':
+        return serialize_model(corrector)
+    if corrector.method == 'auto':
+        corrector = corrector.correction_model['candidates'][info['plan']['method']]
+    lut = bake_lut(corrector, size)
+    return format_cube(lut, title=f'Color Correction ({corrector.method})').encode('utf-8')
+
+
+def profile_name_error(profile):
+    """校准配置名称无效 (例如包含路径分隔符) 时返回错误信息，否则返回 None"""
+    try:
+        get_default_registry().path(str(profile))
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def correct_with_profile(profile, target_image, progressive=False):
+    """
+    使用已保存的校准配置校正目标图像，跳过色卡检测和训练
+
+    Args:
+        progressive: 是否渐进式校正 (见 ColorCorrectionPipeline.correct_progressive)
+
+    Returns:
+        (管道, 校正后的图像 (渐进式时为 ProgressiveResult), 处理信息)
+    """
+    pipeline = ColorCorrectionPipeline.from_profile(profile, get_default_registry())
+    pipeline.cache = conversion_cache
+    if progressive:
+        corrected = pipeline.correct_progressive(target_image, executor=progressive_executor)
+    else:
+        corrected = pipeline.correct_image(target_image)
+    info = {
+        'status': 'success',
+        'correction_method': pipeline.corrector.method,
+        'profile': profile,
+        **pipeline.residual_info()
+    }
+    if pipeline.corrector.method == 'auto':
+        info['plan'] = pipeline.corrector.plan(target_image.shape[1], target_image.shape[0]).to_dict()
+    return pipeline, corrected, info
+
+
+# 校正结果的色差统计模式: sampled 抽样估计 (默认)、exact 对全部像素计算、none 不计算
+DIFFERENCE_MODES = ('sampled', 'exact', 'none')
+
+
+def parse_difference_options(payload):
+    """
+    解析校正接口的色差统计参数 (metrics, metric)
+
+    Returns:
+        ((模式, 色差公式), None) 或 (None, 错误信息)
+    """
+    mode = payload.get('metrics', 'sampled')
+    if mode not in DIFFERENCE_MODES:
+        return None, f"不支持的色差统计模式: {mode} (可选: {', '.join(DIFFERENCE_MODES)})"
+    metric = payload.get('metric', 'ciede2000')
+    if metric not in DIFFERENCE_METRICS:
+        return None, f"不支持的色差公式: {metric} (可选: {', '.join(DIFFERENCE_METRICS)})"
+    return (mode, metric), None
+
+
+def image_difference(pipeline, original, corrected, mode='sampled', metric='ciede2000'):
+    """目标图像与校正结果的色差统计，mode 为 none 时返回 None"""
+    if mode == 'none' or corrected is None:
+        return None
+    sample_size = DIFFERENCE_SAMPLE_SIZE if mode == 'sampled' else None
+    return pipeline.compare_images(original, corrected, metric=metric, sample_size=sample_size)
+
+
+def correction_metrics(info, method, difference):
+    """校正接口返回的质量指标: 训练残差和目标图像与校正结果的色差统计"""
+    return {
+        'mean_delta_e': float(info.get('mean_delta_e', 0)),
+        'max_delta_e': float(info.get('max_delta_e', 0)),
+        'min_delta_e': float(info.get('min_delta_e', 0)),
+        'patch_delta_e': info.get('patch_delta_e', []),
+        'method': method,
+        'difference': difference
+    }
+
+
+def new_result(pipeline, corrected, info):
+    """保存新的校正结果，并分配新的结果 id 使旧的缓存失效 (未完成的渐进式校正不再覆盖它)"""
+    session_data['pipeline'] = pipeline
+    session_data['corrected_image'] = corrected
+    session_data['correction_info'] = info
+    session_data['result_id'] = uuid.uuid4().hex if corrected is not None else None
+    session_data['progressive_job'] = None
+    output_cache.clear()
+
+
+def start_progressive_job(pipeline, progressive, info, target_image, difference_options):
+    """
+    登记渐进式校正的后台任务
+    全分辨率结果完成后成为当前会话的校正结果，并计算色差统计；期间有新的校正或重置时，
+    该任务被取代，不再覆盖当前结果。新任务开始时取消尚未开始执行的旧任务
+
+    任务只保留编码后的结果，完成、失败或被取代后即释放图像数组
+
+    Returns:
+        任务 id
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'state': 'running',
+        'progressive': progressive,
+        'model': model_fingerprint(progressive.corrector),
+        'method': info.get('correction_method'),
+        'info': info,
+        'result_id': None
+    }
+
+    with progressive_lock:
+        new_result(pipeline, None, info)
+        session_data['progressive_job'] = job_id
+        previous = [old['progressive'] for old in progressive_jobs.values()
+                    if old['state'] == 'running' and old['progressive'] is not None]
+        progressive_jobs[job_id] = job
+        finished = [key for key, old in progressive_jobs.items() if old['state'] != 'running']
+        for key in finished[:max(len(progressive_jobs) - MAX_PROGRESSIVE_JOBS, 0)]:
+            del progressive_jobs[key]
+
+    # 旧任务已被取代，尚在排队的直接取消 (回调随即把状态记为 cancelled)
+    for old in previous:
+        old.future.cancel()
+
+    def finish(future):
+        if future.cancelled():
+            job.update(state='cancelled', progressive=None)
+            return
+        try:
+            corrected = future.result()
+            if session_data.get('progressive_job') == job_id:
+                encoded = {'target_image': image_to_base64(target_image),
+                           'corrected_image': image_to_base64(corrected)}
+        except Exception as e:
+            job.update(state='failed', error=str(e), progressive=None)
+            return
+
+        with progressive_lock:
+            current = session_data.get('progressive_job') == job_id
+            if current:
+                new_result(pipeline, corrected, info)
+                job['result_id'] = session_data['result_id']
+        if not current:
+            job.update(state='superseded', progressive=None)
+            return
+
+        # 色差统计失败不影响校正结果，单独报告
+        try:
+            job['difference'] = image_difference(pipeline, target_image, corrected, *difference_options)
+        except Exception as e:
+            job['difference'] = None
+            job['difference_error'] = str(e)
+        job.update(encoded, progressive=None)
+        job['state'] = 'done'
+
+    progressive.future.add_done_callback(finish)
+    return job_id
+
+
+def progressive_job_status(job_id):
+    """
+    渐进式校正任务的状态，完成时附带全分辨率结果
+
+    Returns:
+        响应字典，任务不存在时为 None
+    """
+    job = progressive_jobs.get(job_id)
+    if job is None:
+        return None
+
+    response = {'success': True, 'job_id': job_id, 'status': job['state'], 'model': job['model']}
+    if job['state'] == 'failed':
+        response['error'] = job['error']
+    elif job['state'] == 'done':
+        response.update({
+            'target_image': job['target_image'],
+            'corrected_image': job['corrected_image'],
+            'result_id': job['result_id'],
+            'metrics': correction_metrics(job['info'], job['method'], job['difference'])
+        })
+        if 'difference_error' in job:
+            response['difference_error'] = job['difference_error']
+    return response
+
+
+def progressive_response(job_id, progressive, target_image, info, method):
+    """渐进式校正请求的立即响应: 预览图和用于查询全分辨率结果的任务 id"""
+    return {
+        'success': True,
+        'message': '预览已生成，全分辨率校正进行中',
+        'status': 'running',
+        'job_id': job_id,
+        'model': model_fingerprint(progressive.corrector),
+        'target_image': image_to_base64(downscale(target_image, PREVIEW_MAX_SIDE)),
+        'corrected_image': image_to_base64(progressive.preview),
+        'result_id': None,
+        'metrics': correction_metrics(info, method, None)
+    }
+
+
 def allowed_file(filename):
     """检查文件是否允许"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -61,11 +494,240 @@ def image_to_base64(image_array):
         image_bgr = image_array
     
     # 编码为 JPEG
-    _, buffer = cv2.imencode('.jpg', image_bgr)
-    img_base64 = base64.b64encode(buffer).decode('utf-8')
+    with timed('encode'):
+        _, buffer = cv2.imencode('.jpg', image_bgr)
+    with timed('base64'):
+        img_base64 = base64.b64encode(buffer).decode('utf-8')
     return f"data:image/jpeg;base64,{img_base64}"
 
 
+def decode_image(img_data):
+    """将上传的字节解码为 RGB 图像，失败时返回 None"""
+    with timed('decode'):
+        nparr = np.frombuffer(img_data, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def spool_upload_to_disk(stream, suffix=''):
+    """
+    将上传文件流分块写入 UPLOAD_FOLDER，超过 MAX_FILE_SIZE 时立即停止
+
+    Returns:
+        临时文件路径，文件过大时返回 None
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=UPLOAD_FOLDER)
+    written = 0
+    with os.fdopen(fd, 'wb') as out:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > MAX_FILE_SIZE:
+                break
+            out.write(chunk)
+
+    if written > MAX_FILE_SIZE:
+        os.remove(path)
+        return None
+    return path
+
+
+def decode_image_file(path):
+    """从磁盘解码 RGB 图像，失败时返回 None"""
+    with timed('decode'):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def session_image_path(image_type):
+    """会话图像在 UPLOAD_FOLDER 中的持久化路径"""
+    return os.path.join(UPLOAD_FOLDER, f'{image_type}_image.npy')
+
+
+def store_session_image(image_type, image):
+    """
+    将解码后的图像保存为 .npy 并以内存映射方式载入会话
+
+    先写临时文件再原子替换，其他工作进程不会读到写了一半的文件
+    """
+    path = session_image_path(image_type)
+    fd, temp_path = tempfile.mkstemp(suffix='.npy', dir=UPLOAD_FOLDER)
+    with os.fdopen(fd, 'wb') as out:
+        np.save(out, image)
+    os.replace(temp_path, path)
+    return get_session_image(image_type)
+
+
+def get_session_image(image_type):
+    """
+    获取会话图像（内存映射，只读）
+
+    文件被其他工作进程替换或删除时自动重新载入
+    """
+    key = f'{image_type}_image'
+    path = session_image_path(image_type)
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        session_data[key] = None
+        session_data.pop(f'{key}_signature', None)
+        return None
+
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if session_data.get(key) is None or session_data.get(f'{key}_signature') != signature:
+        session_data[key] = np.load(path, mmap_mode='r')
+        session_data[f'{key}_signature'] = signature
+
+    return session_data[key]
+
+
+def clear_session_image(image_type):
+    """删除持久化的会话图像"""
+    session_data[f'{image_type}_image'] = None
+    session_data.pop(f'{image_type}_image_signature', None)
+    try:
+        os.remove(session_image_path(image_type))
+    except FileNotFoundError:
+        pass
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """
+    只写、不可 seek 的缓冲区
+    zipfile 写入后由生成器取走数据，整个压缩包不会驻留在内存中
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, *args, **kwargs):
+        raise io.UnsupportedOperation('ZipStreamBuffer 不支持 seek')
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """取出当前已写入的数据"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def spool_uploads(files):
+    """
+    将批量上传的文件复制到磁盘临时文件
+
+    流式响应开始时请求上下文已被关闭，上传文件随之失效，
+    因此在视图函数返回前先转存到磁盘（而非内存）
+
+    Args:
+        files: [(文件名, 文件流), ...]
+
+    Returns:
+        [(文件名, 临时文件对象), ...]
+    """
+    spooled = []
+    for filename, stream in files:
+        if not filename:
+            continue
+        temp = tempfile.TemporaryFile(dir=UPLOAD_FOLDER)
+        shutil.copyfileobj(stream, temp)
+        temp.seek(0)
+        spooled.append((filename, temp))
+    return spooled
+
+
+def iter_batch_inputs(spooled):
+    """
+    遍历批量上传的目标图像
+
+    支持多个 multipart 文件，或 zip 压缩包（逐个成员读取）
+
+    Yields:
+        (文件名, 图像字节)，文件过大时图像字节为 None
+    """
+    for filename, fileobj in spooled:
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(fileobj) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not allowed_file(member.filename):
+                        continue
+                    if member.file_size > MAX_FILE_SIZE:
+                        yield member.filename, None
+                        continue
+                    yield member.filename, archive.read(member)
+        elif allowed_file(filename):
+            data = fileobj.read(MAX_FILE_SIZE + 1)
+            yield filename, data if len(data) <= MAX_FILE_SIZE else None
+
+
+def correct_encoded_image(pipeline, img_data):
+    """解码 → 校正 → 编码 JPEG，供批量接口在线程池中执行"""
+    if img_data is None:
+        raise ValueError('文件过大')
+
+    image = decode_image(img_data)
+    if image is None:
+        raise ValueError('无法读取图像文件')
+
+    corrected = pipeline.correct_image(image)
+    return encode_image_bytes(corrected, 'jpg')
+
+
+def batch_output_name(index, filename):
+    """生成 ZIP 内的输出文件名，带序号避免重名"""
+    stem = secure_filename(Path(filename).stem) or 'image'
+    return f'{index:04d}_{stem}_corrected.jpg'
+
+
+@app.before_request
+def track_request_start():
+    """统计正在处理的请求数"""
+    g.in_flight = True
+    REQUESTS_IN_FLIGHT.inc()
+
+
+@app.after_request
+def track_request_end(response):
+    """按接口和 HTTP 方法统计请求数"""
+    endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    HTTP_REQUESTS.inc(endpoint=endpoint, http_method=request.method, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def track_request_teardown(exception):
+    # 流式响应会再次推入请求上下文，teardown 可能执行两次
+    if g.pop('in_flight', False):
+        REQUESTS_IN_FLIGHT.dec()
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 指标接口"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/', methods=['GET'])
 def index():
     """返回主页面"""
@@ -76,11 +738,18 @@ def index():
 def upload_image():
     """上传图像接口"""
     try:
+        # 在解析请求体之前根据 Content-Length 拒绝过大的上传
+        if request.content_length is not None and \
+                request.content_length > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+            return jsonify({'success': False, 'error': '文件过大'}), 400
+        
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': '没有文件被上传'}), 400
         
         file = request.files['file']
         image_type = request.form.get('type', 'target')  # 'calibration' 或 'target'
+        if image_type != 'calibration':
+            image_type = 'target'
         
         if file.filename == '':
             return jsonify({'success': False, 'error': '文件名为空'}), 400
@@ -88,26 +757,23 @@ def upload_image():
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': '不支持的文件格式'}), 400
         
-        # 读取图像
-        img_data = file.read()
-        if len(img_data) > MAX_FILE_SIZE:
+        # 分块写入磁盘后解码 (请求体大小已由 UploadRequest 限制)
+        suffix = '.' + file.filename.rsplit('.', 1)[1].lower()
+        spooled_path = spool_upload_to_disk(file.stream, suffix=suffix)
+        if spooled_path is None:
             return jsonify({'success': False, 'error': '文件过大'}), 400
         
-        # 使用 OpenCV 读取
-        nparr = np.frombuffer(img_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # 使用 OpenCV 读取并转换为 RGB
+        try:
+            image_rgb = decode_image_file(spooled_path)
+        finally:
+            os.remove(spooled_path)
         
-        if image is None:
+        if image_rgb is None:
             return jsonify({'success': False, 'error': '无法读取图像文件'}), 400
         
-        # 转换为 RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # 存储到会话
-        if image_type == 'calibration':
-            session_data['calibration_image'] = image_rgb
-        else:
-            session_data['target_image'] = image_rgb
+        # 持久化到 UPLOAD_FOLDER 并以内存映射方式存储到会话
+        image_rgb = store_session_image(image_type, image_rgb)
         
         # 返回图像预览
         preview = image_to_base64(image_rgb)
@@ -119,6 +785,8 @@ def upload_image():
             'size': image_rgb.shape
         })
     
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'error': '文件过大'}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -127,11 +795,12 @@ def upload_image():
 def detect_colorchecker():
     """检测色卡接口"""
     try:
-        if session_data['calibration_image'] is None:
+        calibration_image = get_session_image('calibration')
+        if calibration_image is None:
             return jsonify({'success': False, 'error': '请先上传校准图像'}), 400
 
         detector = ColorCheckerDetector()
-        result = detector.detect(session_data['calibration_image'])
+        result = detector.detect(calibration_image)
 
         if not result['detected']:
             return jsonify({
@@ -154,74 +823,145 @@ def detect_colorchecker():
 
 @app.route('/api/correct', methods=['POST'])
 def correct_image():
-    """颜色校正接口"""
+    """
+    颜色校正接口
+
+    参数: method 校正方法；或 profile 已保存的校准配置 (不需要校准图像)；
+          metrics 色差统计模式 (sampled / exact / none，默认 sampled)；metric 色差公式；
+          progressive 为 true 时立即返回预览图和 job_id，全分辨率结果通过 /api/jobs/<job_id> 查询
+    """
     try:
-        if session_data['calibration_image'] is None:
+        payload = request.json or {}
+        profile = payload.get('profile')
+        progressive = bool(payload.get('progressive', False))
+        method = payload.get('method', 'polynomial')
+        difference_options, message = parse_difference_options(payload)
+        if not message and profile:
+            message = profile_name_error(profile)
+        elif not message and method not in METHODS + ('auto',):
+            message = f'不支持的校正方法: {method}'
+        if message:
+            return jsonify({'success': False, 'error': message}), 400
+        
+        calibration_image = get_session_image('calibration')
+        if calibration_image is None and not profile:
             return jsonify({'success': False, 'error': '请先上传校准图像'}), 400
         
-        if session_data['target_image'] is None:
+        target_image = get_session_image('target')
+        if target_image is None:
             return jsonify({'success': False, 'error': '请先上传目标图像'}), 400
         
-        # 获取校正方法
-        method = request.json.get('method', 'polynomial')
-        session_data['correction_method'] = method
-        
-        # 创建处理管道
-        pipeline = ColorCorrectionPipeline(correction_method=method)
+        if profile:
+            # 使用校准配置，跳过检测和训练
+            try:
+                pipeline, corrected, info = correct_with_profile(profile, target_image, progressive)
+            except KeyError as e:
+                return jsonify({'success': False, 'error': str(e.args[0])}), 404
+            method = pipeline.corrector.method
+            session_data['correction_method'] = method
+            CORRECTIONS.inc(method=method)
+        elif progressive:
+            session_data['correction_method'] = method
+            CORRECTIONS.inc(method=method)
+            
+            pipeline = ColorCorrectionPipeline(correction_method=method, cache=conversion_cache)
+            corrected, info = pipeline.process_progressive(calibration_image, target_image,
+                                                           executor=progressive_executor)
+            if corrected is None:
+                new_result(pipeline, None, info)
+                return jsonify({'success': False, 'error': '未检测到色卡，校准失败'}), 400
+        else:
+            # 记录校正方法
+            session_data['correction_method'] = method
+            CORRECTIONS.inc(method=method)
+            
+            # 创建处理管道
+            pipeline = ColorCorrectionPipeline(correction_method=method, cache=conversion_cache)
+            
+            # 执行处理
+            corrected, info = pipeline.process(calibration_image, target_image)
         
-        # 执行处理
-        corrected, info = pipeline.process(
-            session_data['calibration_image'],
-            session_data['target_image']
-        )
+        if progressive:
+            # 预览图立即返回，全分辨率结果完成后成为当前会话的校正结果
+            job_id = start_progressive_job(pipeline, corrected, info, target_image, difference_options)
+            return jsonify(progressive_response(job_id, corrected, target_image, info, method))
         
         # 存储结果
-        session_data['pipeline'] = pipeline
-        session_data['corrected_image'] = corrected
-        session_data['correction_info'] = info
+        new_result(pipeline, corrected, info)
         
         # 返回结果
-        target_preview = image_to_base64(session_data['target_image'])
+        target_preview = image_to_base64(target_image)
         corrected_preview = image_to_base64(corrected)
+        difference = image_difference(pipeline, target_image, corrected, *difference_options)
 
         return jsonify({
             'success': True,
             'message': '颜色校正完成',
             'target_image': target_preview,
             'corrected_image': corrected_preview,
-            'metrics': {
-                'mean_delta_e': float(info.get('mean_delta_e', 0)),
-                'max_delta_e': float(info.get('max_delta_e', 0)),
-                'min_delta_e': float(info.get('min_delta_e', 0)),
-                'method': method
-            }
+            'result_id': session_data['result_id'],
+            'metrics': correction_metrics(info, method, difference)
         })
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/compare', methods=['POST'])
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_progressive_job(job_id):
+    """
+    渐进式校正任务状态: running / done / failed，done 时附带全分辨率校正结果
+    """
+    try:
+        status = progressive_job_status(job_id)
+        if status is None:
+            return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+        return jsonify(status)
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def etag_response(data, etag, mimetype, **kwargs):
+    """
+    返回带强 ETag 的响应，If-None-Match 命中时返回 304
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = send_file(BytesIO(data), mimetype=mimetype, etag=False, **kwargs)
+    response.set_etag(etag)
+    # 同一 URL 的内容随校正结果变化，客户端每次都需要用 ETag 重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/compare', methods=['GET', 'POST'])
 def compare_images():
     """生成对比图像接口"""
     try:
-        if session_data['target_image'] is None or session_data.get('corrected_image') is None:
+        target_image = get_session_image('target')
+        if target_image is None or session_data.get('corrected_image') is None:
             return jsonify({'success': False, 'error': '请先执行颜色校正'}), 400
         
         pipeline = session_data['pipeline']
         
-        # 生成对比图像
-        comparison = pipeline.create_comparison_image(
-            session_data['target_image'],
-            session_data['corrected_image']
-        )
+        def build():
+            # 生成对比图像
+            comparison = pipeline.create_comparison_image(
+                target_image,
+                session_data['corrected_image']
+            )
+            comparison_preview = image_to_base64(comparison)
+            return json.dumps({
+                'success': True,
+                'comparison_image': comparison_preview
+            }).encode('utf-8')
         
-        comparison_preview = image_to_base64(comparison)
-
-        return jsonify({
-            'success': True,
-            'comparison_image': comparison_preview
-        })
+        data, etag = output_cache.get_or_create(
+            (session_data['result_id'], 'compare', 'json', None), build
+        )
+        return etag_response(data, etag, 'application/json')
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -229,38 +969,207 @@ def compare_images():
 
 @app.route('/api/download', methods=['GET'])
 def download_image():
-    """下载校正后的图像"""
+    """
+    下载校正后的图像
+
+    参数: format = jpg / png / webp (默认 jpg)，quality = 1-100
+    编码结果按 (结果 id, 格式, 质量) 缓存，支持 If-None-Match
+    """
     try:
         if session_data.get('corrected_image') is None:
             return jsonify({'success': False, 'error': '没有可下载的图像'}), 400
         
-        # 转换为 BGR
-        corrected_bgr = cv2.cvtColor(session_data['corrected_image'], cv2.COLOR_RGB2BGR)
+        fmt, quality, message = parse_download_options(request.args)
+        if message:
+            return jsonify({'success': False, 'error': message}), 400
         
-        # 编码为 JPEG
-        _, buffer = cv2.imencode('.jpg', corrected_bgr)
+        corrected = session_data['corrected_image']
+        data, etag = output_cache.get_or_create(
+            (session_data['result_id'], 'download', fmt, quality),
+            lambda: encode_image_bytes(corrected, fmt, quality)
+        )
         
         # 返回文件
-        return send_file(
-            BytesIO(buffer),
-            mimetype='image/jpeg',
+        return etag_response(
+            data, etag, DOWNLOAD_FORMATS[fmt][1],
             as_attachment=True,
-            download_name='corrected_image.jpg'
+            download_name=f'corrected_image.{fmt}'
         )
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/lut', methods=['GET'])
+def export_lut():
+    """
+    导出当前校正模型
+
+    参数: format = cube (3D LUT，默认) / model (二进制模型)，size = LUT 尺寸 (默认 33)
+    """
+    try:
+        pipeline = session_data.get('pipeline')
+        if pipeline is None or not pipeline.is_trained:
+            return jsonify({'success': False, 'error': '请先执行颜色校正'}), 400
+        
+        fmt, size, message = parse_lut_options(request.args, pipeline)
+        if message:
+            return jsonify({'success': False, 'error': message}), 400
+        
+        data, etag = output_cache.get_or_create(
+            (session_data['result_id'], 'lut', fmt, size),
+            lambda: export_lut_bytes(pipeline, fmt, size, session_data['correction_info'])
+        )
+        
+        mimetype, extension = LUT_FORMATS[fmt]
+        return etag_response(
+            data, etag, mimetype,
+            as_attachment=True,
+            download_name=f'color_correction_{pipeline.corrector.method}.{extension}'
+        )
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """列出已保存的校准配置"""
+    try:
+        return jsonify({'success': True, 'profiles': get_default_registry().list()})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/profiles', methods=['POST'])
+def save_profile():
+    """
+    将当前会话的校准结果保存为命名配置
+
+    参数: name 配置名称
+    """
+    try:
+        name = (request.json or {}).get('name')
+        if not name:
+            return jsonify({'success': False, 'error': '请指定配置名称'}), 400
+        
+        pipeline = session_data.get('pipeline')
+        if pipeline is None or not pipeline.is_trained:
+            return jsonify({'success': False, 'error': '请先执行颜色校正'}), 400
+        
+        pipeline.save_profile(name, get_default_registry())
+        return jsonify({'success': True, 'message': f'校准配置已保存: {name}'})
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/batch', methods=['POST'])
+def batch_correct():
+    """
+    批量校正接口
+    多张目标图像共用一次校准，并行校正，结果按完成顺序以 ZIP 流式返回
+    """
+    try:
+        calibration_image = get_session_image('calibration')
+        if calibration_image is None:
+            return jsonify({'success': False, 'error': '请先上传校准图像'}), 400
+
+        files = request.files.getlist('files') or request.files.getlist('file')
+        if not files:
+            return jsonify({'success': False, 'error': '没有文件被上传'}), 400
+
+        method = request.form.get('method', session_data['correction_method'])
+        if method not in METHODS:
+            return jsonify({'success': False, 'error': f'不支持的校正方法: {method}'}), 400
+
+        # 只校准一次，所有目标图像共用同一个模型
+        pipeline = ColorCorrectionPipeline(correction_method=method)
+        if not pipeline.calibrate(calibration_image):
+            return jsonify({'success': False, 'error': '未检测到色卡，校准失败'}), 400
+
+        spooled = spool_uploads((file.filename, file.stream) for file in files)
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    def generate():
+        pending = {}
+        try:
+            buffer = ZipStreamBuffer()
+            summary = []
+
+            with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive, \
+                    ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+
+                def write_done(done):
+                    for future in done:
+                        index, filename = pending.pop(future)
+                        BATCH_QUEUE_DEPTH.dec()
+                        try:
+                            data = future.result()
+                        except Exception as e:
+                            summary.append({'index': index, 'file': filename,
+                                            'success': False, 'error': str(e)})
+                            continue
+
+                        output_name = batch_output_name(index, filename)
+                        archive.writestr(output_name, data)
+                        summary.append({'index': index, 'file': filename,
+                                        'success': True, 'output': output_name})
+
+                for index, (filename, img_data) in enumerate(iter_batch_inputs(spooled)):
+                    if index >= MAX_BATCH_FILES:
+                        break
+
+                    future = executor.submit(correct_encoded_image, pipeline, img_data)
+                    pending[future] = (index, filename)
+                    BATCH_QUEUE_DEPTH.inc()
+                    CORRECTIONS.inc(method=method)
+
+                    # 限制同时在处理中的图像数量，控制内存占用
+                    if len(pending) >= 2 * BATCH_MAX_WORKERS:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        write_done(done)
+                        yield buffer.drain()
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    write_done(done)
+                    yield buffer.drain()
+
+                summary.sort(key=lambda item: item['index'])
+                archive.writestr('summary.json', json.dumps({
+                    'method': method,
+                    'total': len(summary),
+                    'succeeded': sum(1 for item in summary if item['success']),
+                    'results': summary
+                }, ensure_ascii=False, indent=2))
+
+            yield buffer.drain()
+        finally:
+            # 客户端中途断开时，未写出的任务不再计入队列深度
+            BATCH_QUEUE_DEPTH.dec(len(pending))
+            for _, fileobj in spooled:
+                fileobj.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=corrected_images.zip'}
+    )
+
+
 @app.route('/api/reset', methods=['POST'])
 def reset_session():
     """重置会话"""
     try:
-        session_data['calibration_image'] = None
-        session_data['target_image'] = None
-        session_data['pipeline'] = None
-        session_data['corrected_image'] = None
-        session_data['correction_info'] = None
+        clear_session_image('calibration')
+        clear_session_image('target')
+        new_result(None, None, None)
         
         return jsonify({'success': True, 'message': '会话已重置'})
     
@@ -274,10 +1183,13 @@ def get_status():
     try:
         return jsonify({
             'success': True,
-            'has_calibration': session_data['calibration_image'] is not None,
-            'has_target': session_data['target_image'] is not None,
+            'has_calibration': get_session_image('calibration') is not None,
+            'has_target': get_session_image('target') is not None,
             'has_result': session_data.get('corrected_image') is not None,
-            'method': session_data['correction_method']
+            'result_id': session_data.get('result_id'),
+            'progressive_job': session_data.get('progressive_job'),
+            'method': session_data['correction_method'],
+            'warmup': warmup_status
         })
     
     except Exception as e:
@@ -296,10 +1208,20 @@ def internal_error(error):
     return jsonify({'success': False, 'error': '服务器内部错误'}), 500
 
 
+# WSGI 服务器 (例如 gunicorn --preload) 导入本模块时预热；直接运行时由下面的入口预热
+if os.environ.get('COLOR_CORRECT_WARMUP') == '1' and __name__ != '__main__':
+    warm_up_server()
+
+
 if __name__ == '__main__':
     print("=" * 60)
     print("颜色校正系统 Web 服务器")
     print("=" * 60)
+    # debug 模式的重载器在子进程中重新运行本文件并由子进程处理请求，只在子进程中预热，
+    # 避免监视文件变化的父进程重复训练和填充缓存
+    serving = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if serving and os.environ.get('COLOR_CORRECT_WARMUP') != '0' and warmup_status['state'] == 'pending':
+        warm_up_server()
     print("访问地址: http://localhost:8000")
     print("=" * 60)
     app.run(debug=True, host='0.0.0.0', port=8000)
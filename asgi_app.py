@@ -0,0 +1,621 @@
+"""
+ASGI Web 服务器 - 颜色校正系统后端 (异步版本)
+与 app.py 提供相同的 RESTful API，解码/检测/校正/编码在线程池中执行，
+事件循环只负责收发请求，CPU 密集的请求不会阻塞其他请求
+
+运行:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+"""
+
+import os
+import json
+import asyncio
+import zipfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from src.metrics import REGISTRY, timed
+from src.pipeline import ColorCorrectionPipeline, PREVIEW_MAX_SIDE
+from src.color_checker_detector import ColorCheckerDetector
+from src.color_corrector import METHODS
+from src.profiles import get_default_registry
+
+# 复用 Flask 版本的配置、会话存储和图像处理函数，两个服务器行为一致
+import app as flask_app
+from app import (
+    session_data, allowed_file, image_to_base64,
+    spool_upload_to_disk, decode_image_file, get_session_image, store_session_image,
+    clear_session_image, spool_uploads, iter_batch_inputs, correct_encoded_image,
+    batch_output_name, ZipStreamBuffer, warm_up_server, warmup_status,
+    output_cache, encode_image_bytes, parse_download_options, new_result, DOWNLOAD_FORMATS,
+    parse_lut_options, export_lut_bytes, LUT_FORMATS, correct_with_profile, profile_name_error,
+    parse_difference_options, image_difference, conversion_cache, correction_metrics,
+    progressive_executor, start_progressive_job, progressive_job_status, progressive_response,
+    HTTP_REQUESTS, CORRECTIONS, REQUESTS_IN_FLIGHT, BATCH_QUEUE_DEPTH
+)
+
+# 线程池: OpenCV / NumPy 在计算时释放 GIL，线程即可并行利用多核
+IO_WORKERS = int(os.environ.get('COLOR_CORRECT_IO_WORKERS', os.cpu_count() or 4))
+COMPUTE_WORKERS = int(os.environ.get('COLOR_CORRECT_COMPUTE_WORKERS', os.cpu_count() or 4))
+
+# 解码 / 编码
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='color-io')
+# 检测 / 训练 / 校正
+compute_executor = ThreadPoolExecutor(max_workers=COMPUTE_WORKERS, thread_name_prefix='color-compute')
+
+async def run_in(executor, func, *args, **kwargs):
+    """在指定线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+def error(message, status_code=400, **extra):
+    """与 Flask 版本一致的错误响应"""
+    return JSONResponse({'success': False, 'error': message, **extra}, status_code=status_code)
+
+
+def read_upload(upload, suffix):
+    """将上传文件写入磁盘并解码 (在线程池中执行)"""
+    spooled_path = spool_upload_to_disk(upload.file, suffix=suffix)
+    if spooled_path is None:
+        return None, '文件过大'
+    try:
+        image_rgb = decode_image_file(spooled_path)
+    finally:
+        os.remove(spooled_path)
+    if image_rgb is None:
+        return None, '无法读取图像文件'
+    return image_rgb, None
+
+
+class BodyTooLarge(Exception):
+    """请求体超过上限"""
+
+
+def limit_body(request, limit):
+    """
+    返回读取请求体时计数的新 Request：累计超过 limit 字节时抛出 BodyTooLarge，
+    没有 Content-Length 的分块上传也能在解析 multipart 的过程中中止
+    """
+    receive = request.receive
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > limit:
+                raise BodyTooLarge()
+        return message
+
+    return Request(request.scope, limited_receive)
+
+
+async def index(request):
+    """返回主页面"""
+    return FileResponse('test.html', media_type='text/html')
+
+
+async def metrics(request):
+    """Prometheus 指标接口"""
+    return Response(REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+async def upload_image(request):
+    """上传图像接口"""
+    try:
+        # 在解析请求体之前根据 Content-Length 拒绝过大的上传
+        content_length = request.headers.get('content-length')
+        if content_length is not None:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                return error('无效的 Content-Length')
+            if content_length > flask_app.MAX_FILE_SIZE + flask_app.MULTIPART_OVERHEAD:
+                return error('文件过大')
+
+        try:
+            form = await limit_body(request, flask_app.MAX_FILE_SIZE + flask_app.MULTIPART_OVERHEAD).form()
+        except BodyTooLarge:
+            return error('文件过大')
+        upload = form.get('file')
+        if upload is None or isinstance(upload, str):
+            return error('没有文件被上传')
+
+        image_type = form.get('type', 'target')
+        if image_type != 'calibration':
+            image_type = 'target'
+
+        if not upload.filename:
+            return error('文件名为空')
+
+        if not allowed_file(upload.filename):
+            return error('不支持的文件格式')
+
+        suffix = '.' + upload.filename.rsplit('.', 1)[1].lower()
+        image_rgb, message = await run_in(io_executor, read_upload, upload, suffix)
+        if image_rgb is None:
+            return error(message)
+
+        image_rgb = await run_in(io_executor, store_session_image, image_type, image_rgb)
+        preview = await run_in(io_executor, image_to_base64, image_rgb)
+
+        return JSONResponse({
+            'success': True,
+            'message': f'{image_type} 图像上传成功',
+            'preview': preview,
+            'size': list(image_rgb.shape)
+        })
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def detect_colorchecker(request):
+    """检测色卡接口"""
+    try:
+        calibration_image = get_session_image('calibration')
+        if calibration_image is None:
+            return error('请先上传校准图像')
+
+        detector = ColorCheckerDetector()
+        with timed('detect'):
+            result = await run_in(compute_executor, detector.detect, calibration_image)
+
+        if not result['detected']:
+            return error('未检测到色卡，请确保色卡清晰可见', confidence=0)
+
+        return JSONResponse({
+            'success': True,
+            'detected': True,
+            'confidence': float(result['confidence']),
+            'message': f'色卡检测成功，置信度: {result["confidence"]:.2%}'
+        })
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def correct_image(request):
+    """
+    颜色校正接口，可通过 profile 使用已保存的校准配置；
+    progressive 为 true 时立即返回预览图和 job_id，全分辨率结果通过 /api/jobs/{job_id} 查询
+    """
+    try:
+        payload = await request.json()
+        profile = payload.get('profile')
+        progressive = bool(payload.get('progressive', False))
+        method = payload.get('method', 'polynomial')
+        difference_options, message = parse_difference_options(payload)
+        if not message and profile:
+            message = profile_name_error(profile)
+        elif not message and method not in METHODS + ('auto',):
+            message = f'不支持的校正方法: {method}'
+        if message:
+            return error(message)
+
+        calibration_image = get_session_image('calibration')
+        if calibration_image is None and not profile:
+            return error('请先上传校准图像')
+
+        target_image = get_session_image('target')
+        if target_image is None:
+            return error('请先上传目标图像')
+
+        if profile:
+            try:
+                pipeline, corrected, info = await run_in(compute_executor, correct_with_profile,
+                                                         profile, target_image, progressive)
+            except KeyError as e:
+                return error(str(e.args[0]), 404)
+            method = pipeline.corrector.method
+            session_data['correction_method'] = method
+            CORRECTIONS.inc(method=method)
+        else:
+            session_data['correction_method'] = method
+            CORRECTIONS.inc(method=method)
+
+            pipeline = ColorCorrectionPipeline(correction_method=method, cache=conversion_cache)
+            if progressive:
+                corrected, info = await run_in(compute_executor, pipeline.process_progressive,
+                                               calibration_image, target_image,
+                                               PREVIEW_MAX_SIDE, progressive_executor)
+            else:
+                corrected, info = await run_in(compute_executor, pipeline.process,
+                                               calibration_image, target_image)
+
+        if corrected is None:
+            new_result(pipeline, None, info)
+            return error('未检测到色卡，校准失败')
+
+        if progressive:
+            # 预览图立即返回，全分辨率结果完成后成为当前会话的校正结果
+            job_id = start_progressive_job(pipeline, corrected, info, target_image, difference_options)
+            return JSONResponse(await run_in(io_executor, progressive_response,
+                                             job_id, corrected, target_image, info, method))
+
+        new_result(pipeline, corrected, info)
+
+        target_preview, corrected_preview, difference = await asyncio.gather(
+            run_in(io_executor, image_to_base64, target_image),
+            run_in(io_executor, image_to_base64, corrected),
+            run_in(compute_executor, image_difference, pipeline, target_image, corrected,
+                   *difference_options)
+        )
+
+        return JSONResponse({
+            'success': True,
+            'message': '颜色校正完成',
+            'target_image': target_preview,
+            'corrected_image': corrected_preview,
+            'result_id': session_data['result_id'],
+            'metrics': correction_metrics(info, method, difference)
+        })
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_progressive_job(request):
+    """渐进式校正任务状态: running / done / failed，done 时附带全分辨率校正结果"""
+    try:
+        status = await run_in(io_executor, progressive_job_status, request.path_params['job_id'])
+        if status is None:
+            return error('任务不存在或已过期', 404)
+        return JSONResponse(status)
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def etag_response(request, data, etag, media_type, headers=None):
+    """返回带强 ETag 的响应，If-None-Match 命中时返回 304"""
+    headers = dict(headers or {})
+    headers['ETag'] = f'"{etag}"'
+    headers['Cache-Control'] = 'no-cache'
+
+    if_none_match = request.headers.get('if-none-match', '')
+    candidates = set()
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        # 弱比较: 去掉 W/ 前缀 (不使用 str.removeprefix，兼容 Python 3.8)
+        candidates.add((tag[2:] if tag.startswith('W/') else tag).strip('"'))
+    if etag in candidates or '*' in candidates:
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=media_type, headers=headers)
+
+
+async def compare_images(request):
+    """生成对比图像接口"""
+    try:
+        target_image = get_session_image('target')
+        if target_image is None or session_data.get('corrected_image') is None:
+            return error('请先执行颜色校正')
+
+        pipeline = session_data['pipeline']
+        corrected = session_data['corrected_image']
+        key = (session_data['result_id'], 'compare', 'json', None)
+
+        entry = output_cache.get(key)
+        if entry is None:
+            comparison = await run_in(compute_executor, pipeline.create_comparison_image,
+                                      target_image, corrected)
+            comparison_preview = await run_in(io_executor, image_to_base64, comparison)
+            entry = output_cache.put(key, json.dumps({
+                'success': True,
+                'comparison_image': comparison_preview
+            }).encode('utf-8'))
+
+        return etag_response(request, *entry, 'application/json')
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def download_image(request):
+    """下载校正后的图像，编码结果按 (结果 id, 格式, 质量) 缓存"""
+    try:
+        if session_data.get('corrected_image') is None:
+            return error('没有可下载的图像')
+
+        fmt, quality, message = parse_download_options(request.query_params)
+        if message:
+            return error(message)
+
+        corrected = session_data['corrected_image']
+        key = (session_data['result_id'], 'download', fmt, quality)
+
+        entry = output_cache.get(key)
+        if entry is None:
+            data = await run_in(io_executor, encode_image_bytes, corrected, fmt, quality)
+            entry = output_cache.put(key, data)
+
+        return etag_response(request, *entry, DOWNLOAD_FORMATS[fmt][1], headers={
+            'Content-Disposition': f'attachment; filename="corrected_image.{fmt}"'
+        })
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def export_lut(request):
+    """导出当前校正模型：.cube 3D LUT 或二进制模型文件"""
+    try:
+        pipeline = session_data.get('pipeline')
+        if pipeline is None or not pipeline.is_trained:
+            return error('请先执行颜色校正')
+
+        fmt, size, message = parse_lut_options(request.query_params, pipeline)
+        if message:
+            return error(message)
+
+        key = (session_data['result_id'], 'lut', fmt, size)
+        entry = output_cache.get(key)
+        if entry is None:
+            data = await run_in(compute_executor, export_lut_bytes, pipeline, fmt, size,
+                                session_data['correction_info'])
+            entry = output_cache.put(key, data)
+
+        media_type, extension = LUT_FORMATS[fmt]
+        filename = f'color_correction_{pipeline.corrector.method}.{extension}'
+        return etag_response(request, *entry, media_type, headers={
+            'Content-Disposition': f'attachment; filename="{filename}"'
+        })
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def list_profiles(request):
+    """列出已保存的校准配置"""
+    try:
+        profiles = await run_in(io_executor, get_default_registry().list)
+        return JSONResponse({'success': True, 'profiles': profiles})
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def save_profile(request):
+    """将当前会话的校准结果保存为命名配置"""
+    try:
+        name = (await request.json()).get('name')
+        if not name:
+            return error('请指定配置名称')
+
+        pipeline = session_data.get('pipeline')
+        if pipeline is None or not pipeline.is_trained:
+            return error('请先执行颜色校正')
+
+        await run_in(io_executor, pipeline.save_profile, name, get_default_registry())
+        return JSONResponse({'success': True, 'message': f'校准配置已保存: {name}'})
+
+    except ValueError as e:
+        return error(str(e))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def batch_correct(request):
+    """
+    批量校正接口
+    多张目标图像共用一次校准，并行校正，结果按完成顺序以 ZIP 流式返回
+    """
+    try:
+        calibration_image = get_session_image('calibration')
+        if calibration_image is None:
+            return error('请先上传校准图像')
+
+        form = await request.form(max_files=flask_app.MAX_BATCH_FILES)
+        files = [item for key, item in form.multi_items()
+                 if key in ('files', 'file') and not isinstance(item, str)]
+        if not files:
+            return error('没有文件被上传')
+
+        method = form.get('method', session_data['correction_method'])
+        if method not in METHODS:
+            return error(f'不支持的校正方法: {method}')
+
+        pipeline = ColorCorrectionPipeline(correction_method=method)
+        calibrated = await run_in(compute_executor, pipeline.calibrate, calibration_image)
+        if not calibrated:
+            return error('未检测到色卡，校准失败')
+
+        spooled = await run_in(io_executor, spool_uploads,
+                               [(upload.filename, upload.file) for upload in files])
+
+    except Exception as e:
+        return error(str(e), 500)
+
+    async def generate():
+        loop = asyncio.get_running_loop()
+        pending = {}
+        try:
+            buffer = ZipStreamBuffer()
+            summary = []
+            inputs = iter_batch_inputs(spooled)
+
+            with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+
+                def write_done(done):
+                    for future in done:
+                        index, filename = pending.pop(future)
+                        BATCH_QUEUE_DEPTH.dec()
+                        try:
+                            data = future.result()
+                        except Exception as e:
+                            summary.append({'index': index, 'file': filename,
+                                            'success': False, 'error': str(e)})
+                            continue
+
+                        output_name = batch_output_name(index, filename)
+                        archive.writestr(output_name, data)
+                        summary.append({'index': index, 'file': filename,
+                                        'success': True, 'output': output_name})
+
+                index = 0
+                while index < flask_app.MAX_BATCH_FILES:
+                    # 读取下一个输入 (可能需要解压) 也放在线程池中
+                    item = await loop.run_in_executor(io_executor, next, inputs, None)
+                    if item is None:
+                        break
+                    filename, img_data = item
+
+                    future = loop.run_in_executor(compute_executor, correct_encoded_image,
+                                                  pipeline, img_data)
+                    pending[future] = (index, filename)
+                    BATCH_QUEUE_DEPTH.inc()
+                    CORRECTIONS.inc(method=method)
+                    index += 1
+
+                    # 限制同时在处理中的图像数量，控制内存占用
+                    if len(pending) >= 2 * COMPUTE_WORKERS:
+                        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        write_done(done)
+                        yield buffer.drain()
+
+                while pending:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    write_done(done)
+                    yield buffer.drain()
+
+                summary.sort(key=lambda item: item['index'])
+                archive.writestr('summary.json', json.dumps({
+                    'method': method,
+                    'total': len(summary),
+                    'succeeded': sum(1 for item in summary if item['success']),
+                    'results': summary
+                }, ensure_ascii=False, indent=2))
+
+            yield buffer.drain()
+        finally:
+            BATCH_QUEUE_DEPTH.dec(len(pending))
+            for _, fileobj in spooled:
+                fileobj.close()
+
+    return StreamingResponse(generate(), media_type='application/zip', headers={
+        'Content-Disposition': 'attachment; filename=corrected_images.zip'
+    })
+
+
+async def reset_session(request):
+    """重置会话"""
+    try:
+        clear_session_image('calibration')
+        clear_session_image('target')
+        new_result(None, None, None)
+
+        return JSONResponse({'success': True, 'message': '会话已重置'})
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_status(request):
+    """获取当前状态"""
+    try:
+        return JSONResponse({
+            'success': True,
+            'has_calibration': get_session_image('calibration') is not None,
+            'has_target': get_session_image('target') is not None,
+            'has_result': session_data.get('corrected_image') is not None,
+            'result_id': session_data.get('result_id'),
+            'progressive_job': session_data.get('progressive_job'),
+            'method': session_data['correction_method'],
+            'warmup': warmup_status
+        })
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+class MetricsMiddleware:
+    """统计正在处理的请求数和按接口、HTTP 方法划分的请求数"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get('route')
+            endpoint = route.path if route is not None else 'unknown'
+            HTTP_REQUESTS.inc(endpoint=endpoint, http_method=scope['method'], status=status['code'])
+
+
+routes = [
+    Route('/', index, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+    Route('/api/upload', upload_image, methods=['POST']),
+    Route('/api/detect-colorchecker', detect_colorchecker, methods=['POST']),
+    Route('/api/correct', correct_image, methods=['POST']),
+    Route('/api/jobs/{job_id}', get_progressive_job, methods=['GET']),
+    Route('/api/compare', compare_images, methods=['GET', 'POST']),
+    Route('/api/download', download_image, methods=['GET']),
+    Route('/api/lut', export_lut, methods=['GET']),
+    Route('/api/profiles', list_profiles, methods=['GET']),
+    Route('/api/profiles', save_profile, methods=['POST']),
+    Route('/api/batch', batch_correct, methods=['POST']),
+    Route('/api/reset', reset_session, methods=['POST']),
+    Route('/api/status', get_status, methods=['GET']),
+]
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """启动预热在线程池中执行，完成后才开始接受请求 (COLOR_CORRECT_WARMUP=0 时跳过)"""
+    if os.environ.get('COLOR_CORRECT_WARMUP') != '0' and warmup_status['state'] == 'pending':
+        await run_in(compute_executor, warm_up_server)
+    yield
+
+
+async def not_found(request, exc):
+    """404 错误处理"""
+    return error('页面未找到', 404)
+
+
+async def internal_error(request, exc):
+    """500 错误处理"""
+    return error('服务器内部错误', 500)
+
+
+app = Starlette(
+    routes=routes,
+    exception_handlers={404: not_found, 500: internal_error},
+    lifespan=lifespan
+)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+app.add_middleware(MetricsMiddleware)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("=" * 60)
+    print("颜色校正系统 Web 服务器 (ASGI)")
+    print("=" * 60)
+    print("访问地址: http://localhost:8000")
+    print("=" * 60)
+    uvicorn.run(app, host='0.0.0.0', port=8000)
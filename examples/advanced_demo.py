@@ -12,96 +12,27 @@ from pathlib import Path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from src.pipeline import ColorCorrectionPipeline
+from src.staged import StagedPipeline
 from src.color_checker_detector import ColorCheckerDetector
 from src.color_space import ColorSpace
+from src.synthetic import render_chart, render_scene
 
 
-def create_realistic_calibration_image():
+def create_realistic_calibration_image(seed: int = 0):
     """
     创建更逼真的校准图像
-    模拟实际的 ColorChecker 拍摄
+    模拟实际的 ColorChecker 拍摄：纹理背景、轻微旋转和透视、相机噪声
     """
-    image = np.ones((600, 800, 3), dtype=np.uint8) * 180
-    
-    # 添加背景纹理
-    for i in range(0, 600, 20):
-        for j in range(0, 800, 20):
-            if (i // 20 + j // 20) % 2 == 0:
-                image[i:i+20, j:j+20] = np.clip(
-                    image[i:i+20, j:j+20].astype(np.float32) * 0.95,
-                    0, 255
-                ).astype(np.uint8)
-    
-    # 获取标准色卡颜色
-    detector = ColorCheckerDetector()
-    colors = detector.get_reference_colors()
-    
-    # 绘制 6x4 的色卡
-    patch_size = 80
-    start_x, start_y = 100, 100
-    
-    for idx, color in enumerate(colors):
-        row = idx // 6
-        col = idx % 6
-        
-        x1 = start_x + col * patch_size
-        y1 = start_y + row * patch_size
-        x2 = x1 + patch_size
-        y2 = y1 + patch_size
-        
-        # 转换 BGR 格式
-        color_bgr = color[::-1]
-        cv2.rectangle(image, (x1, y1), (x2, y2), tuple(color_bgr), -1)
-        
-        # 添加边框
-        cv2.rectangle(image, (x1, y1), (x2, y2), (100, 100, 100), 2)
-    
-    # 添加高斯噪声模拟相机噪声
-    noise = np.random.normal(0, 5, image.shape)
-    image = np.clip(image.astype(np.float32) + noise, 0, 255).astype(np.uint8)
-    
-    return image
+    return render_chart(800, 600, seed=seed, rotation=4, perspective=0.03,
+                        noise=5, background='texture')
 
 
-def create_realistic_target_image():
+def create_realistic_target_image(seed: int = 1):
     """
     创建更逼真的目标图像
-    模拟手机拍照的色差
+    模拟手机拍照的色差（增加红色、减少绿色和蓝色）以及相机噪声
     """
-    # 创建一个包含多种颜色的图像
-    image = np.ones((400, 600, 3), dtype=np.uint8) * 200
-    
-    # 定义颜色块
-    color_blocks = [
-        ([255, 0, 0], "红色"),
-        ([0, 255, 0], "绿色"),
-        ([0, 0, 255], "蓝色"),
-        ([255, 255, 0], "黄色"),
-        ([255, 0, 255], "洋红"),
-        ([0, 255, 255], "青色"),
-    ]
-    
-    for idx, (color, name) in enumerate(color_blocks):
-        x1 = (idx % 3) * 200
-        y1 = (idx // 3) * 200
-        x2 = x1 + 200
-        y2 = y1 + 200
-        
-        color_bgr = color[::-1]
-        cv2.rectangle(image, (x1, y1), (x2, y2), tuple(color_bgr), -1)
-    
-    # 模拟手机拍照的色差
-    # 增加红色偏差，减少绿色，蓝色偏移
-    image_float = image.astype(np.float32)
-    image_float[:, :, 2] = np.clip(image_float[:, :, 2] * 1.25, 0, 255)  # 增加红色
-    image_float[:, :, 1] = np.clip(image_float[:, :, 1] * 0.85, 0, 255)  # 减少绿色
-    image_float[:, :, 0] = np.clip(image_float[:, :, 0] * 0.95, 0, 255)  # 减少蓝色
-    
-    # 添加高斯噪声
-    noise = np.random.normal(0, 3, image_float.shape)
-    image_float = np.clip(image_float + noise, 0, 255)
-    
-    return image_float.astype(np.uint8)
+    return render_scene(600, 400, seed=seed, shapes=8, noise=3, illuminant=(1.25, 0.85, 0.95))
 
 
 def demo_method_comparison():
@@ -114,28 +45,20 @@ def demo_method_comparison():
     calibration_image = create_realistic_calibration_image()
     target_image = create_realistic_target_image()
     
-    methods = ['polynomial', 'lut_3d', 'direct_mapping']
-    results = {}
+    # 色卡只检测一次，各方法并行训练和校正，共用目标图像的 LAB 转换结果
+    pipeline = ColorCorrectionPipeline()
+    comparison = pipeline.compare_methods(calibration_image, target_image)
     
-    for method in methods:
-        print(f"\n使用方法: {method}")
-        
-        pipeline = ColorCorrectionPipeline(correction_method=method)
-        corrected, info = pipeline.process(calibration_image, target_image)
-        
-        if info['status'] == 'success':
-            # 计算统计信息
-            stats = pipeline.compare_images(target_image, corrected)
-            results[method] = {
-                'image': corrected,
-                'stats': stats
-            }
-            
-            print(f"  ✓ 校正成功")
-            print(f"    平均 Delta E: {stats['mean_delta_e']:.2f}")
-            print(f"    最大 Delta E: {stats['max_delta_e']:.2f}")
-        else:
-            print(f"  ✗ 校正失败")
+    if comparison['status'] != 'success':
+        print(f"  ✗ 校正失败: {comparison['status']}")
+        return
+    
+    results = {}
+    for result in comparison['results']:
+        if 'error' in result:
+            print(f"\n{result['method']}: ✗ 校正失败 ({result['error']})")
+            continue
+        results[result['method']] = result
     
     # 保存结果
     output_dir = Path(__file__).parent.parent / 'output'
@@ -154,16 +77,20 @@ def demo_method_comparison():
             cv2.cvtColor(result['image'], cv2.COLOR_RGB2BGR)
         )
     
-    # 打印对比总结
+    # 打印对比总结 (按留一法残差排序)
     print("\n" + "-"*60)
     print("方法对比总结:")
     print("-"*60)
     for method, result in results.items():
-        stats = result['stats']
-        print(f"\n{method}:")
-        print(f"  平均 Delta E: {stats['mean_delta_e']:.2f}")
-        print(f"  最大 Delta E: {stats['max_delta_e']:.2f}")
+        stats = result['difference']
+        print(f"\n#{result['rank']} {method}:")
+        print(f"  留一法 Delta E: {result['holdout_delta_e']:.2f} (训练残差 {result['mean_delta_e']:.2f})")
+        print(f"  耗时: 训练 {result['train_seconds']:.3f} 秒，校正 {result['correct_seconds']:.3f} 秒")
+        print(f"  与原图平均 Delta E: {stats['mean_delta_e']:.2f}")
+        print(f"  与原图最大 Delta E: {stats['max_delta_e']:.2f}")
         print(f"  标准差: {stats['std_delta_e']:.2f}")
+    
+    print(f"\n推荐方法: {comparison['best']}")
 
 
 def demo_batch_processing():
@@ -185,27 +112,24 @@ def demo_batch_processing():
     
     print("✓ 校准成功")
     
-    # 处理多个目标图像
+    # 处理多个目标图像：解码 → 校正 → 编码 分阶段重叠执行
     output_dir = Path(__file__).parent.parent / 'output'
     output_dir.mkdir(exist_ok=True)
     
-    for i in range(3):
-        print(f"\n处理图像 {i+1}/3...")
-        
-        # 创建目标图像
-        target_image = create_realistic_target_image()
-        
-        # 校正
-        corrected = pipeline.correct_image(target_image)
-        
-        # 保存结果
-        output_path = output_dir / f'batch_corrected_{i+1}.jpg'
-        cv2.imwrite(
-            str(output_path),
-            cv2.cvtColor(corrected, cv2.COLOR_RGB2BGR)
-        )
-        
-        print(f"  ✓ 已保存: {output_path}")
+    staged = StagedPipeline(
+        pipeline,
+        correct_workers=2,
+        decoder=lambda source: create_realistic_target_image(seed=source + 1)
+    )
+    tasks = [(i, output_dir / f'batch_corrected_{i+1}.jpg') for i in range(3)]
+    
+    for item in staged.run(tasks):
+        if item.success:
+            print(f"  ✓ 已保存: {item.result}")
+        else:
+            print(f"  ✗ 图像 {item.index + 1} 处理失败: {item.error}")
+    
+    print(f"\n吞吐量: {staged.throughput:.2f} 张/秒，瓶颈阶段: {staged.bottleneck}")
 
 
 def demo_color_analysis():
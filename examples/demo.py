@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from src.pipeline import ColorCorrectionPipeline
 from src.color_checker_detector import ColorCheckerDetector
 from src.color_space import ColorSpace
+from src.synthetic import render_chart, render_scene
 
 
 def create_synthetic_calibration_image():
@@ -22,66 +23,15 @@ def create_synthetic_calibration_image():
     创建合成的校准图像（包含色卡）
     用于演示目的
     """
-    # 创建 800x600 的图像
-    image = np.ones((600, 800, 3), dtype=np.uint8) * 200
-    
-    # 获取标准色卡颜色
-    detector = ColorCheckerDetector()
-    colors = detector.get_reference_colors()
-    
-    # 绘制 6x4 的色卡
-    patch_size = 80
-    start_x, start_y = 100, 100
-    
-    for idx, color in enumerate(colors):
-        row = idx // 6
-        col = idx % 6
-        
-        x1 = start_x + col * patch_size
-        y1 = start_y + row * patch_size
-        x2 = x1 + patch_size
-        y2 = y1 + patch_size
-        
-        # 转换 BGR 格式用于 OpenCV
-        color_bgr = color[::-1]
-        cv2.rectangle(image, (x1, y1), (x2, y2), tuple(color_bgr), -1)
-    
-    return image
+    return render_chart(800, 600, seed=0, background='flat')
 
 
 def create_synthetic_target_image():
     """
     创建合成的目标图像
-    模拟手机拍照的色差
+    模拟手机拍照的色差（偏红、偏绿不足）
     """
-    # 创建一个彩色图像
-    image = np.ones((400, 600, 3), dtype=np.uint8)
-    
-    # 添加不同的颜色块
-    colors = [
-        [255, 0, 0],      # 红
-        [0, 255, 0],      # 绿
-        [0, 0, 255],      # 蓝
-        [255, 255, 0],    # 黄
-        [255, 0, 255],    # 洋红
-        [0, 255, 255],    # 青
-    ]
-    
-    for idx, color in enumerate(colors):
-        x1 = (idx % 3) * 200
-        y1 = (idx // 3) * 200
-        x2 = x1 + 200
-        y2 = y1 + 200
-        
-        color_bgr = color[::-1]
-        cv2.rectangle(image, (x1, y1), (x2, y2), tuple(color_bgr), -1)
-    
-    # 模拟手机拍照的色差（增加红色偏差）
-    image_float = image.astype(np.float32)
-    image_float[:, :, 2] = np.clip(image_float[:, :, 2] * 1.3, 0, 255)  # 增加红色
-    image_float[:, :, 1] = np.clip(image_float[:, :, 1] * 0.9, 0, 255)  # 减少绿色
-    
-    return image_float.astype(np.uint8)
+    return render_scene(600, 400, seed=1, shapes=6, illuminant=(1.3, 0.9, 1.0))
 
 
 def demo_basic_correction():
@@ -0,0 +1,205 @@
+"""
+Web 服务并发压测脚本
+对比 Flask 版本 (app.py) 与 ASGI 版本 (asgi_app.py) 在并发请求下的吞吐量和延迟
+
+用法:
+    # 自动启动两个服务器并依次压测
+    python load_test.py --spawn
+
+    # 压测已经在运行的服务器
+    python load_test.py --url http://localhost:8000 --url http://localhost:8001
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.synthetic import render_chart
+
+TIMEOUT = 120
+
+
+def create_chart_image(width, height):
+    """创建包含 24 色卡的测试图像"""
+    return render_chart(width, height, seed=0, noise=2, illuminant='tungsten')
+
+
+def encode_png(image_rgb):
+    """RGB 图像编码为 PNG 字节"""
+    _, buffer = cv2.imencode('.png', cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR))
+    return buffer.tobytes()
+
+
+def percentile(values, q):
+    """计算百分位数 (毫秒)"""
+    if not values:
+        return float('nan')
+    return float(np.percentile(np.array(values) * 1000, q))
+
+
+def prepare_session(base_url, width, height):
+    """上传校准图像和目标图像"""
+    image = encode_png(create_chart_image(width, height))
+    for image_type in ('calibration', 'target'):
+        response = requests.post(
+            f'{base_url}/api/upload',
+            files={'file': (f'{image_type}.png', image, 'image/png')},
+            data={'type': image_type},
+            timeout=TIMEOUT
+        )
+        response.raise_for_status()
+
+
+def run_load(base_url, concurrency, requests_count, method):
+    """
+    并发发送校正请求，同时持续探测 /api/status 的延迟
+
+    Returns:
+        结果统计字典
+    """
+    correct_latencies = []
+    status_latencies = []
+    errors = []
+    stop_probe = threading.Event()
+
+    def correct_once(_):
+        start = time.perf_counter()
+        try:
+            response = requests.post(f'{base_url}/api/correct', json={'method': method}, timeout=TIMEOUT)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                return
+        except requests.RequestException as e:
+            errors.append(str(e))
+            return
+        correct_latencies.append(time.perf_counter() - start)
+
+    def probe_status():
+        # 轻量请求的延迟反映服务器在繁忙时是否仍能及时响应
+        while not stop_probe.is_set():
+            start = time.perf_counter()
+            try:
+                requests.get(f'{base_url}/api/status', timeout=TIMEOUT)
+            except requests.RequestException:
+                continue
+            status_latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    probe = threading.Thread(target=probe_status, daemon=True)
+    probe.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(correct_once, range(requests_count)))
+    elapsed = time.perf_counter() - start
+
+    stop_probe.set()
+    probe.join()
+
+    return {
+        'elapsed': elapsed,
+        'throughput': len(correct_latencies) / elapsed if elapsed > 0 else 0.0,
+        'correct_p50': percentile(correct_latencies, 50),
+        'correct_p95': percentile(correct_latencies, 95),
+        'status_p50': percentile(status_latencies, 50),
+        'status_p95': percentile(status_latencies, 95),
+        'errors': len(errors)
+    }
+
+
+def wait_for_server(base_url, timeout=60):
+    """等待服务器就绪"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{base_url}/api/status', timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def spawn_servers(flask_port, asgi_port):
+    """启动 Flask 和 ASGI 两个服务器"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    flask_proc = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run',
+         '--port', str(flask_port), '--no-reload', '--no-debugger', '--with-threads'],
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    asgi_proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--port', str(asgi_port),
+         '--log-level', 'warning'],
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return [
+        ('flask', f'http://127.0.0.1:{flask_port}', flask_proc),
+        ('asgi', f'http://127.0.0.1:{asgi_port}', asgi_proc),
+    ]
+
+
+def print_results(results):
+    """打印对比表格"""
+    print("\n" + "="*60)
+    print("压测结果")
+    print("="*60)
+    header = f"{'服务器':<10}{'吞吐(req/s)':>12}{'校正p50':>10}{'校正p95':>10}{'状态p50':>10}{'状态p95':>10}{'错误':>6}"
+    print(header)
+    for name, stats in results:
+        print(f"{name:<10}{stats['throughput']:>12.2f}"
+              f"{stats['correct_p50']:>9.0f}ms{stats['correct_p95']:>8.0f}ms"
+              f"{stats['status_p50']:>8.0f}ms{stats['status_p95']:>8.0f}ms"
+              f"{stats['errors']:>6}")
+    print("="*60 + "\n")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='颜色校正 Web 服务并发压测')
+    parser.add_argument('--url', action='append', default=[], help='服务器地址，可指定多个')
+    parser.add_argument('--spawn', action='store_true', help='自动启动 Flask 和 ASGI 服务器进行对比')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='并发数 (默认: 8)')
+    parser.add_argument('-n', '--requests', type=int, default=32, help='校正请求总数 (默认: 32)')
+    parser.add_argument('-m', '--method', default='polynomial', help='校正方法 (默认: polynomial)')
+    parser.add_argument('--size', default='1600x1200', help='测试图像尺寸 (默认: 1600x1200)')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split('x'))
+
+    servers = [(url, url, None) for url in args.url]
+    if args.spawn:
+        servers += spawn_servers(8101, 8102)
+    if not servers:
+        parser.error('请指定 --url 或 --spawn')
+
+    results = []
+    try:
+        for name, base_url, _ in servers:
+            print(f"压测 {name} ({base_url}) ...")
+            if not wait_for_server(base_url):
+                print(f"✗ 服务器未就绪: {base_url}")
+                continue
+            prepare_session(base_url, width, height)
+            results.append((name, run_load(base_url, args.concurrency, args.requests, args.method)))
+    finally:
+        for _, _, proc in servers:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
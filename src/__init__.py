@@ -3,10 +3,15 @@
 用于手机拍照的颜色校正和色差补偿
 """
 
-from .color_space import ColorSpace
-from .color_checker_detector import ColorCheckerDetector
-from .color_corrector import ColorCorrector
-from .pipeline import ColorCorrectionPipeline
+import importlib
+
+# 导出的类在首次访问时才导入对应模块，import src 和 python -m src.cli 无需加载全部依赖
+_EXPORTS = {
+    'ColorSpace': '.color_space',
+    'ColorCheckerDetector': '.color_checker_detector',
+    'ColorCorrector': '.color_corrector',
+    'ColorCorrectionPipeline': '.pipeline',
+}
 
 __all__ = [
     'ColorSpace',
@@ -17,3 +22,14 @@ __all__ = [
 
 __version__ = '1.0.0'
 
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
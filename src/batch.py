@@ -0,0 +1,305 @@
+"""
+批量处理模块
+校准一次后使用多进程校正目录/通配符匹配到的所有目标图像
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .model_io import load_model
+from .pipeline import ColorCorrectionPipeline
+from .staged import StagedPipeline, write_image
+from .lazy import LazyModule
+
+cv2 = LazyModule('cv2')
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff'}
+
+
+def is_batch_pattern(path: str) -> bool:
+    """路径是否为目录或通配符"""
+    return os.path.isdir(path) or glob.has_magic(path)
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[Path]:
+    """
+    展开输入路径
+
+    Args:
+        patterns: 文件、目录 (取其中的图像文件) 或通配符 (支持 **)
+
+    Returns:
+        去重后的图像路径列表，保持输入顺序，目录和通配符内按文件名排序
+    """
+    paths = []
+    seen = set()
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(p for p in Path(pattern).iterdir()
+                             if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+        elif glob.has_magic(pattern):
+            matches = sorted(Path(p) for p in glob.glob(pattern, recursive=True)
+                             if Path(p).suffix.lower() in IMAGE_EXTENSIONS and os.path.isfile(p))
+        else:
+            matches = [Path(pattern)]
+
+        for path in matches:
+            key = path.resolve()
+            if key not in seen:
+                seen.add(key)
+                paths.append(path)
+
+    return paths
+
+
+def plan_outputs(inputs: List[Path], output_dir: Path, suffix: str = '_corrected') -> List[Path]:
+    """
+    为每个输入生成输出路径，保留原扩展名，重名时追加序号
+    """
+    outputs = []
+    used = set()
+
+    for path in inputs:
+        candidate = output_dir / f'{path.stem}{suffix}{path.suffix}'
+        index = 1
+        while candidate in used:
+            candidate = output_dir / f'{path.stem}{suffix}_{index}{path.suffix}'
+            index += 1
+        used.add(candidate)
+        outputs.append(candidate)
+
+    return outputs
+
+
+@dataclass
+class BatchItemResult:
+    """单张图像的处理结果"""
+    input_path: str
+    output_path: str
+    success: bool
+    seconds: float
+    error: Optional[str] = None
+    input_hash: Optional[str] = None
+
+
+@dataclass
+class BatchResult:
+    """批量处理结果"""
+    items: List[BatchItemResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for item in self.items if item.success)
+
+    @property
+    def failed(self) -> int:
+        return len(self.items) - self.succeeded
+
+    @property
+    def throughput(self) -> float:
+        """每秒处理的图像数"""
+        return self.succeeded / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def file_digest(path) -> str:
+    """文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    批量任务清单 (JSON Lines，每完成一张图像追加一行)
+
+    任务中断后重新运行时，输入内容、模型和输出都未变化的图像会被跳过，
+    重新处理的开销只与缺失的部分成正比
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries: Dict[str, dict] = {}
+
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 进程中断时最后一行可能不完整
+                        continue
+                    # 同一输入以最后一条记录为准
+                    self.entries[entry['input']] = entry
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def key(path) -> str:
+        return str(Path(path).resolve())
+
+    def is_done(self, input_path, output_path, profile_id: str) -> bool:
+        """
+        输入是否已经用同一模型处理完成，且输出仍然有效
+
+        输入文件的大小和修改时间与记录一致时直接信任记录的哈希，否则重新计算内容哈希
+        """
+        entry = self.entries.get(self.key(input_path))
+        if (entry is None or entry.get('status') != 'done' or entry.get('profile') != profile_id
+                or entry.get('output') != self.key(output_path)):
+            return False
+
+        try:
+            if os.path.getsize(output_path) != entry.get('output_size'):
+                return False
+            stat = os.stat(input_path)
+        except OSError:
+            return False
+
+        if stat.st_size == entry.get('input_size') and stat.st_mtime_ns == entry.get('input_mtime_ns'):
+            return True
+        return file_digest(input_path) == entry.get('input_hash')
+
+    def record(self, item: BatchItemResult, profile_id: str):
+        """追加一条记录并立即刷新到磁盘"""
+        entry = {
+            'input': self.key(item.input_path),
+            'input_hash': item.input_hash,
+            'profile': profile_id,
+            'output': self.key(item.output_path),
+            'seconds': round(item.seconds, 4),
+            'status': 'done' if item.success else 'failed',
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        try:
+            stat = os.stat(item.input_path)
+            entry.update(input_size=stat.st_size, input_mtime_ns=stat.st_mtime_ns)
+            if item.success:
+                entry['output_size'] = os.path.getsize(item.output_path)
+        except OSError:
+            entry['status'] = 'failed'
+        if item.error:
+            entry['error'] = item.error
+
+        self.entries[entry['input']] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 工作进程中的管道，由 _init_worker 从模型文件加载一次
+_worker_pipeline = None
+
+
+def _init_worker(model_path: str):
+    """
+    工作进程初始化：以内存映射方式加载模型
+    所有进程共享同一份模型文件，任务参数中只传递路径
+    """
+    global _worker_pipeline
+    _worker_pipeline = ColorCorrectionPipeline.from_corrector(load_model(model_path, mmap=True))
+
+
+def _read_input(path: str) -> Tuple[np.ndarray, str]:
+    """读取并解码输入图像，同时计算内容哈希 (只读一次文件)"""
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        raise FileNotFoundError(f"无法加载图像: {path}") from None
+
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"无法解码图像: {path}")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), hashlib.sha256(data).hexdigest()
+
+
+def _correct_file(task: Tuple[str, str]) -> BatchItemResult:
+    """校正单个文件 (在工作进程中执行)"""
+    input_path, output_path = task
+    start = time.perf_counter()
+    digest = None
+
+    try:
+        image, digest = _read_input(input_path)
+        corrected = _worker_pipeline.correct_image(image)
+        write_image(corrected, output_path)
+    except Exception as e:
+        return BatchItemResult(input_path, output_path, False, time.perf_counter() - start, str(e), digest)
+
+    return BatchItemResult(input_path, output_path, True, time.perf_counter() - start, input_hash=digest)
+
+
+def run_batch(model_path: str, inputs: List[Path], outputs: List[Path],
+              jobs: int = 1, on_result=None) -> BatchResult:
+    """
+    批量校正
+
+    Args:
+        model_path: 已保存的模型文件 (见 model_io / 校准配置)
+        inputs: 输入图像路径
+        outputs: 对应的输出路径
+        jobs: 工作进程数，1 表示在当前进程中以分阶段管道执行
+        on_result: 每完成一张图像时调用 on_result(index, BatchItemResult)，按输入顺序
+
+    Returns:
+        BatchResult
+    """
+    tasks = [(str(src), str(dst)) for src, dst in zip(inputs, outputs)]
+    for dst in {Path(dst).parent for _, dst in tasks}:
+        dst.mkdir(parents=True, exist_ok=True)
+
+    result = BatchResult()
+    start = time.perf_counter()
+
+    if jobs <= 1:
+        # 单进程时解码、校正、编码分阶段重叠执行
+        digests = {}
+
+        def decode(source):
+            image, digests[source] = _read_input(source)
+            return image
+
+        staged = StagedPipeline(ColorCorrectionPipeline.from_corrector(load_model(model_path, mmap=True)),
+                                decoder=decode)
+        results = (BatchItemResult(item.source, item.destination, item.success,
+                                   sum(item.timings.values()), item.error, digests.pop(item.source, None))
+                   for item in staged.run(tasks))
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                       initargs=(model_path,))
+        # map 按提交顺序返回结果，保证输出顺序与输入一致
+        results = executor.map(_correct_file, tasks, chunksize=1)
+
+    try:
+        for index, item in enumerate(results):
+            result.items.append(item)
+            if on_result is not None:
+                on_result(index, item)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    result.elapsed = time.perf_counter() - start
+    return result
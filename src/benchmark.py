@@ -0,0 +1,401 @@
+"""
+性能基准测试
+覆盖颜色空间转换、色卡检测、色差统计以及各校正方法的训练和校正，
+可指定图像尺寸 (百万像素) 和线程数，输出 JSON 结果并与保存的基线比较
+
+用法:
+    python -m src.benchmark --sizes 1,4 --threads 1,4 -o results.json
+    python -m src.benchmark --baseline benchmarks/baseline.json --threshold 0.15
+    python -m src.benchmark --sizes 1,4,12,24,48 --save-baseline benchmarks/baseline.json
+    python -m src.benchmark --sizes 1,4 --memory --baseline benchmarks/baseline.json
+    python -m src.benchmark --startup --methods '' --sizes ''
+    python -m src.benchmark --sizes 0.25,1,4 --modes dense,tiled,threaded,baked --cost-model cost_model.json
+
+测试图像由 synthetic 模块按固定种子生成，不同机器上的输入完全一致
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import statistics
+import contextlib
+import cv2
+import numpy as np
+from typing import Callable, List, Optional
+
+from .color_space import ColorSpace
+from .color_checker_detector import ColorCheckerDetector
+from .color_corrector import ColorCorrector, METHODS, MODES
+from .color_difference import compare_images
+from .conversion_cache import available_memory
+from .profiling import MemoryProfiler
+from .synthetic import expected_patch_colors, image_size, render_chart
+
+
+# 试运行使用的图像尺寸 (百万像素)，据此估算正式用例的耗时
+PILOT_MEGAPIXELS = 0.02
+
+# 单个用例处理每个像素大约需要的内存 (字节)，用于跳过超出可用内存的用例
+BYTES_PER_PIXEL = 120
+
+# 启动耗时用例：在新的解释器进程中执行的语句 (startup.python 为解释器本身的启动耗时)
+STARTUP_CASES = (
+    ('startup.python', 'pass'),
+    ('startup.import_src', 'import src'),
+    ('startup.import_pipeline', 'import src.pipeline'),
+    ('startup.import_cli', 'import src.cli'),
+)
+
+
+def chart_image(megapixels: float, seed: int = 0) -> np.ndarray:
+    """生成指定像素数的带色偏色卡图像 (确定性)"""
+    width, height = image_size(megapixels)
+    return render_chart(width, height, seed=seed, rotation=3, perspective=0.02, noise=2,
+                        illuminant='tungsten')
+
+
+def train_corrector(method: str) -> ColorCorrector:
+    """用钨丝灯色偏下的色卡颜色训练校正器"""
+    reference = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+    captured = expected_patch_colors('tungsten').astype(np.float32)
+    corrector = ColorCorrector(method=method)
+    corrector.train(reference, captured)
+    return corrector
+
+
+@contextlib.contextmanager
+def thread_limit(threads: int):
+    """限制 OpenCV 和 BLAS (需要 threadpoolctl) 使用的线程数"""
+    previous = cv2.getNumThreads()
+    cv2.setNumThreads(threads)
+    try:
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            yield
+        else:
+            with threadpool_limits(limits=threads):
+                yield
+    finally:
+        cv2.setNumThreads(previous)
+
+
+def measure(func: Callable[[], object], repeat: int) -> List[float]:
+    """重复执行并返回每次的耗时 (秒)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_memory(func: Callable[[], object]) -> dict:
+    """
+    在 tracemalloc 跟踪下执行一次，记录总峰值和各阶段峰值分配量
+
+    Returns:
+        {'peak_bytes': 总峰值, 'stages': {阶段: 峰值}}
+    """
+    profiler = MemoryProfiler()
+    with profiler.activate():
+        func()
+    return {
+        'peak_bytes': profiler.peak_bytes,
+        'stages': {stage: entry['peak_bytes'] for stage, entry in profiler.report().items()}
+    }
+
+
+def measure_startup(statement: str, repeat: int) -> List[float]:
+    """在新的解释器进程中执行语句，返回每次从启动到退出的耗时 (秒)"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=root, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_startup_benchmarks(repeat: int = 5, log=None) -> List[dict]:
+    """
+    测量包和命令行工具的启动耗时 (导入时间)
+
+    Returns:
+        用例结果列表，格式与 run_benchmarks 的结果相同
+    """
+    log = log or sys.stderr
+    results = []
+    for name, statement in STARTUP_CASES:
+        result = _result(name, None, 1, measure_startup(statement, repeat))
+        results.append(result)
+        print(f"  {name:<28} {'-':>8} {1:>3} 线程 {result['median_seconds'] * 1000:>10.2f} ms", file=log)
+    return results
+
+
+def _cases(methods, modes=('dense',)):
+    """
+    基准用例: (名称, 是否与图像尺寸相关, 构造函数)
+    构造函数接收测试图像 (尺寸无关的用例为 None)，返回待计时的无参函数；
+    dense 以外的执行方式命名为 correct.<方法>.<执行方式>
+    """
+    cases = [
+        ('colorspace.rgb_to_lab', True, lambda image: lambda: ColorSpace.rgb_to_lab(image)),
+        ('colorspace.lab_to_rgb', True,
+         lambda image: (lambda lab: lambda: ColorSpace.lab_to_rgb(lab))(ColorSpace.rgb_to_lab(image))),
+        ('detector.detect', True, lambda image: lambda: ColorCheckerDetector().detect(image)),
+        ('compare.ciede2000', True, lambda image: lambda: compare_images(image, image[::-1])),
+    ]
+
+    for method in methods:
+        cases.append((f'train.{method}', False, lambda _, m=method: lambda: train_corrector(m)))
+        for mode in modes:
+            name = f'correct.{method}' if mode == 'dense' else f'correct.{method}.{mode}'
+            cases.append((name, True, lambda image, m=method, mode=mode:
+                          (lambda c: lambda: c.correct(image, mode=mode))(train_corrector(m))))
+
+    return cases
+
+
+def run_benchmarks(sizes: List[float], threads: List[int], methods=METHODS, repeat: int = 3,
+                   max_case_seconds: float = 60.0, memory: bool = False, log=None,
+                   modes=('dense',)) -> dict:
+    """
+    运行基准测试
+
+    Args:
+        sizes: 图像尺寸列表 (百万像素)
+        threads: 线程数列表
+        methods: 校正方法
+        repeat: 每个用例的重复次数
+        max_case_seconds: 估算耗时 (重复次数之和) 超过该值的用例跳过
+        memory: 是否额外执行一次内存跟踪，记录峰值分配 (peak_bytes) 和各阶段峰值
+        log: 进度输出流
+        modes: 校正用例的执行方式 (见 ColorCorrector.MODES)
+
+    Returns:
+        {'meta': 环境信息, 'results': [用例结果, ...]}
+    """
+    log = log or sys.stderr
+    results = []
+    pilot_image = chart_image(PILOT_MEGAPIXELS)
+    free_memory = available_memory()
+
+    for threads_count in threads:
+        with thread_limit(threads_count):
+            for name, sized, build in _cases(methods, modes):
+                if not sized:
+                    func = build(None)
+                    # 不计时预热一次 (与有尺寸用例的试运行作用相同)，排除首次调用的一次性开销
+                    func()
+                    result = _result(name, None, threads_count, measure(func, repeat))
+                    if memory:
+                        result.update(measure_memory(func))
+                    results.append(result)
+                    print(f"  {name:<28} {'-':>8} {threads_count:>3} 线程 "
+                          f"{result['median_seconds'] * 1000:>10.2f} ms{_memory_text(result)}", file=log)
+                    continue
+
+                # 试运行一次小图像，按像素数线性估算耗时
+                pilot_seconds = min(measure(build(pilot_image), 1))
+
+                for size in sizes:
+                    entry = {'name': name, 'megapixels': size, 'threads': threads_count}
+                    estimate = pilot_seconds * size / PILOT_MEGAPIXELS * repeat
+                    if estimate > max_case_seconds:
+                        entry.update(skipped=True, reason=f'预计耗时 {estimate:.0f} 秒')
+                    elif free_memory is not None and size * 1e6 * BYTES_PER_PIXEL > free_memory:
+                        entry.update(skipped=True, reason='可用内存不足')
+
+                    if entry.get('skipped'):
+                        results.append(entry)
+                        print(f"  {name:<28} {size:>6g}MP {threads_count:>3} 线程 跳过 ({entry['reason']})",
+                              file=log)
+                        continue
+
+                    image = chart_image(size)
+                    func = build(image)
+                    result = _result(name, size, threads_count, measure(func, repeat))
+                    if memory:
+                        result.update(measure_memory(func))
+                    del image, func
+                    results.append(result)
+                    print(f"  {name:<28} {size:>6g}MP {threads_count:>3} 线程 "
+                          f"{result['median_seconds'] * 1000:>10.2f} ms "
+                          f"({size / result['median_seconds']:.2f} MP/s){_memory_text(result)}", file=log)
+
+    return {'meta': environment(), 'results': results}
+
+
+def _memory_text(result: dict) -> str:
+    if 'peak_bytes' not in result:
+        return ''
+    return f" 峰值 {result['peak_bytes'] / 1024 ** 2:.1f} MB"
+
+
+def _result(name, size, threads, timings) -> dict:
+    median = statistics.median(timings)
+    result = {
+        'name': name,
+        'megapixels': size,
+        'threads': threads,
+        'repeat': len(timings),
+        'median_seconds': median,
+        'min_seconds': min(timings),
+    }
+    if size:
+        result['megapixels_per_second'] = size / median if median > 0 else None
+    return result
+
+
+def environment() -> dict:
+    """运行环境信息"""
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def _key(result: dict) -> tuple:
+    return (result['name'], result['megapixels'], result['threads'])
+
+
+def compare_to_baseline(current: dict, baseline: dict, threshold: float = 0.10) -> List[dict]:
+    """
+    与基线比较
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+        threshold: 允许的变慢比例，例如 0.10 表示中位耗时增加超过 10% 视为退化；
+            双方都记录了峰值内存时，峰值增加超过同一比例也视为退化
+
+    Returns:
+        每个共同用例的比较结果，regression 为 True 表示超过阈值
+    """
+    previous = {_key(r): r for r in baseline.get('results', []) if not r.get('skipped')}
+    comparisons = []
+
+    for result in current.get('results', []):
+        if result.get('skipped') or _key(result) not in previous:
+            continue
+        before = previous[_key(result)]['median_seconds']
+        after = result['median_seconds']
+        change = (after - before) / before if before > 0 else 0.0
+        comparison = {
+            'name': result['name'],
+            'megapixels': result['megapixels'],
+            'threads': result['threads'],
+            'baseline_seconds': before,
+            'current_seconds': after,
+            'change': change,
+            'regression': change > threshold
+        }
+
+        before_bytes = previous[_key(result)].get('peak_bytes')
+        if before_bytes is not None and result.get('peak_bytes') is not None:
+            memory_change = (result['peak_bytes'] - before_bytes) / before_bytes if before_bytes > 0 else 0.0
+            comparison.update(baseline_peak_bytes=before_bytes, current_peak_bytes=result['peak_bytes'],
+                              memory_change=memory_change, memory_regression=memory_change > threshold)
+            comparison['regression'] = comparison['regression'] or comparison['memory_regression']
+
+        comparisons.append(comparison)
+
+    return comparisons
+
+
+def _parse_list(value: str, cast):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='颜色校正性能基准测试')
+    parser.add_argument('--sizes', default='1,4', help='图像尺寸 (百万像素)，逗号分隔 (默认: 1,4)')
+    parser.add_argument('--threads', default='1', help='线程数，逗号分隔 (默认: 1)')
+    parser.add_argument('--methods', default=','.join(METHODS), help='校正方法，逗号分隔 (默认: 全部)')
+    parser.add_argument('--modes', default='dense',
+                        help=f"校正的执行方式，逗号分隔 (可选: {','.join(MODES)}，默认: dense)")
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的重复次数 (默认: 3)')
+    parser.add_argument('--max-case-seconds', type=float, default=60.0,
+                        help='预计耗时超过该值的用例跳过 (默认: 60)')
+    parser.add_argument('--startup', action='store_true',
+                        help='同时测量包和命令行工具的启动耗时')
+    parser.add_argument('--memory', action='store_true',
+                        help='额外执行一次内存跟踪，记录峰值分配和各阶段峰值')
+    parser.add_argument('-o', '--output', help='结果 JSON 输出路径 (默认输出到 stdout)')
+    parser.add_argument('--baseline', help='与该基线 JSON 比较')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='中位耗时增加超过该比例视为性能退化 (默认: 0.10)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='将本次结果保存为基线')
+    parser.add_argument('--cost-model', metavar='PATH',
+                        help='由校正用例拟合 auto 方法的代价模型并保存 (见 planner 模块)')
+    args = parser.parse_args()
+
+    methods = _parse_list(args.methods, str)
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        parser.error(f"未知的校正方法: {', '.join(sorted(unknown))}")
+    modes = _parse_list(args.modes, str)
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"未知的执行方式: {', '.join(sorted(unknown))}")
+
+    print("运行基准测试...", file=sys.stderr)
+    results = run_benchmarks(_parse_list(args.sizes, float), _parse_list(args.threads, int),
+                             methods, args.repeat, args.max_case_seconds, args.memory, modes=modes)
+    if args.startup:
+        results['results'].extend(run_startup_benchmarks(max(args.repeat, 5)))
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"✓ 结果已保存: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"✓ 基线已保存: {args.save_baseline}", file=sys.stderr)
+
+    if args.cost_model:
+        from .planner import CostModel
+        CostModel.from_benchmark(results).save(args.cost_model)
+        print(f"✓ 代价模型已保存: {args.cost_model}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            comparisons = compare_to_baseline(results, json.load(f), args.threshold)
+
+        print(f"\n与基线比较 (阈值 {args.threshold:.0%}):", file=sys.stderr)
+        for c in comparisons:
+            size = f"{c['megapixels']:g}MP" if c['megapixels'] else '-'
+            mark = '✗' if c['regression'] else '✓'
+            memory_text = ''
+            if 'memory_change' in c:
+                memory_text = (f" 峰值 {c['baseline_peak_bytes'] / 1024 ** 2:.1f} → "
+                               f"{c['current_peak_bytes'] / 1024 ** 2:.1f} MB ({c['memory_change']:+.1%})")
+            print(f"  {mark} {c['name']:<28} {size:>8} {c['threads']:>3} 线程 "
+                  f"{c['baseline_seconds'] * 1000:>10.2f} → {c['current_seconds'] * 1000:>10.2f} ms "
+                  f"({c['change']:+.1%}){memory_text}", file=sys.stderr)
+
+        regressions = [c for c in comparisons if c['regression']]
+        if regressions:
+            print(f"\n✗ {len(regressions)} 个用例性能退化", file=sys.stderr)
+            sys.exit(1)
+        print("\n✓ 没有性能退化", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,27 @@
 用于快速进行颜色校正
 """
 
+import os
 import argparse
-import cv2
+import cProfile
+import contextlib
 import sys
+import tempfile
 from pathlib import Path
+from .batch import Manifest, expand_inputs, is_batch_pattern, plan_outputs, run_batch
+from .color_corrector import METHODS
+from .color_difference import SAMPLE_SIZE
+from .model_io import model_fingerprint
 from .pipeline import ColorCorrectionPipeline
+from .profiles import ProfileRegistry
+from .stream import FrameStreamer, parse_frame_size
+from .lazy import LazyModule
+
+# 色差公式的显示名称
+METRIC_NAMES = {'ciede2000': 'CIEDE2000', 'cie94': 'CIE94', 'cie76': 'CIE76'}
+
+# OpenCV 在首次使用时才导入，--list-profiles、--stream 等不读写图像文件的调用无需加载
+cv2 = LazyModule('cv2')
 
 
 def load_image(image_path: str):
@@ -28,6 +44,127 @@ def save_image(image, output_path: str):
     print(f"✓ 图像已保存: {output_path}")
 
 
+def list_profiles(registry: ProfileRegistry):
+    """打印已保存的校准配置"""
+    profiles = registry.list()
+    if not profiles:
+        print(f"没有已保存的校准配置 ({registry.root})")
+        return
+    
+    print(f"校准配置 ({registry.root}):")
+    for profile in profiles:
+        print(f"  {profile['name']:<24} {profile.get('method', '?'):<16} {profile.get('created_at', '')}")
+
+
+def run_batch_mode(args, registry: ProfileRegistry, calibration_path, target_patterns):
+    """批量模式：校准一次，多进程校正所有目标图像"""
+    inputs = expand_inputs(target_patterns)
+    if not inputs:
+        print("✗ 没有匹配的目标图像")
+        sys.exit(1)
+    
+    outputs = plan_outputs(inputs, Path(args.output_dir))
+    
+    print("\n" + "="*60)
+    print("颜色校正工具 - 批量模式")
+    print("="*60)
+    print(f"\n目标图像: {len(inputs)} 张，输出目录: {args.output_dir}，进程数: {args.jobs}")
+    
+    temp_model = None
+    try:
+        if args.profile:
+            # 配置文件本身就是序列化模型，工作进程直接映射
+            model_path = str(registry.path(args.profile))
+            pipeline = ColorCorrectionPipeline.from_profile(args.profile, registry)
+            print(f"使用校准配置: {args.profile} (方法: {pipeline.corrector.method})")
+        else:
+            print(f"\n加载校准图像: {calibration_path}")
+            pipeline = ColorCorrectionPipeline(correction_method=args.method)
+            if not pipeline.calibrate(load_image(calibration_path)):
+                print("✗ 校准失败")
+                sys.exit(1)
+            
+            if args.save_profile:
+                model_path = str(pipeline.save_profile(args.save_profile, registry, {
+                    'calibration_image': str(Path(calibration_path).resolve())
+                }))
+                print(f"✓ 校准配置已保存: {args.save_profile} ({model_path})")
+            else:
+                # 模型写入临时文件，工作进程以内存映射方式共享，不随任务重复传递
+                fd, temp_model = tempfile.mkstemp(suffix='.ccm')
+                os.close(fd)
+                pipeline.corrector.save(temp_model)
+                model_path = temp_model
+        
+        # 清单记录每张图像使用的模型，模型参数变化后已完成的图像也会重新处理
+        profile_id = f"{args.profile or pipeline.corrector.method}@{model_fingerprint(pipeline.corrector)}"
+        manifest = Manifest(args.manifest or Path(args.output_dir) / 'manifest.jsonl')
+        
+        if not args.force:
+            pending = [(src, dst) for src, dst in zip(inputs, outputs)
+                       if not manifest.is_done(src, dst, profile_id)]
+            skipped = len(inputs) - len(pending)
+            if skipped:
+                print(f"跳过已完成的图像: {skipped} 张 (清单: {manifest.path}，使用 --force 重新处理)")
+            inputs = [src for src, _ in pending]
+            outputs = [dst for _, dst in pending]
+        
+        total = len(inputs)
+        
+        def report(index, item):
+            manifest.record(item, profile_id)
+            if item.success:
+                print(f"  [{index + 1}/{total}] ✓ {item.input_path} -> {item.output_path} ({item.seconds:.2f}s)")
+            else:
+                print(f"  [{index + 1}/{total}] ✗ {item.input_path}: {item.error}")
+        
+        print("\n处理中...")
+        with manifest:
+            result = run_batch(model_path, inputs, outputs, jobs=args.jobs, on_result=report)
+    finally:
+        if temp_model is not None:
+            os.remove(temp_model)
+    
+    print(f"\n完成: 成功 {result.succeeded} 张，失败 {result.failed} 张，"
+          f"耗时 {result.elapsed:.2f} 秒，吞吐量 {result.throughput:.2f} 张/秒")
+    print("\n" + "="*60 + "\n")
+    
+    if result.failed:
+        sys.exit(1)
+
+
+def run_stream_mode(args, registry: ProfileRegistry):
+    """流模式：从 stdin 读取 rgb24 原始帧，校正后写入 stdout"""
+    width, height = parse_frame_size(args.stream)
+    output = sys.stdout.buffer
+    
+    # stdout 只用于输出帧数据，其他信息全部输出到 stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.profile:
+            pipeline = ColorCorrectionPipeline.from_profile(args.profile, registry)
+            print(f"使用校准配置: {args.profile} (方法: {pipeline.corrector.method})")
+        else:
+            pipeline = ColorCorrectionPipeline(correction_method=args.method)
+            if args.images:
+                print(f"加载校准图像: {args.images[0]}")
+                if not pipeline.calibrate(load_image(args.images[0])):
+                    print("✗ 校准失败")
+                    sys.exit(1)
+        
+        streamer = FrameStreamer(pipeline, width, height, recalibrate_interval=args.recalibrate,
+                                 smoothing=args.smoothing)
+        print(f"流模式: {width}x{height} rgb24，重新校准间隔: {args.recalibrate or '无'}")
+        
+        try:
+            stats = streamer.run(sys.stdin.buffer, output)
+        except BrokenPipeError:
+            print("✗ 输出管道已关闭")
+            sys.exit(1)
+        
+        print(f"完成: {stats.frames} 帧 (校正 {stats.corrected} 帧，校准 {stats.calibrations} 次)，"
+              f"耗时 {stats.elapsed:.2f} 秒，{stats.fps:.1f} fps")
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -35,13 +172,11 @@ def main():
     )
     
     parser.add_argument(
-        'calibration_image',
-        help='包含参考色卡的校准图像路径'
-    )
-    
-    parser.add_argument(
-        'target_image',
-        help='需要校正的目标图像路径'
+        'images',
+        nargs='*',
+        metavar='image',
+        help='校准图像和目标图像路径；使用 --profile 时只需目标图像。'
+             '目标可以是多个文件、目录或通配符 (批量模式)'
     )
     
     parser.add_argument(
@@ -50,11 +185,65 @@ def main():
         help='输出图像路径 (默认: corrected.jpg)'
     )
     
+    parser.add_argument(
+        '--output-dir',
+        default='corrected',
+        help='批量模式的输出目录 (默认: corrected)'
+    )
+    
+    parser.add_argument(
+        '--stream',
+        metavar='WxH',
+        help='流模式：从 stdin 读取 rgb24 原始帧 (例如 ffmpeg -f rawvideo -pix_fmt rgb24)，'
+             '校正后写入 stdout；此时可选的位置参数为校准图像'
+    )
+    
+    parser.add_argument(
+        '--recalibrate',
+        type=int,
+        default=0,
+        metavar='N',
+        help='流模式下每隔 N 帧用当前帧重新校准 (帧中需包含色卡，默认: 0 不重新校准)'
+    )
+    
+    parser.add_argument(
+        '--smoothing',
+        type=float,
+        default=0.0,
+        help='流模式重新校准时之前模型所占的权重 [0, 1)，用于平滑颜色变化 (默认: 0)'
+    )
+    
+    parser.add_argument(
+        '--manifest',
+        metavar='PATH',
+        help='批量模式的任务清单 (默认: 输出目录下的 manifest.jsonl)，重新运行时跳过已完成的图像'
+    )
+    
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='批量模式下忽略清单，重新处理所有图像'
+    )
+    
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='批量模式的工作进程数 (默认: 1，0 表示 CPU 核心数)'
+    )
+    
     parser.add_argument(
         '-m', '--method',
-        choices=['polynomial', 'lut_3d', 'direct_mapping'],
+        choices=[*METHODS, 'auto'],
         default='polynomial',
-        help='校正方法 (默认: polynomial)'
+        help='校正方法 (默认: polynomial)；auto 按 --latency-budget 和图像尺寸自动选择方法和执行方式'
+    )
+    
+    parser.add_argument(
+        '--latency-budget',
+        type=float,
+        metavar='SECONDS',
+        help='auto 方法单张图像的校正耗时预算 (秒，默认不限)'
     )
     
     parser.add_argument(
@@ -63,30 +252,185 @@ def main():
         help='生成对比图像'
     )
     
+    parser.add_argument(
+        '--profile',
+        metavar='NAME',
+        help='使用已保存的校准配置，跳过色卡检测和训练'
+    )
+    
+    parser.add_argument(
+        '--save-profile',
+        metavar='NAME',
+        help='校准成功后将模型保存为命名配置'
+    )
+    
+    parser.add_argument(
+        '--profile-dir',
+        metavar='DIR',
+        help='校准配置目录 (默认: ~/.color_correction/profiles 或 $COLOR_CORRECT_PROFILE_DIR)'
+    )
+    
+    parser.add_argument(
+        '--metric',
+        choices=list(METRIC_NAMES),
+        default='ciede2000',
+        help='色差公式 (默认: ciede2000)'
+    )
+    
+    parser.add_argument(
+        '--sample-size',
+        type=int,
+        default=SAMPLE_SIZE,
+        metavar='N',
+        help=f'色差统计抽样的像素数 (默认: {SAMPLE_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--exact-metrics',
+        action='store_true',
+        help='对全部像素精确计算色差统计 (默认抽样估计)'
+    )
+    
+    parser.add_argument(
+        '--memory-profile',
+        action='store_true',
+        help='输出各处理阶段的峰值内存和耗时 (单图像模式)'
+    )
+    
+    parser.add_argument(
+        '--profile-out',
+        metavar='PATH',
+        help='将 cProfile 统计保存到该文件 (可用 python -m pstats 查看)'
+    )
+    
+    parser.add_argument(
+        '--list-profiles',
+        action='store_true',
+        help='列出已保存的校准配置'
+    )
+    
     args = parser.parse_args()
     
+    if not args.profile_out:
+        dispatch(parser, args)
+        return
+    
+    # cProfile 只统计本进程，-j 大于 1 时工作进程中的校正不计入
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        dispatch(parser, args)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(args.profile_out)
+        print(f"✓ cProfile 统计已保存: {args.profile_out}", file=sys.stderr)
+
+
+def dispatch(parser: argparse.ArgumentParser, args):
+    """按参数选择流模式、批量模式或单图像模式执行"""
+    registry = ProfileRegistry(args.profile_dir)
+    
+    if args.list_profiles:
+        list_profiles(registry)
+        return
+    
+    if args.latency_budget is not None and args.latency_budget <= 0:
+        parser.error('--latency-budget 必须为正数')
+    if args.method == 'auto' and not args.profile and (args.stream or args.save_profile):
+        parser.error('auto 方法不支持流模式和 --save-profile')
+    
+    if args.stream:
+        if len(args.images) > (0 if args.profile else 1):
+            parser.error('流模式下只能指定校准图像 (使用 --profile 时不需要)')
+        if not args.profile and not args.images and not args.recalibrate:
+            parser.error('流模式需要 --profile、校准图像或 --recalibrate')
+        try:
+            run_stream_mode(args, registry)
+        except (KeyError, ValueError, OSError) as e:
+            print(f"✗ 错误: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+    
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.jobs < 0:
+        parser.error('--jobs 不能为负数')
+    if args.sample_size <= 0:
+        parser.error('--sample-size 必须为正数')
+    
+    if args.profile:
+        calibration_path, targets = None, args.images
+        if not targets:
+            parser.error('使用 --profile 时需要指定目标图像')
+    else:
+        if len(args.images) < 2:
+            parser.error('需要指定校准图像和目标图像')
+        calibration_path, targets = args.images[0], args.images[1:]
+    
+    if len(targets) > 1 or is_batch_pattern(targets[0]):
+        if args.method == 'auto' and not args.profile:
+            parser.error('auto 方法不支持批量模式')
+        try:
+            run_batch_mode(args, registry, calibration_path, targets)
+        except (KeyError, ValueError, OSError) as e:
+            print(f"\n✗ 错误: {e}")
+            sys.exit(1)
+        return
+    
+    target_path = targets[0]
+    
     try:
         print("\n" + "="*60)
         print("颜色校正工具")
         print("="*60)
         
         # 加载图像
-        print(f"\n加载校准图像: {args.calibration_image}")
-        calibration_image = load_image(args.calibration_image)
-        
-        print(f"加载目标图像: {args.target_image}")
-        target_image = load_image(args.target_image)
+        if calibration_path:
+            print(f"\n加载校准图像: {calibration_path}")
+            calibration_image = load_image(calibration_path)
         
-        # 创建处理管道
-        print(f"\n使用方法: {args.method}")
-        pipeline = ColorCorrectionPipeline(correction_method=args.method)
+        print(f"加载目标图像: {target_path}")
+        target_image = load_image(target_path)
         
-        # 执行处理
-        print("\n处理中...")
-        corrected, info = pipeline.process(calibration_image, target_image)
+        if args.profile:
+            # 复用已保存的校准配置，跳过检测和训练
+            pipeline = ColorCorrectionPipeline.from_profile(args.profile, registry)
+            print(f"\n使用校准配置: {args.profile} (方法: {pipeline.corrector.method})")
+            if args.memory_profile:
+                pipeline.enable_memory_profiling()
+            
+            print("\n处理中...")
+            corrected = pipeline.correct_image(target_image)
+            info = {
+                'status': 'success',
+                'correction_method': pipeline.corrector.method,
+                'profile': args.profile,
+                **pipeline.residual_info()
+            }
+        else:
+            # 创建处理管道
+            print(f"\n使用方法: {args.method}")
+            pipeline = ColorCorrectionPipeline(correction_method=args.method,
+                                               memory_profiling=args.memory_profile,
+                                               latency_budget=args.latency_budget)
+            
+            # 执行处理
+            print("\n处理中...")
+            corrected, info = pipeline.process(calibration_image, target_image)
+            
+            if info['status'] == 'success' and args.save_profile:
+                path = pipeline.save_profile(args.save_profile, registry, {
+                    'calibration_image': str(Path(calibration_path).resolve())
+                })
+                print(f"✓ 校准配置已保存: {args.save_profile} ({path})")
         
         if info['status'] == 'success':
             print("✓ 校正成功")
+            if 'plan' in info:
+                plan = info['plan']
+                budget_text = '' if plan['within_budget'] else '，超出耗时预算'
+                print(f"  自动选择: {plan['method']} ({plan['mode']})，预计耗时 {plan['predicted_seconds']:.2f} 秒，"
+                      f"留一法 Delta E {plan['holdout_delta_e']:.2f}{budget_text}")
             
             # 保存结果
             save_image(corrected, args.output)
@@ -97,12 +441,31 @@ def main():
                 comparison_img = pipeline.create_comparison_image(target_image, corrected)
                 save_image(comparison_img, comparison_path)
             
+            if 'mean_delta_e' in info:
+                print(f"\n训练残差 ({len(info['patch_delta_e'])} 个色块，CIEDE2000):")
+                print(f"  平均 Delta E: {info['mean_delta_e']:.2f}  最大 Delta E: {info['max_delta_e']:.2f}")
+            
             # 显示统计信息
-            comparison_stats = pipeline.compare_images(target_image, corrected)
-            print(f"\n颜色差异统计:")
-            print(f"  平均 Delta E: {comparison_stats['mean_delta_e']:.2f}")
+            # 默认抽样估计，--exact-metrics 时对全部像素计算
+            comparison_stats = pipeline.compare_images(
+                target_image, corrected, metric=args.metric,
+                sample_size=None if args.exact_metrics else args.sample_size)
+            if comparison_stats.get('sampled'):
+                low, high = comparison_stats['mean_delta_e_ci']
+                print(f"\n颜色差异统计 ({METRIC_NAMES[args.metric]}，抽样 {comparison_stats['sample_size']} 像素):")
+                print(f"  平均 Delta E: {comparison_stats['mean_delta_e']:.2f} "
+                      f"({comparison_stats['confidence']:.0%} 置信区间 {low:.2f} - {high:.2f})")
+            else:
+                print(f"\n颜色差异统计 ({METRIC_NAMES[args.metric]}):")
+                print(f"  平均 Delta E: {comparison_stats['mean_delta_e']:.2f}")
             print(f"  最大 Delta E: {comparison_stats['max_delta_e']:.2f}")
             print(f"  最小 Delta E: {comparison_stats['min_delta_e']:.2f}")
+            print(f"  P95 Delta E: {comparison_stats['p95_delta_e']:.2f}")
+            
+            if pipeline.profiler is not None:
+                print(f"\n阶段内存分析:")
+                for line in pipeline.profiler.format_report().splitlines():
+                    print(f"  {line}")
             
         else:
             print(f"✗ 校正失败: {info['status']}")
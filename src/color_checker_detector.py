@@ -3,9 +3,12 @@
 自动检测图片中的 ColorChecker 或其他参考色卡
 """
 
-import cv2
 import numpy as np
 from typing import Tuple, List, Optional
+from .lazy import LazyModule
+
+# OpenCV 在首次使用时才导入
+cv2 = LazyModule('cv2')
 
 
 class ColorCheckerDetector:
@@ -3,28 +3,54 @@
 实现多种颜色校正算法
 """
 
+import os
 import numpy as np
-from scipy.interpolate import griddata
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.linear_model import LinearRegression
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional
 from .color_space import ColorSpace
+from .color_difference import delta_e
+from .metrics import timed
+
+
+METHODS = ('polynomial', 'lut_3d', 'direct_mapping')
+
+# 执行方式: dense 整幅计算；tiled 按行分块依次计算 (内存占用与图像尺寸无关)；
+# threaded 分块在线程池中并行计算；baked 先烘焙为 3D LUT 再三线性插值 (近似结果)
+MODES = ('dense', 'tiled', 'threaded', 'baked')
+
+# 分块执行时每块的像素数
+TILE_PIXELS = 1 << 18
+
+# baked 方式的 LUT 尺寸
+BAKED_LUT_SIZE = 33
 
 
 class ColorCorrector:
     """颜色校正器"""
     
-    def __init__(self, method: str = 'polynomial'):
+    def __init__(self, method: str = 'polynomial', latency_budget: Optional[float] = None,
+                 cost_model=None, workers: Optional[int] = None):
         """
         初始化颜色校正器
         
         Args:
-            method: 校正方法 ('polynomial', 'lut_3d', 'direct_mapping')
+            method: 校正方法 ('polynomial', 'lut_3d', 'direct_mapping', 'auto')，
+                auto 训练全部方法，校正时按耗时预算和图像尺寸选择方法和执行方式 (见 planner 模块)
+            latency_budget: auto 方法单张图像的耗时预算 (秒)，None 表示不限
+            cost_model: auto 方法使用的代价模型 (planner.CostModel)，默认 planner.default_cost_model()
+            workers: threaded 执行方式的线程数，默认 CPU 核数
         """
         self.method = method
+        self.latency_budget = latency_budget
+        self.cost_model = cost_model
+        self.workers = workers
         self.correction_model = None
         self.reference_colors = None
         self.captured_colors = None
+        self.metadata = {}
+        self._residuals = None
+        self._baked_lut = None
+        self._plans = {}
     
     def train(self, reference_colors: np.ndarray, captured_colors: np.ndarray):
         """
@@ -43,6 +69,114 @@ class ColorCorrector:
             self._train_lut_3d()
         elif self.method == 'direct_mapping':
             self._train_direct_mapping()
+        elif self.method == 'auto':
+            self._train_auto()
+        else:
+            raise ValueError(f"不支持的校正方法: {self.method}")
+        
+        self._baked_lut = None
+        self._plans = {}
+        # 只有 N 个色块，计算残差的开销可以忽略
+        self._residuals = self.training_residuals()
+    
+    @property
+    def residuals(self) -> Optional[dict]:
+        """
+        训练残差 (CIEDE2000)，train() 时计算；从文件加载的模型在首次访问时由保存的色块颜色计算
+        
+        Returns:
+            training_residuals() 的结果，模型未训练或没有色块颜色时为 None
+        """
+        if self._residuals is None and self.correction_model is not None \
+                and self.reference_colors is not None and self.captured_colors is not None:
+            self._residuals = self.training_residuals()
+        return self._residuals
+    
+    def training_residuals(self, metric: str = 'ciede2000') -> dict:
+        """
+        计算各色块的训练残差: 拍摄颜色经模型校正后与参考颜色的色差
+        
+        Args:
+            metric: 色差公式 ('ciede2000', 'cie94', 'cie76')
+            
+        Returns:
+            {'metric', 'mean_delta_e', 'max_delta_e', 'min_delta_e',
+             'patch_delta_e': 每个色块的色差列表 (与参考颜色顺序相同)}
+        """
+        if self.correction_model is None:
+            raise ValueError("模型未训练，请先调用 train() 方法")
+        if self.reference_colors is None or self.captured_colors is None:
+            raise ValueError("模型没有保存色块颜色，无法计算训练残差")
+        
+        patches = np.asarray(self.captured_colors, dtype=np.float32).reshape(1, -1, 3)
+        predicted = self._predict(patches)
+        reference_lab = ColorSpace.rgb_to_lab(
+            np.asarray(self.reference_colors, dtype=np.float32).reshape(1, -1, 3)
+        )
+        values = delta_e(reference_lab, ColorSpace.rgb_to_lab(predicted), metric).reshape(-1)
+        
+        return {
+            'metric': metric,
+            'mean_delta_e': float(values.mean(dtype=np.float64)),
+            'max_delta_e': float(values.max()),
+            'min_delta_e': float(values.min()),
+            'patch_delta_e': [round(float(value), 4) for value in values]
+        }
+    
+    def holdout_residuals(self, metric: str = 'ciede2000') -> dict:
+        """
+        留一法残差: 依次去掉一个色块，用其余色块训练同一方法，再校正被去掉的色块，
+        反映模型对训练色块以外颜色的准确度 (训练残差对直接映射等插值方法总是接近 0)
+        
+        Args:
+            metric: 色差公式 ('ciede2000', 'cie94', 'cie76')
+            
+        Returns:
+            与 training_residuals() 相同的结构，patch_delta_e 为各色块被留出时的色差
+        """
+        if self.reference_colors is None or self.captured_colors is None:
+            raise ValueError("模型没有保存色块颜色，无法计算留一法残差")
+        if self.method == 'auto':
+            return self.correction_model['candidates'][self._most_accurate()].holdout_residuals(metric)
+        
+        reference = np.asarray(self.reference_colors, dtype=np.float32)
+        captured = np.asarray(self.captured_colors, dtype=np.float32)
+        count = len(reference)
+        if count < 2:
+            raise ValueError("留一法至少需要 2 个色块")
+        
+        predicted = np.empty((1, count, 3), dtype=np.uint8)
+        for index in range(count):
+            keep = np.arange(count) != index
+            fold = ColorCorrector(method=self.method)
+            fold.train(reference[keep], captured[keep])
+            predicted[0, index] = fold._predict(captured[index].reshape(1, 1, 3)).reshape(3)
+        
+        reference_lab = ColorSpace.rgb_to_lab(reference.reshape(1, -1, 3))
+        values = delta_e(reference_lab, ColorSpace.rgb_to_lab(predicted), metric).reshape(-1)
+        
+        return {
+            'metric': metric,
+            'mean_delta_e': float(values.mean(dtype=np.float64)),
+            'max_delta_e': float(values.max()),
+            'min_delta_e': float(values.min()),
+            'patch_delta_e': [round(float(value), 4) for value in values]
+        }
+    
+    def _predict(self, image: np.ndarray) -> np.ndarray:
+        """不经过阶段计时的整幅校正，用于少量颜色 (训练残差) 和分块执行"""
+        if self.method == 'auto':
+            plan = self.plan(image.shape[1], image.shape[0])
+            return self.correction_model['candidates'][plan.method]._predict(image)
+        if self.method == 'polynomial':
+            h, w = image.shape[:2]
+            lab = ColorSpace.rgb_to_lab(image).reshape(-1, 3)
+            return ColorSpace.lab_to_rgb(self._evaluate_polynomial(lab).reshape(h, w, 3))
+        if self.method == 'lut_3d':
+            return self._correct_lut_3d(image)
+        if self.method == 'direct_mapping':
+            return self._correct_direct_mapping(image)
+        raise ValueError(f"不支持的校正方法: {self.method}")
     
     def _train_polynomial(self):
         """训练多项式映射模型"""
@@ -55,60 +189,56 @@ class ColorCorrector:
             self.captured_colors.reshape(1, -1, 3)
         ).reshape(-1, 3)
         
-        # 为每个通道训练多项式回归
-        self.correction_model = {}
+        # scikit-learn 导入较慢，只在训练时导入
+        from sklearn.preprocessing import PolynomialFeatures
+        from sklearn.linear_model import LinearRegression
+        
+        # 生成多项式特征 (2 阶)
+        poly = PolynomialFeatures(degree=2, include_bias=True)
+        X_poly = poly.fit_transform(cap_lab)
+        
+        # 为每个通道训练线性回归
+        coef = np.zeros((3, X_poly.shape[1]), dtype=np.float64)
+        intercept = np.zeros(3, dtype=np.float64)
         
         for channel in range(3):
-            # 生成多项式特征 (2 阶)
-            poly = PolynomialFeatures(degree=2, include_bias=True)
-            X_poly = poly.fit_transform(cap_lab)
-            
-            # 训练线性回归
             model = LinearRegression()
             model.fit(X_poly, ref_lab[:, channel])
-            
-            self.correction_model[channel] = {
-                'poly': poly,
-                'model': model
-            }
+            coef[channel] = model.coef_
+            intercept[channel] = model.intercept_
+        
+        # 只保存多项式的指数和系数，校正时直接用 NumPy 求值，便于序列化
+        self.correction_model = {
+            'powers': poly.powers_.astype(np.int32),
+            'coef': coef,
+            'intercept': intercept
+        }
     
     def _train_lut_3d(self):
         """训练 3D LUT 模型"""
         # 创建 3D 查找表
         lut_size = 16
-        lut = np.zeros((lut_size, lut_size, lut_size, 3), dtype=np.float32)
-        
-        # 为每个 LUT 点计算校正值
-        for i in range(lut_size):
-            for j in range(lut_size):
-                for k in range(lut_size):
-                    # 归一化坐标
-                    r = i / (lut_size - 1)
-                    g = j / (lut_size - 1)
-                    b = k / (lut_size - 1)
-                    
-                    # 查找最近的训练点
-                    query_color = np.array([r, g, b]) * 255
-                    distances = np.linalg.norm(
-                        self.captured_colors - query_color,
-                        axis=1
-                    )
-                    
-                    # 使用最近的 4 个点进行插值
-                    nearest_indices = np.argsort(distances)[:4]
-                    nearest_distances = distances[nearest_indices]
-                    
-                    # 反距离加权
-                    weights = 1.0 / (nearest_distances + 1e-6)
-                    weights /= weights.sum()
-                    
-                    corrected = np.average(
-                        self.reference_colors[nearest_indices],
-                        axis=0,
-                        weights=weights
-                    )
-                    
-                    lut[i, j, k] = corrected
+        
+        # 所有 LUT 点的 RGB 坐标 (按 r, g, b 索引顺序展开)
+        axis = np.arange(lut_size) / (lut_size - 1) * 255
+        grid = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(-1, 3)
+        
+        # 每个 LUT 点到各训练点的距离
+        distances = np.linalg.norm(
+            self.captured_colors[None, :, :] - grid[:, None, :],
+            axis=2
+        )
+        
+        # 使用最近的 4 个点进行插值
+        nearest_indices = np.argsort(distances, axis=1)[:, :4]
+        nearest_distances = np.take_along_axis(distances, nearest_indices, axis=1)
+        
+        # 反距离加权
+        weights = 1.0 / (nearest_distances + 1e-6)
+        weights /= weights.sum(axis=1, keepdims=True)
+        
+        corrected = np.einsum('nk,nkc->nc', weights, self.reference_colors[nearest_indices])
+        lut = corrected.reshape(lut_size, lut_size, lut_size, 3).astype(np.float32)
         
         self.correction_model = lut
     
@@ -120,98 +250,264 @@ class ColorCorrector:
             'captured': self.captured_colors
         }
     
-    def correct(self, image: np.ndarray) -> np.ndarray:
+    def _train_auto(self):
+        """训练全部方法，并估计各方案的准确度 (留一法残差，烘焙 LUT 另加插值误差)"""
+        candidates = {}
+        accuracy = {}
+        for method in METHODS:
+            corrector = ColorCorrector(method=method, workers=self.workers)
+            corrector.train(self.reference_colors, self.captured_colors)
+            candidates[method] = corrector
+            holdout = corrector.holdout_residuals()['mean_delta_e']
+            for mode in ('dense', 'tiled', 'threaded'):
+                accuracy[(method, mode)] = holdout
+        
+        # lut_3d 本身就是 LUT；直接映射插值后不再是最近颜色映射，不参与 baked 方案
+        accuracy[('polynomial', 'baked')] = accuracy[('polynomial', 'dense')] + \
+            candidates['polynomial'].baked_lut_error()
+        
+        self.correction_model = {'candidates': candidates, 'accuracy': accuracy}
+    
+    def _most_accurate(self) -> str:
+        accuracy = self.correction_model['accuracy']
+        return min(METHODS, key=lambda method: accuracy[(method, 'dense')])
+    
+    def plan(self, width: int, height: int):
+        """
+        auto 方法为指定尺寸的图像选择的校正方案
+        
+        Returns:
+            planner.Plan (method, mode, predicted_seconds, holdout_delta_e, within_budget)
+        """
+        if self.method != 'auto':
+            raise ValueError("只有 auto 方法需要选择校正方案")
+        if self.correction_model is None:
+            raise ValueError("模型未训练，请先调用 train() 方法")
+        
+        pixels = int(width) * int(height)
+        plan = self._plans.get(pixels)
+        if plan is None:
+            from .planner import select_plan
+            plan = self._plans[pixels] = select_plan(self.correction_model['accuracy'], pixels,
+                                                     self.latency_budget, self.cost_model)
+        return plan
+    
+    def baked_lut(self) -> np.ndarray:
+        """
+        baked 执行方式使用的 3D LUT (BAKED_LUT_SIZE^3，值范围 [0, 255])，首次使用时烘焙
+        """
+        if self.correction_model is None:
+            raise ValueError("模型未训练，请先调用 train() 方法")
+        if self._baked_lut is None:
+            if self.method == 'lut_3d':
+                self._baked_lut = self.correction_model
+            else:
+                from .model_io import bake_lut
+                self._baked_lut = bake_lut(self, BAKED_LUT_SIZE) * np.float32(255.0)
+        return self._baked_lut
+    
+    def baked_lut_error(self, metric: str = 'ciede2000') -> float:
+        """
+        烘焙 LUT 的插值误差: 在 LUT 相邻采样点正中的颜色 (插值误差最大处) 上，
+        LUT 结果与模型直接计算结果的平均色差
+        """
+        lut = self.baked_lut()
+        step = 255.0 / (lut.shape[0] - 1)
+        axis = np.arange(0, lut.shape[0] - 1, 2) * step + step / 2
+        grid = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(1, -1, 3)
+        grid = grid.astype(np.float32)
+        
+        values = delta_e(ColorSpace.rgb_to_lab(self._predict(grid)),
+                         ColorSpace.rgb_to_lab(_apply_lut(lut, grid)), metric)
+        return float(values.mean(dtype=np.float64))
+    
+    def save(self, path: str, metadata: Optional[dict] = None):
+        """
+        保存训练好的模型 (带版本的二进制格式，见 model_io)
+        
+        Args:
+            path: 输出文件路径
+            metadata: 附加的元数据
+        """
+        from .model_io import save_model
+        save_model(self, path, metadata)
+    
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'ColorCorrector':
+        """
+        加载 save() 保存的模型
+        
+        Args:
+            path: 模型文件路径
+            mmap: 是否以内存映射方式加载
+        """
+        from .model_io import load_model
+        return load_model(path, mmap=mmap)
+    
+    def blend(self, previous: 'ColorCorrector', weight: float):
+        """
+        将当前模型参数与之前的模型加权混合，用于多次重新校准之间的平滑
+        
+        Args:
+            previous: 之前的校正器 (校正方法必须相同)
+            weight: 之前模型所占的权重 [0, 1]，0 表示只用当前模型
+        """
+        if not 0.0 <= weight <= 1.0:
+            raise ValueError("权重必须在 [0, 1] 之间")
+        if self.method == 'auto':
+            raise ValueError("auto 方法的模型不支持混合")
+        if previous.method != self.method or previous.correction_model is None:
+            raise ValueError("只能与同一方法的已训练模型混合")
+        if self.correction_model is None:
+            raise ValueError("模型未训练，请先调用 train() 方法")
+        
+        def mix(current, old):
+            if current.shape != old.shape:
+                raise ValueError("模型结构不一致，无法混合")
+            return ((1.0 - weight) * current + weight * old).astype(current.dtype)
+        
+        if self.method == 'lut_3d':
+            self.correction_model = mix(self.correction_model, previous.correction_model)
+        elif self.method == 'polynomial':
+            if not np.array_equal(self.correction_model['powers'], previous.correction_model['powers']):
+                raise ValueError("模型结构不一致，无法混合")
+            self.correction_model = {
+                'powers': self.correction_model['powers'],
+                'coef': mix(self.correction_model['coef'], previous.correction_model['coef']),
+                'intercept': mix(self.correction_model['intercept'], previous.correction_model['intercept'])
+            }
+        else:
+            self.correction_model = {
+                name: mix(array, previous.correction_model[name])
+                for name, array in self.correction_model.items()
+            }
+        
+        # 模型参数已变化，残差和烘焙的 LUT 在下次访问时重新计算
+        self._residuals = None
+        self._baked_lut = None
+    
+    def correct(self, image: np.ndarray, out: Optional[np.ndarray] = None,
+                cache=None, mode: Optional[str] = None) -> np.ndarray:
         """
         对图像进行颜色校正
         
         Args:
             image: 输入图像 (H, W, 3) RGB
+            out: 可选的输出缓冲区 (H, W, 3) uint8，指定时结果写入其中，避免分配新的输出数组
+            cache: 可选的 ConversionCache，同一图像的 LAB 转换结果在多次校正之间复用 (dense 方式)
+            mode: 执行方式 (见 MODES)，默认 dense；auto 方法默认按 plan() 选择
             
         Returns:
-            校正后的图像 (H, W, 3) RGB
+            校正后的图像 (H, W, 3) RGB (指定 out 时即为 out)
         """
         if self.correction_model is None:
             raise ValueError("模型未训练，请先调用 train() 方法")
         
+        if out is not None and (out.shape != image.shape or out.dtype != np.uint8):
+            raise ValueError(f"输出缓冲区必须是 {image.shape} 的 uint8 数组")
+        
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"不支持的执行方式: {mode} (可选: {', '.join(MODES)})")
+        
+        if self.method == 'auto':
+            plan = self.plan(image.shape[1], image.shape[0])
+            return self.correction_model['candidates'][plan.method].correct(
+                image, out=out, cache=cache, mode=mode or plan.mode)
+        
+        if self.method not in METHODS:
+            raise ValueError(f"不支持的校正方法: {self.method}")
+        
+        mode = mode or 'dense'
+        if mode != 'dense':
+            with timed('evaluate', method=self.method, mode=mode,
+                       width=image.shape[1], height=image.shape[0]):
+                return self._correct_tiles(image, out, mode)
+        
         if self.method == 'polynomial':
-            return self._correct_polynomial(image)
-        elif self.method == 'lut_3d':
-            return self._correct_lut_3d(image)
-        elif self.method == 'direct_mapping':
-            return self._correct_direct_mapping(image)
+            return self._correct_polynomial(image, out, cache)
+        
+        with timed('evaluate', method=self.method, width=image.shape[1], height=image.shape[0]):
+            if self.method == 'lut_3d':
+                corrected = self._correct_lut_3d(image)
+            else:
+                corrected = self._correct_direct_mapping(image)
+        
+        if out is None:
+            return corrected
+        np.copyto(out, corrected)
+        return out
     
-    def _correct_polynomial(self, image: np.ndarray) -> np.ndarray:
-        """使用多项式映射进行校正"""
-        # 转换到 LAB 颜色空间
-        lab = ColorSpace.rgb_to_lab(image)
+    def _correct_tiles(self, image: np.ndarray, out: Optional[np.ndarray], mode: str) -> np.ndarray:
+        """按行分块校正 (tiled / threaded / baked)，每块结果直接写入输出"""
+        if out is None:
+            out = np.empty(image.shape, dtype=np.uint8)
+        
+        if mode == 'baked':
+            lut = self.baked_lut()
+            correct_tile = lambda tile: _apply_lut(lut, tile)
+        else:
+            correct_tile = self._predict
+        
+        rows = max(TILE_PIXELS // max(image.shape[1], 1), 1)
         
+        def run(y):
+            out[y:y + rows] = correct_tile(image[y:y + rows])
+        
+        starts = range(0, image.shape[0], rows)
+        if mode == 'threaded' and len(starts) > 1:
+            # NumPy 在计算时释放 GIL，各块可以并行
+            workers = min(self.workers or os.cpu_count() or 1, len(starts))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(run, starts))
+        else:
+            for y in starts:
+                run(y)
+        return out
+    
+    def _correct_polynomial(self, image: np.ndarray, out: Optional[np.ndarray] = None,
+                            cache=None) -> np.ndarray:
+        """使用多项式映射进行校正"""
         h, w = image.shape[:2]
-        lab_reshaped = lab.reshape(-1, 3)
+        context = {'method': self.method, 'width': w, 'height': h}
         
-        # 应用多项式校正
-        corrected_lab = np.zeros_like(lab_reshaped)
+        # 转换到 LAB 颜色空间
+        with timed('rgb_to_lab', **context):
+            lab = ColorSpace.rgb_to_lab(image) if cache is None else cache.lab(image)
         
-        for channel in range(3):
-            poly = self.correction_model[channel]['poly']
-            model = self.correction_model[channel]['model']
-            
-            X_poly = poly.transform(lab_reshaped)
-            corrected_lab[:, channel] = model.predict(X_poly)
+        lab_reshaped = lab.reshape(-1, 3)
         
-        corrected_lab = corrected_lab.reshape(h, w, 3)
+        with timed('evaluate', **context):
+            corrected_lab = self._evaluate_polynomial(lab_reshaped).reshape(h, w, 3)
+        del lab, lab_reshaped
         
         # 转换回 RGB
-        corrected_rgb = ColorSpace.lab_to_rgb(corrected_lab)
+        with timed('lab_to_rgb', **context):
+            corrected_rgb = ColorSpace.lab_to_rgb(corrected_lab, out=out)
         
         return corrected_rgb
     
-    def _correct_lut_3d(self, image: np.ndarray) -> np.ndarray:
-        """使用 3D LUT 进行校正"""
-        lut = self.correction_model
-        lut_size = lut.shape[0]
+    def _evaluate_polynomial(self, lab: np.ndarray) -> np.ndarray:
+        """对 (N, 3) 的 LAB 颜色求多项式的值"""
+        # 逐项累加，避免生成 (N, 特征数) 的特征矩阵
+        powers = self.correction_model['powers']
+        coef = self.correction_model['coef']
+        intercept = self.correction_model['intercept']
         
-        # 归一化图像到 [0, lut_size-1]
-        image_normalized = image.astype(np.float32) / 255.0 * (lut_size - 1)
+        corrected_lab = np.empty_like(lab)
+        corrected_lab[:] = intercept
         
-        h, w = image.shape[:2]
-        corrected = np.zeros_like(image, dtype=np.float32)
-        
-        # 三线性插值
-        for y in range(h):
-            for x in range(w):
-                r, g, b = image_normalized[y, x]
-                
-                # 获取整数和小数部分
-                r_int, r_frac = int(r), r - int(r)
-                g_int, g_frac = int(g), g - int(g)
-                b_int, b_frac = int(b), b - int(b)
-                
-                # 确保索引在范围内
-                r_int = min(r_int, lut_size - 2)
-                g_int = min(g_int, lut_size - 2)
-                b_int = min(b_int, lut_size - 2)
-                
-                # 三线性插值
-                c000 = lut[r_int, g_int, b_int]
-                c001 = lut[r_int, g_int, b_int + 1]
-                c010 = lut[r_int, g_int + 1, b_int]
-                c011 = lut[r_int, g_int + 1, b_int + 1]
-                c100 = lut[r_int + 1, g_int, b_int]
-                c101 = lut[r_int + 1, g_int, b_int + 1]
-                c110 = lut[r_int + 1, g_int + 1, b_int]
-                c111 = lut[r_int + 1, g_int + 1, b_int + 1]
-                
-                c00 = c000 * (1 - r_frac) + c100 * r_frac
-                c01 = c001 * (1 - r_frac) + c101 * r_frac
-                c10 = c010 * (1 - r_frac) + c110 * r_frac
-                c11 = c011 * (1 - r_frac) + c111 * r_frac
-                
-                c0 = c00 * (1 - g_frac) + c10 * g_frac
-                c1 = c01 * (1 - g_frac) + c11 * g_frac
-                
-                corrected[y, x] = c0 * (1 - b_frac) + c1 * b_frac
-        
-        return np.clip(corrected, 0, 255).astype(np.uint8)
+        for term in range(powers.shape[0]):
+            feature = np.ones(lab.shape[0], dtype=lab.dtype)
+            for axis in range(3):
+                for _ in range(int(powers[term, axis])):
+                    feature *= lab[:, axis]
+            corrected_lab += feature[:, None] * coef[:, term].astype(lab.dtype)
+        
+        return corrected_lab
+    
+    def _correct_lut_3d(self, image: np.ndarray) -> np.ndarray:
+        """使用 3D LUT 进行校正"""
+        return _apply_lut(self.correction_model, image)
     
     def _correct_direct_mapping(self, image: np.ndarray) -> np.ndarray:
         """使用直接映射进行校正"""
@@ -219,15 +515,69 @@ class ColorCorrector:
         captured = self.correction_model['captured']
         
         h, w = image.shape[:2]
-        image_reshaped = image.reshape(-1, 3).astype(np.float32)
+        image_reshaped = image.reshape(-1, 3)
+        corrected = np.empty((image_reshaped.shape[0], 3), dtype=np.uint8)
         
-        corrected = np.zeros_like(image_reshaped)
+        # 对每个像素查找最近的训练颜色 (分块计算，距离矩阵为 块像素数 x 训练颜色数)
+        targets = np.asarray(reference).astype(np.uint8)
+        for start in range(0, image_reshaped.shape[0], _NEAREST_CHUNK):
+            pixels = image_reshaped[start:start + _NEAREST_CHUNK].astype(np.float32)
+            distances = np.linalg.norm(captured[None, :, :] - pixels[:, None, :], axis=2)
+            corrected[start:start + _NEAREST_CHUNK] = targets[np.argmin(distances, axis=1)]
         
-        # 对每个像素查找最近的训练颜色
-        for i, pixel in enumerate(image_reshaped):
-            distances = np.linalg.norm(captured - pixel, axis=1)
-            nearest_idx = np.argmin(distances)
-            corrected[i] = reference[nearest_idx]
-        
-        return corrected.reshape(h, w, 3).astype(np.uint8)
+        return corrected.reshape(h, w, 3)
+
 
+# 直接映射每次计算距离的像素数
+_NEAREST_CHUNK = 1 << 16
+
+
+def _apply_lut(lut: np.ndarray, image: np.ndarray) -> np.ndarray:
+    """
+    三线性插值应用 3D LUT
+    
+    Args:
+        lut: (N, N, N, 3) 按 [r, g, b] 索引，值范围 [0, 255]
+        image: 输入图像 (H, W, 3) RGB，值范围 [0, 255]
+        
+    Returns:
+        校正后的图像 (H, W, 3) uint8
+    """
+    lut_size = lut.shape[0]
+    h, w = image.shape[:2]
+    
+    # 归一化图像到 [0, lut_size-1]
+    coords = image.reshape(-1, 3).astype(np.float32) / 255.0 * (lut_size - 1)
+    
+    # 整数部分限制在 [0, lut_size-2]，小数部分相对于限制后的整数部分计算
+    base = np.minimum(coords.astype(np.int32), lut_size - 2)
+    frac = coords - base
+    fr, fg, fb = frac[:, 0:1], frac[:, 1:2], frac[:, 2:3]
+    
+    # 按展开后的一维索引取 8 个相邻 LUT 点
+    flat = lut.reshape(-1, 3)
+    index = (base[:, 0] * lut_size + base[:, 1]) * lut_size + base[:, 2]
+    step_r, step_g = lut_size * lut_size, lut_size
+    
+    def corner(offset):
+        return np.take(flat, index + offset, axis=0)
+    
+    def lerp(low, high, fraction, complement):
+        # low * (1 - f) + high * f，原地计算减少临时数组 (low 和 high 均为新数组)
+        low *= complement
+        high *= fraction
+        low += high
+        return low
+    
+    # 三线性插值
+    gr, gg, gb = 1 - fr, 1 - fg, 1 - fb
+    c00 = lerp(corner(0), corner(step_r), fr, gr)
+    c01 = lerp(corner(1), corner(step_r + 1), fr, gr)
+    c10 = lerp(corner(step_g), corner(step_r + step_g), fr, gr)
+    c11 = lerp(corner(step_g + 1), corner(step_r + step_g + 1), fr, gr)
+    
+    c0 = lerp(c00, c10, fg, gg)
+    c1 = lerp(c01, c11, fg, gg)
+    corrected = lerp(c0, c1, fb, gb)
+    
+    return np.clip(corrected, 0, 255).astype(np.uint8).reshape(h, w, 3)
@@ -0,0 +1,360 @@
+"""
+色差计算模块
+提供 CIE76、CIE94 和 CIEDE2000 色差公式的向量化实现 (float32)，
+以及分块计算整幅图像色差的流式统计 (均值、标准差、最值和基于直方图的分位数)，
+内存占用只与分块大小有关，与图像尺寸无关；
+需要快速反馈时可以只对分层抽样的像素计算，并给出均值的置信区间
+"""
+
+import numpy as np
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Tuple
+
+from .color_space import ColorSpace
+
+
+METRICS = ('cie76', 'cie94', 'ciede2000')
+
+# 每次处理的像素数 (约 1/4 百万像素)，决定分块计算时的内存上限
+CHUNK_PIXELS = 1 << 18
+
+# 报告的分位数 (百分比)
+PERCENTILES = (50, 95, 99)
+
+# 抽样模式默认的样本像素数
+SAMPLE_SIZE = 20000
+
+_POW25_7 = np.float32(25.0 ** 7)
+
+
+def _split(lab: np.ndarray):
+    lab = np.asarray(lab, dtype=np.float32)
+    return lab[..., 0], lab[..., 1], lab[..., 2]
+
+
+def delta_e_cie76(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """CIE76 色差: LAB 空间中的欧氏距离"""
+    difference = np.asarray(lab1, dtype=np.float32) - np.asarray(lab2, dtype=np.float32)
+    return np.sqrt(np.einsum('...i,...i->...', difference, difference))
+
+
+def delta_e_cie94(lab1: np.ndarray, lab2: np.ndarray, kL: float = 1.0,
+                  K1: float = 0.045, K2: float = 0.015) -> np.ndarray:
+    """
+    CIE94 色差 (默认为印刷行业参数)
+
+    Args:
+        lab1: 参考颜色 (..., 3)，权重函数由它的彩度计算
+        lab2: 比较颜色 (..., 3)
+        kL: 明度权重 (纺织行业为 2)
+        K1, K2: 彩度和色调权重系数 (纺织行业为 0.048, 0.014)
+    """
+    L1, a1, b1 = _split(lab1)
+    L2, a2, b2 = _split(lab2)
+
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    dL = L1 - L2
+    dC = C1 - C2
+    da = a1 - a2
+    db = b1 - b2
+    # 数值误差可能使 ΔH² 略小于 0
+    dH2 = np.maximum(da * da + db * db - dC * dC, 0)
+
+    SC = 1 + np.float32(K1) * C1
+    SH = 1 + np.float32(K2) * C1
+    return np.sqrt((dL / np.float32(kL)) ** 2 + (dC / SC) ** 2 + dH2 / (SH * SH))
+
+
+def delta_e_ciede2000(lab1: np.ndarray, lab2: np.ndarray, kL: float = 1.0,
+                      kC: float = 1.0, kH: float = 1.0) -> np.ndarray:
+    """
+    CIEDE2000 色差 (Sharma 等人 2005 年的实现说明)
+
+    Args:
+        lab1, lab2: LAB 颜色 (..., 3)
+        kL, kC, kH: 明度、彩度、色调的权重
+
+    Returns:
+        色差 (...) float32
+    """
+    L1, a1, b1 = _split(lab1)
+    L2, a2, b2 = _split(lab2)
+
+    # 调整 a 轴，使中性色附近的色调计算更均匀
+    C_mean = (np.hypot(a1, b1) + np.hypot(a2, b2)) * np.float32(0.5)
+    C_mean7 = C_mean ** 7
+    G = np.float32(0.5) * (1 - np.sqrt(C_mean7 / (C_mean7 + _POW25_7)))
+    a1p = (1 + G) * a1
+    a2p = (1 + G) * a2
+
+    C1p = np.hypot(a1p, b1)
+    C2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = (C1p * C2p) == 0
+
+    # 明度、彩度、色调差
+    dLp = L2 - L1
+    dCp = C2p - C1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, np.where(dhp < -180, dhp + 360, dhp))
+    dhp = np.where(chroma_zero, 0, dhp)
+    dHp = 2 * np.sqrt(C1p * C2p) * np.sin(np.radians(dhp) * np.float32(0.5))
+
+    # 平均值
+    Lp_mean = (L1 + L2) * np.float32(0.5)
+    Cp_mean = (C1p + C2p) * np.float32(0.5)
+    h_sum = h1p + h2p
+    hp_mean = np.where(np.abs(h1p - h2p) <= 180, h_sum * np.float32(0.5),
+                       np.where(h_sum < 360, (h_sum + 360) * np.float32(0.5),
+                                (h_sum - 360) * np.float32(0.5)))
+    hp_mean = np.where(chroma_zero, h_sum, hp_mean)
+
+    # 权重函数
+    hp_rad = np.radians(hp_mean)
+    T = (1 - np.float32(0.17) * np.cos(hp_rad - np.float32(np.radians(30)))
+         + np.float32(0.24) * np.cos(2 * hp_rad)
+         + np.float32(0.32) * np.cos(3 * hp_rad + np.float32(np.radians(6)))
+         - np.float32(0.20) * np.cos(4 * hp_rad - np.float32(np.radians(63))))
+    d_theta = 30 * np.exp(-((hp_mean - 275) / 25) ** 2)
+    Cp_mean7 = Cp_mean ** 7
+    RC = 2 * np.sqrt(Cp_mean7 / (Cp_mean7 + _POW25_7))
+    L_offset = (Lp_mean - 50) ** 2
+    SL = 1 + np.float32(0.015) * L_offset / np.sqrt(20 + L_offset)
+    SC = 1 + np.float32(0.045) * Cp_mean
+    SH = 1 + np.float32(0.015) * Cp_mean * T
+    RT = -np.sin(np.radians(2 * d_theta)) * RC
+
+    term_L = dLp / (np.float32(kL) * SL)
+    term_C = dCp / (np.float32(kC) * SC)
+    term_H = dHp / (np.float32(kH) * SH)
+    return np.sqrt(np.maximum(term_L ** 2 + term_C ** 2 + term_H ** 2 + RT * term_C * term_H, 0))
+
+
+_FORMULAS = {
+    'cie76': delta_e_cie76,
+    'cie94': delta_e_cie94,
+    'ciede2000': delta_e_ciede2000,
+}
+
+
+def delta_e(lab1: np.ndarray, lab2: np.ndarray, metric: str = 'ciede2000') -> np.ndarray:
+    """按名称选择色差公式 ('cie76', 'cie94', 'ciede2000')"""
+    if metric not in _FORMULAS:
+        raise ValueError(f"不支持的色差公式: {metric} (可选: {', '.join(METRICS)})")
+    return _FORMULAS[metric](lab1, lab2)
+
+
+class DeltaEAccumulator:
+    """
+    色差的流式统计
+
+    分批调用 update()，均值和标准差按批合并 (Chan 等人的并行算法)，
+    分位数由固定宽度的直方图估计，误差不超过一个分桶宽度 (默认 200 / 4000 = 0.05)，
+    超出范围的值计入最后一个分桶
+    """
+
+    def __init__(self, bins: int = 4000, max_value: float = 200.0):
+        self.bins = bins
+        self.max_value = float(max_value)
+        self.histogram = np.zeros(bins, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.nonzero = 0
+
+    def update(self, values: np.ndarray):
+        """加入一批色差值"""
+        values = np.asarray(values, dtype=np.float32).ravel()
+        n = values.size
+        if n == 0:
+            return
+
+        batch_mean = float(values.mean(dtype=np.float64))
+        centered = values - np.float32(batch_mean)
+        batch_m2 = float(np.dot(centered, centered))
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.nonzero += int(np.count_nonzero(values))
+
+        indices = (values * np.float32(self.bins / self.max_value)).astype(np.int64)
+        np.clip(indices, 0, self.bins - 1, out=indices)
+        self.histogram += np.bincount(indices, minlength=self.bins)
+
+    def merge(self, other: 'DeltaEAccumulator'):
+        """合并另一个累加器 (分桶设置必须相同)"""
+        if other.bins != self.bins or other.max_value != self.max_value:
+            raise ValueError("直方图分桶不一致，无法合并")
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.nonzero += other.nonzero
+        self.histogram += other.histogram
+
+    @property
+    def std(self) -> float:
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """估计第 q 百分位数 (分桶内线性插值，结果限制在 [min, max] 内)"""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        cumulative = np.cumsum(self.histogram)
+        index = int(np.searchsorted(cumulative, rank, side='left'))
+        index = min(index, self.bins - 1)
+        before = cumulative[index - 1] if index > 0 else 0
+        in_bin = self.histogram[index]
+        fraction = (rank - before) / in_bin if in_bin else 0.0
+        value = (index + fraction) * self.max_value / self.bins
+        return float(min(max(value, self.min), self.max))
+
+    def stats(self, percentiles: Sequence[float] = PERCENTILES) -> Dict[str, float]:
+        """统计结果，键与 ColorCorrectionPipeline.compare_images 的返回值一致"""
+        empty = self.count == 0
+        result = {
+            'mean_delta_e': self.mean,
+            'max_delta_e': 0.0 if empty else self.max,
+            'min_delta_e': 0.0 if empty else self.min,
+            'std_delta_e': self.std,
+        }
+        for q in percentiles:
+            result[f'p{q:g}_delta_e'] = self.percentile(q)
+        result['pixels_improved'] = self.nonzero
+        return result
+
+
+def compare_images(original: np.ndarray, corrected: np.ndarray, metric: str = 'ciede2000',
+                   chunk_pixels: int = CHUNK_PIXELS,
+                   accumulator: Optional[DeltaEAccumulator] = None,
+                   cache=None) -> Dict[str, float]:
+    """
+    分块计算两幅 RGB 图像逐像素色差的统计
+
+    Args:
+        original: 原始图像 (H, W, 3)
+        corrected: 比较图像 (H, W, 3)
+        metric: 色差公式 ('cie76', 'cie94', 'ciede2000')
+        chunk_pixels: 每块的像素数
+        accumulator: 可选的累加器 (例如自定义直方图范围)
+        cache: 可选的 ConversionCache，原始图像的 LAB 转换结果从中读取 (未命中时整幅转换并缓存)
+
+    Returns:
+        {'metric', 'mean_delta_e', 'max_delta_e', 'min_delta_e', 'std_delta_e',
+         'p50_delta_e', 'p95_delta_e', 'p99_delta_e', 'pixels_improved'}
+    """
+    if original.shape != corrected.shape:
+        raise ValueError(f"图像尺寸不一致: {original.shape} 与 {corrected.shape}")
+    if metric not in _FORMULAS:
+        raise ValueError(f"不支持的色差公式: {metric} (可选: {', '.join(METRICS)})")
+
+    accumulator = accumulator or DeltaEAccumulator()
+    formula = _FORMULAS[metric]
+    # 按行分块，不需要先复制或展平整幅图像
+    rows = max(int(chunk_pixels) // max(original.shape[1], 1), 1)
+    original_lab = cache.lab(original) if cache is not None else None
+
+    for y in range(0, original.shape[0], rows):
+        if original_lab is None:
+            lab1 = ColorSpace.rgb_to_lab(original[y:y + rows]).astype(np.float32, copy=False)
+        else:
+            lab1 = original_lab[y:y + rows].astype(np.float32)
+        lab2 = ColorSpace.rgb_to_lab(corrected[y:y + rows]).astype(np.float32, copy=False)
+        accumulator.update(formula(lab1, lab2))
+
+    return {'metric': metric, **accumulator.stats(), 'sampled': False}
+
+
+def stratified_sample(height: int, width: int, sample_size: int,
+                      seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分层抽样: 将图像划分为约 sample_size 个近似正方形的网格，每格随机取一个像素
+
+    Returns:
+        (行坐标, 列坐标)
+    """
+    rng = np.random.default_rng(seed)
+    cells_y = int(min(height, max(1, round((sample_size * height / width) ** 0.5))))
+    cells_x = int(min(width, max(1, round(sample_size / cells_y))))
+
+    y_edges = np.linspace(0, height, cells_y + 1).astype(np.int64)
+    x_edges = np.linspace(0, width, cells_x + 1).astype(np.int64)
+    ys = y_edges[:-1, None] + (rng.random((cells_y, cells_x)) * np.diff(y_edges)[:, None]).astype(np.int64)
+    xs = x_edges[None, :-1] + (rng.random((cells_y, cells_x)) * np.diff(x_edges)[None, :]).astype(np.int64)
+    return ys.ravel(), xs.ravel()
+
+
+def sample_compare(original: np.ndarray, corrected: np.ndarray, metric: str = 'ciede2000',
+                   sample_size: int = SAMPLE_SIZE, confidence: float = 0.95,
+                   seed: int = 0) -> Dict[str, float]:
+    """
+    由分层抽样的像素估计色差统计，像素数不超过 sample_size 时改为精确计算
+
+    均值的置信区间按简单随机抽样的正态近似计算 (分层抽样的方差不大于简单随机抽样，区间偏保守)；
+    最值和分位数为样本的统计量
+
+    Args:
+        original: 原始图像 (H, W, 3)
+        corrected: 比较图像 (H, W, 3)
+        metric: 色差公式
+        sample_size: 样本像素数
+        confidence: 置信水平
+        seed: 随机种子 (相同输入总是得到相同结果)
+
+    Returns:
+        compare_images 的各项统计，以及 'sampled'、'sample_size'、'confidence'、
+        'mean_delta_e_ci' (置信区间下限, 上限)
+    """
+    if original.shape != corrected.shape:
+        raise ValueError(f"图像尺寸不一致: {original.shape} 与 {corrected.shape}")
+    if metric not in _FORMULAS:
+        raise ValueError(f"不支持的色差公式: {metric} (可选: {', '.join(METRICS)})")
+    if not 0 < confidence < 1:
+        raise ValueError("置信水平必须在 (0, 1) 之间")
+
+    height, width = original.shape[:2]
+    total = height * width
+    if total <= sample_size:
+        stats = compare_images(original, corrected, metric)
+        stats.update(sample_size=total, confidence=confidence,
+                     mean_delta_e_ci=(stats['mean_delta_e'], stats['mean_delta_e']))
+        return stats
+
+    ys, xs = stratified_sample(height, width, sample_size, seed)
+    lab1 = ColorSpace.rgb_to_lab(original[ys, xs]).astype(np.float32, copy=False)
+    lab2 = ColorSpace.rgb_to_lab(corrected[ys, xs]).astype(np.float32, copy=False)
+    values = _FORMULAS[metric](lab1, lab2).astype(np.float64)
+
+    n = values.size
+    mean = float(values.mean())
+    half_width = NormalDist().inv_cdf((1 + confidence) / 2) * float(values.std(ddof=1)) / n ** 0.5
+
+    stats = {
+        'metric': metric,
+        'mean_delta_e': mean,
+        'max_delta_e': float(values.max()),
+        'min_delta_e': float(values.min()),
+        'std_delta_e': float(values.std()),
+    }
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f'p{q:g}_delta_e'] = float(value)
+    stats['pixels_improved'] = int(round(np.count_nonzero(values) / n * total))
+    stats.update(sampled=True, sample_size=n, confidence=confidence,
+                 mean_delta_e_ci=(mean - half_width, mean + half_width))
+    return stats
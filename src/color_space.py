@@ -4,7 +4,6 @@
 """
 
 import numpy as np
-from scipy.ndimage import map_coordinates
 
 
 class ColorSpace:
@@ -29,11 +28,11 @@ class ColorSpace:
         return lab
     
     @staticmethod
-    def lab_to_rgb(lab):
+    def lab_to_rgb(lab, out=None):
         """
         LAB 转 RGB 颜色空间
         输入: LAB 图像 (H, W, 3)
-        输出: RGB 图像 (H, W, 3), 值范围 [0, 255]
+        输出: RGB 图像 (H, W, 3), 值范围 [0, 255]；指定 out (uint8) 时写入 out 并返回 out
         """
         # LAB 到 XYZ
         xyz = ColorSpace._lab_to_xyz(lab)
@@ -42,9 +41,13 @@ class ColorSpace:
         rgb_normalized = ColorSpace._xyz_to_rgb(xyz)
         
         # 转换到 [0, 255] 并裁剪
-        rgb = np.clip(rgb_normalized * 255.0, 0, 255).astype(np.uint8)
+        rgb_normalized *= 255.0
+        np.clip(rgb_normalized, 0, 255, out=rgb_normalized)
+        if out is None:
+            return rgb_normalized.astype(np.uint8)
         
-        return rgb
+        np.copyto(out, rgb_normalized, casting='unsafe')
+        return out
     
     @staticmethod
     def _rgb_to_xyz(rgb):
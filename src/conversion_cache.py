@@ -0,0 +1,161 @@
+"""
+颜色空间转换缓存
+同一目标图像依次尝试不同校正方法时，多项式校正和色差统计都要把整幅目标图像转换到 LAB 空间；
+缓存按图像内容保存转换结果，换用校正方法时直接复用。
+缓存以 LRU 方式按总字节数淘汰，并且不超过系统当前可用内存的一定比例
+"""
+
+import os
+import hashlib
+import threading
+import weakref
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from .color_space import ColorSpace
+
+
+# 默认缓存上限 (4 MP 图像的 LAB 结果约 96 MB)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 缓存最多占用的可用内存比例 (含缓存自身)
+MEMORY_FRACTION = 0.25
+
+
+def available_memory() -> Optional[int]:
+    """系统当前可用的物理内存 (字节)，无法获取时返回 None"""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def image_key(image: np.ndarray) -> Tuple:
+    """按图像内容计算缓存键 (形状、类型和内容摘要)"""
+    data = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(memoryview(data).cast('B'), digest_size=16).hexdigest()
+    return data.shape, data.dtype.str, digest
+
+
+def _immutable(image: np.ndarray) -> bool:
+    """数组及其所有基数组都不可写时，内容不会再变化"""
+    array = image
+    while isinstance(array, np.ndarray):
+        if array.flags.writeable:
+            return False
+        array = array.base
+    return True
+
+
+class ConversionCache:
+    """按图像内容缓存颜色空间转换结果的 LRU 缓存"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, memory_fraction: float = MEMORY_FRACTION):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存结果的总字节数上限
+            memory_fraction: 缓存最多占用的可用内存比例，为 None 时只按 max_bytes 限制
+        """
+        self.max_bytes = max_bytes
+        self.memory_fraction = memory_fraction
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        # 可重入: 弱引用回调可能在持有锁的线程中 (例如垃圾回收时) 触发
+        self._lock = threading.RLock()
+        # 只读数组 (例如会话中内存映射的图像) 按对象记住内容键，重复使用时不必重新计算摘要
+        self._keys = {}
+
+    @property
+    def size(self) -> int:
+        """当前缓存的总字节数"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, image: np.ndarray) -> Tuple:
+        if not _immutable(image):
+            return image_key(image)
+
+        identity = id(image)
+        with self._lock:
+            entry = self._keys.get(identity)
+        if entry is not None and entry[0]() is image:
+            return entry[1]
+
+        # 摘要在锁外计算；记录和删除 (弱引用回调可能在任意线程中触发) 都在锁内进行
+        key = image_key(image)
+        with self._lock:
+            self._keys[identity] = (weakref.ref(image, lambda ref: self._forget(identity, ref)), key)
+        return key
+
+    def _forget(self, identity: int, ref):
+        """图像被回收时删除其内容键 (同一 id 已被新对象重新登记时保留)"""
+        with self._lock:
+            entry = self._keys.get(identity)
+            if entry is not None and entry[0] is ref:
+                del self._keys[identity]
+
+    def limit(self) -> int:
+        """当前允许的缓存字节数: max_bytes 与可用内存比例中较小的一个"""
+        limit = self.max_bytes
+        available = available_memory() if self.memory_fraction is not None else None
+        if available is not None:
+            limit = min(limit, int((available + self._size) * self.memory_fraction))
+        return limit
+
+    def get_or_create(self, kind: str, image: np.ndarray,
+                      producer: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        命中则返回缓存的转换结果，否则调用 producer(image) 并缓存
+
+        Args:
+            kind: 转换类型，与图像内容一起作为缓存键
+            image: 输入图像
+            producer: 转换函数
+
+        Returns:
+            转换结果 (只读数组)
+        """
+        key = (kind,) + self._key(image)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = producer(image)
+        value.setflags(write=False)
+        self._put(key, value)
+        return value
+
+    def _put(self, key, value: np.ndarray):
+        limit = self.limit()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.nbytes
+            # 单个结果超过上限时不缓存
+            if value.nbytes > limit:
+                return
+            while self._entries and self._size + value.nbytes > limit:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+            self._entries[key] = value
+            self._size += value.nbytes
+
+    def lab(self, image: np.ndarray) -> np.ndarray:
+        """RGB 图像 (H, W, 3) 的 LAB 表示，结果与 ColorSpace.rgb_to_lab 相同"""
+        return self.get_or_create('lab', image, ColorSpace.rgb_to_lab)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
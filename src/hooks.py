@@ -0,0 +1,124 @@
+"""
+阶段钩子模块
+metrics.timed() 标记的每个处理阶段开始和结束时通知已启用的钩子，
+用于在不修改库代码的情况下采集各阶段耗时、内存等数据
+
+钩子是实现以下两个方法的任意对象 (可继承 StageHook 只覆盖需要的方法):
+    stage_started(stage, context)
+    stage_finished(stage, seconds, context)
+context 为阶段附带的信息字典，例如 {'method': 'polynomial', 'width': 1920, 'height': 1080}
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+
+# 全局钩子对所有线程生效；上下文钩子只对启用它的线程 (或协程) 生效
+_global_hooks: List[object] = []
+_global_lock = threading.Lock()
+_context_hooks: ContextVar[Tuple[object, ...]] = ContextVar('stage_hooks', default=())
+
+
+class StageHook:
+    """钩子基类，默认不做任何处理"""
+
+    def stage_started(self, stage: str, context: dict):
+        pass
+
+    def stage_finished(self, stage: str, seconds: float, context: dict):
+        pass
+
+
+class CallbackHook(StageHook):
+    """
+    用回调函数构造钩子
+
+    Example:
+        hook = CallbackHook(on_finish=lambda stage, seconds, context: log.info(...))
+    """
+
+    def __init__(self, on_start: Optional[Callable[[str, dict], None]] = None,
+                 on_finish: Optional[Callable[[str, float, dict], None]] = None):
+        self.on_start = on_start
+        self.on_finish = on_finish
+
+    def stage_started(self, stage: str, context: dict):
+        if self.on_start is not None:
+            self.on_start(stage, context)
+
+    def stage_finished(self, stage: str, seconds: float, context: dict):
+        if self.on_finish is not None:
+            self.on_finish(stage, seconds, context)
+
+
+@dataclass
+class StageEvent:
+    """一次阶段执行的记录"""
+    stage: str
+    seconds: float
+    context: dict = field(default_factory=dict)
+
+
+class StageRecorder(StageHook):
+    """记录每次阶段执行的耗时和附带信息"""
+
+    def __init__(self):
+        self.events: List[StageEvent] = []
+        self._lock = threading.Lock()
+
+    def stage_finished(self, stage: str, seconds: float, context: dict):
+        with self._lock:
+            self.events.append(StageEvent(stage, seconds, dict(context)))
+
+    def totals(self) -> dict:
+        """各阶段的累计耗时 (秒)，按首次出现的顺序"""
+        totals = {}
+        for event in self.events:
+            totals[event.stage] = totals.get(event.stage, 0.0) + event.seconds
+        return totals
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+
+
+def add_global_hook(hook):
+    """注册全局钩子"""
+    with _global_lock:
+        _global_hooks.append(hook)
+
+
+def remove_global_hook(hook):
+    """移除全局钩子"""
+    with _global_lock:
+        if hook in _global_hooks:
+            _global_hooks.remove(hook)
+
+
+@contextmanager
+def use_hooks(*hooks):
+    """
+    在当前线程 (或协程) 中启用钩子，期间的所有阶段 (包括嵌套调用中的阶段) 都会通知这些钩子
+
+    Example:
+        recorder = StageRecorder()
+        with use_hooks(recorder):
+            pipeline.process(calibration_image, target_image)
+    """
+    active = _context_hooks.get()
+    for hook in hooks:
+        if hook not in active:
+            active += (hook,)
+    token = _context_hooks.set(active)
+    try:
+        yield
+    finally:
+        _context_hooks.reset(token)
+
+
+def active_hooks() -> Tuple[object, ...]:
+    """当前生效的钩子 (全局钩子在前)"""
+    return tuple(_global_hooks) + _context_hooks.get()
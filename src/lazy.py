@@ -0,0 +1,43 @@
+"""
+延迟导入模块
+OpenCV 等较重的依赖在首次访问属性时才导入，
+使只用到部分功能的命令行调用和新启动的工作进程更快启动
+"""
+
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    模块代理，首次访问属性时导入真正的模块
+
+    Example:
+        cv2 = LazyModule('cv2')
+        cv2.imread(path)  # 此时才导入 cv2
+    """
+
+    def __init__(self, name: str):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<LazyModule '{self.__dict__['_name']}' ({state})>"
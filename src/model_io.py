@@ -0,0 +1,295 @@
+"""
+校正模型序列化模块
+提供紧凑的带版本二进制格式 (可内存映射加载) 以及 .cube 3D LUT 的导入导出
+"""
+
+import json
+import struct
+import hashlib
+import numpy as np
+from typing import Optional, Tuple
+
+from .color_corrector import ColorCorrector
+
+
+# 二进制格式:
+#   MAGIC (8 字节) | 版本号 uint32 | 头部长度 uint32 | JSON 头部 | 对齐填充 | 数组数据 ...
+# JSON 头部记录校正方法、元数据以及每个数组的 dtype / shape / 偏移量，
+# 数组数据按 ALIGNMENT 字节对齐，可直接用 np.memmap 映射
+MAGIC = b'CCMODEL\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+_PREFIX = struct.Struct('<8sII')
+
+# 各校正方法需要保存的数组
+MODEL_ARRAYS = {
+    'polynomial': ('powers', 'coef', 'intercept'),
+    'lut_3d': ('lut',),
+    'direct_mapping': ('reference', 'captured'),
+}
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _model_arrays(corrector: ColorCorrector) -> dict:
+    """提取需要序列化的数组"""
+    if corrector.correction_model is None:
+        raise ValueError("模型未训练，无法保存")
+
+    if corrector.method not in MODEL_ARRAYS:
+        raise ValueError(f"不支持的校正方法: {corrector.method}")
+
+    model = corrector.correction_model
+    if corrector.method == 'lut_3d':
+        arrays = {'lut': model}
+    else:
+        arrays = {name: model[name] for name in MODEL_ARRAYS[corrector.method]}
+
+    if corrector.reference_colors is not None:
+        arrays['reference_colors'] = corrector.reference_colors
+        arrays['captured_colors'] = corrector.captured_colors
+
+    return {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+
+def serialize_model(corrector: ColorCorrector, metadata: Optional[dict] = None) -> bytes:
+    """
+    将训练好的校正器序列化为二进制
+
+    Args:
+        corrector: 已训练的校正器
+        metadata: 附加的元数据 (需可 JSON 序列化)
+
+    Returns:
+        二进制数据
+    """
+    arrays = _model_arrays(corrector)
+
+    # 数组偏移量相对于数据区起点，数据区紧跟在对齐后的头部之后
+    descriptors = {}
+    offset = 0
+    for name, array in arrays.items():
+        descriptors[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+
+    header_bytes = json.dumps({
+        'method': corrector.method,
+        'metadata': metadata if metadata is not None else getattr(corrector, 'metadata', {}),
+        'arrays': descriptors
+    }).encode('utf-8')
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    buffer = bytearray(data_start + offset)
+    buffer[:_PREFIX.size] = _PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes))
+    buffer[_PREFIX.size:_PREFIX.size + len(header_bytes)] = header_bytes
+    for name, array in arrays.items():
+        start = data_start + descriptors[name]['offset']
+        buffer[start:start + array.nbytes] = array.tobytes()
+
+    return bytes(buffer)
+
+
+def model_fingerprint(corrector: ColorCorrector) -> str:
+    """
+    校正模型的内容指纹 (只取决于方法和模型数组，不含元数据)
+
+    Returns:
+        16 位十六进制字符串，模型参数相同则指纹相同
+    """
+    digest = hashlib.sha256(corrector.method.encode('utf-8'))
+    for name, array in sorted(_model_arrays(corrector).items()):
+        digest.update(f'{name}:{array.dtype.str}:{array.shape}'.encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _read_header(prefix: bytes, read_header) -> Tuple[dict, int]:
+    """解析文件头，返回 (JSON 头部, 数据区起点)"""
+    if len(prefix) < _PREFIX.size:
+        raise ValueError("文件过短，不是有效的校正模型")
+
+    magic, version, header_length = _PREFIX.unpack(prefix[:_PREFIX.size])
+    if magic != MAGIC:
+        raise ValueError("不是有效的校正模型文件")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"不支持的模型格式版本: {version} (当前支持 {FORMAT_VERSION})")
+
+    header = json.loads(read_header(header_length).decode('utf-8'))
+    return header, _align(_PREFIX.size + header_length)
+
+
+def _build_corrector(header: dict, arrays: dict) -> ColorCorrector:
+    method = header['method']
+    if method not in MODEL_ARRAYS:
+        raise ValueError(f"不支持的校正方法: {method}")
+
+    corrector = ColorCorrector(method=method)
+    if method == 'lut_3d':
+        corrector.correction_model = arrays['lut']
+    else:
+        corrector.correction_model = {name: arrays[name] for name in MODEL_ARRAYS[method]}
+
+    corrector.reference_colors = arrays.get('reference_colors')
+    corrector.captured_colors = arrays.get('captured_colors')
+    corrector.metadata = header.get('metadata', {})
+    return corrector
+
+
+def deserialize_model(data: bytes) -> ColorCorrector:
+    """从二进制数据恢复校正器 (数组直接引用 data，不复制)"""
+    header, data_start = _read_header(data, lambda n: bytes(data[_PREFIX.size:_PREFIX.size + n]))
+
+    arrays = {}
+    for name, desc in header['arrays'].items():
+        dtype = np.dtype(desc['dtype'])
+        count = int(np.prod(desc['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count,
+                                     offset=data_start + desc['offset']).reshape(desc['shape'])
+
+    return _build_corrector(header, arrays)
+
+
+def save_model(corrector: ColorCorrector, path: str, metadata: Optional[dict] = None):
+    """保存校正器到文件"""
+    with open(path, 'wb') as f:
+        f.write(serialize_model(corrector, metadata))
+
+
+def load_model(path: str, mmap: bool = True) -> ColorCorrector:
+    """
+    从文件加载校正器
+
+    Args:
+        path: 模型文件路径
+        mmap: 是否以内存映射方式加载数组 (只读，多个进程共享同一份物理内存)
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        header, data_start = _read_header(prefix, f.read)
+
+        arrays = {}
+        for name, desc in header['arrays'].items():
+            dtype = np.dtype(desc['dtype'])
+            shape = tuple(desc['shape'])
+            if mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r',
+                                         offset=data_start + desc['offset'], shape=shape)
+            else:
+                f.seek(data_start + desc['offset'])
+                count = int(np.prod(shape, dtype=np.int64))
+                arrays[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+
+    return _build_corrector(header, arrays)
+
+
+def bake_lut(corrector: ColorCorrector, size: int = 33) -> np.ndarray:
+    """
+    将任意校正方法烘焙为 3D LUT
+
+    Args:
+        corrector: 已训练的校正器
+        size: 每个维度的采样点数
+
+    Returns:
+        LUT 数组 (size, size, size, 3)，按 [r, g, b] 索引，值范围 [0, 1]
+    """
+    if size < 2:
+        raise ValueError("LUT 尺寸至少为 2")
+    if corrector.method == 'auto':
+        # auto 方法按图像像素数选择方案，对 LUT 网格校正会按网格大小重新选择，
+        # 应烘焙 plan() 为目标图像选择的候选校正器
+        raise ValueError("auto 方法不能直接烘焙 LUT，请烘焙为目标图像选择的候选校正器")
+
+    axis = np.linspace(0, 255, size, dtype=np.float32)
+    r, g, b = np.meshgrid(axis, axis, axis, indexing='ij')
+    grid = np.stack([r, g, b], axis=-1).reshape(size * size, size, 3)
+
+    corrected = corrector.correct(grid)
+    return (corrected.reshape(size, size, size, 3).astype(np.float32) / 255.0)
+
+
+def format_cube(lut: np.ndarray, title: str = 'Color Correction') -> str:
+    """
+    生成 .cube 格式的 3D LUT 文本
+
+    Args:
+        lut: LUT 数组 (N, N, N, 3)，按 [r, g, b] 索引，值范围 [0, 1]
+        title: LUT 标题
+    """
+    size = lut.shape[0]
+    lines = [
+        f'TITLE "{title}"',
+        f'LUT_3D_SIZE {size}',
+        'DOMAIN_MIN 0.0 0.0 0.0',
+        'DOMAIN_MAX 1.0 1.0 1.0',
+    ]
+
+    # .cube 规定红色通道变化最快，即按 [b, g, r] 顺序输出
+    values = np.clip(lut, 0.0, 1.0).transpose(2, 1, 0, 3).reshape(-1, 3)
+    lines.extend(f'{r:.6f} {g:.6f} {b:.6f}' for r, g, b in values)
+    return '\n'.join(lines) + '\n'
+
+
+def parse_cube(text: str) -> Tuple[np.ndarray, str]:
+    """
+    解析 .cube 格式的 3D LUT
+
+    Returns:
+        (LUT 数组 (N, N, N, 3) 按 [r, g, b] 索引、值归一化到 [0, 1], 标题)
+    """
+    size = None
+    title = ''
+    domain_min = np.zeros(3, dtype=np.float32)
+    domain_max = np.ones(3, dtype=np.float32)
+    values = []
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        keyword = line.split()[0]
+        if keyword == 'TITLE':
+            title = line[len('TITLE'):].strip().strip('"')
+        elif keyword == 'LUT_3D_SIZE':
+            size = int(line.split()[1])
+        elif keyword == 'DOMAIN_MIN':
+            domain_min = np.array(line.split()[1:4], dtype=np.float32)
+        elif keyword == 'DOMAIN_MAX':
+            domain_max = np.array(line.split()[1:4], dtype=np.float32)
+        elif keyword == 'LUT_1D_SIZE':
+            raise ValueError("不支持 1D LUT")
+        elif keyword[0].isalpha():
+            continue
+        else:
+            values.append(line.split()[:3])
+
+    if size is None:
+        raise ValueError("缺少 LUT_3D_SIZE")
+    if len(values) != size ** 3:
+        raise ValueError(f"LUT 数据行数错误: 期望 {size ** 3}，得到 {len(values)}")
+
+    lut = np.array(values, dtype=np.float32)
+    lut = (lut - domain_min) / (domain_max - domain_min)
+    lut = lut.reshape(size, size, size, 3).transpose(2, 1, 0, 3)
+    return np.ascontiguousarray(lut), title
+
+
+def export_cube(corrector: ColorCorrector, path: str, size: int = 33, title: str = 'Color Correction'):
+    """将校正器导出为 .cube 文件"""
+    with open(path, 'w') as f:
+        f.write(format_cube(bake_lut(corrector, size), title))
+
+
+def load_cube(path: str) -> ColorCorrector:
+    """加载 .cube 文件为 lut_3d 校正器"""
+    with open(path) as f:
+        lut, title = parse_cube(f.read())
+
+    corrector = ColorCorrector(method='lut_3d')
+    corrector.correction_model = lut * 255.0
+    corrector.metadata = {'title': title}
+    return corrector
@@ -3,44 +3,180 @@
 整合检测、校正、输出的完整流程
 """
 
-import cv2
+import copy
+import time
+import functools
+import contextlib
+import contextvars
 import numpy as np
-from typing import Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 from .color_checker_detector import ColorCheckerDetector
-from .color_corrector import ColorCorrector
-from .color_space import ColorSpace
+from .color_corrector import ColorCorrector, METHODS
+from . import color_difference
+from .conversion_cache import ConversionCache
+from .hooks import use_hooks
+from .lazy import LazyModule
+from .metrics import timed
+from .profiling import MemoryProfiler
+
+cv2 = LazyModule('cv2')
+
+
+# 渐进式校正中预览图的最长边 (像素)
+PREVIEW_MAX_SIDE = 1024
+
+
+def downscale(image: np.ndarray, max_side: int) -> np.ndarray:
+    """按比例缩小图像使最长边不超过 max_side (区域插值)，本身不超过时原样返回"""
+    h, w = image.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1.0:
+        return image
+    size = (max(int(round(w * scale)), 1), max(int(round(h * scale)), 1))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+@dataclass
+class ProgressiveResult:
+    """
+    渐进式校正的结果: 立即可用的预览图和后台计算的全分辨率结果
+    
+    两者由同一个校正器快照 (corrector) 以同一执行方式 (mode) 计算，
+    之后管道重新校准不会影响尚未完成的全分辨率结果
+    """
+    preview: np.ndarray
+    future: Future
+    corrector: ColorCorrector
+    mode: str
+    
+    def done(self) -> bool:
+        """全分辨率结果是否已完成 (包括失败)"""
+        return self.future.done()
+    
+    def result(self, timeout: Optional[float] = None) -> np.ndarray:
+        """等待并返回全分辨率结果，校正失败时抛出原异常"""
+        return self.future.result(timeout)
+
+
+def _hooked(method):
+    """在管道的钩子 (以及开启时的内存分析器) 生效期间执行管道方法"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with contextlib.ExitStack() as stack:
+            if self.profiler is not None:
+                stack.enter_context(self.profiler.activate())
+            if self.hooks:
+                stack.enter_context(use_hooks(*self.hooks))
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class ColorCorrectionPipeline:
     """颜色校正处理管道"""
     
-    def __init__(self, correction_method: str = 'polynomial'):
+    def __init__(self, correction_method: str = 'polynomial', memory_profiling: bool = False,
+                 hooks: Optional[Iterable] = None, cache=None, latency_budget: Optional[float] = None):
         """
         初始化处理管道
         
         Args:
-            correction_method: 校正方法 ('polynomial', 'lut_3d', 'direct_mapping')
+            correction_method: 校正方法 ('polynomial', 'lut_3d', 'direct_mapping', 'auto')
+            memory_profiling: 是否记录各阶段的峰值内存和耗时 (结果见 self.profiler)
+            hooks: 阶段钩子 (见 hooks 模块)，在各阶段开始和结束时收到阶段名称、
+                校正方法、图像尺寸和耗时
+            cache: 可选的 ConversionCache，同一目标图像换用校正方法或计算色差时复用其 LAB 转换结果
+            latency_budget: auto 方法单张图像的校正耗时预算 (秒)，按预算和图像尺寸选择方法和执行方式
         """
         self.detector = ColorCheckerDetector()
-        self.corrector = ColorCorrector(method=correction_method)
+        self.corrector = ColorCorrector(method=correction_method, latency_budget=latency_budget)
         self.is_trained = False
+        self.profiler = MemoryProfiler() if memory_profiling else None
+        self.hooks: List = list(hooks or [])
+        self.cache = cache
     
-    def calibrate(self, calibration_image: np.ndarray) -> bool:
+    def add_hook(self, hook):
+        """添加阶段钩子"""
+        self.hooks.append(hook)
+    
+    def remove_hook(self, hook):
+        """移除阶段钩子"""
+        self.hooks.remove(hook)
+    
+    def _context(self, image: np.ndarray) -> dict:
+        """传给阶段钩子的附带信息"""
+        return {'method': self.corrector.method, 'width': image.shape[1], 'height': image.shape[0]}
+    
+    def enable_memory_profiling(self) -> MemoryProfiler:
+        """开启内存分析 (例如从校准配置加载的管道)，返回分析器"""
+        if self.profiler is None:
+            self.profiler = MemoryProfiler()
+        return self.profiler
+    
+    @classmethod
+    def from_corrector(cls, corrector: ColorCorrector) -> 'ColorCorrectionPipeline':
         """
-        使用包含色卡的校准图像进行校准
+        使用已训练的校正器创建管道，跳过检测和训练
         
         Args:
-            calibration_image: 包含色卡的图像 (H, W, 3) RGB
+            corrector: 已训练的校正器 (例如从校准配置加载)
+        """
+        if corrector.correction_model is None:
+            raise ValueError("校正器未训练")
+        
+        pipeline = cls(correction_method=corrector.method)
+        # 使用副本: 之后重新校准或混合只替换副本的模型，不影响调用方 (例如注册表缓存) 持有的校正器
+        pipeline.corrector = copy.copy(corrector)
+        pipeline.is_trained = True
+        return pipeline
+    
+    @classmethod
+    def from_profile(cls, name: str, registry=None) -> 'ColorCorrectionPipeline':
+        """
+        从校准配置注册表加载管道
+        
+        Args:
+            name: 配置名称
+            registry: ProfileRegistry，默认使用进程内共享的注册表
+        """
+        from .profiles import get_default_registry
+        registry = registry or get_default_registry()
+        return cls.from_corrector(registry.load(name))
+    
+    def save_profile(self, name: str, registry=None, metadata: Optional[dict] = None):
+        """
+        将当前校准结果保存为命名配置
+        
+        Args:
+            name: 配置名称
+            registry: ProfileRegistry，默认使用进程内共享的注册表
+            metadata: 附加的元数据
             
         Returns:
-            是否校准成功
+            配置文件路径
+        """
+        if not self.is_trained:
+            raise ValueError("管道未校准，请先调用 calibrate() 方法")
+        
+        from .profiles import get_default_registry
+        registry = registry or get_default_registry()
+        return registry.save(name, self.corrector, metadata)
+    
+    def _detect_colors(self, calibration_image: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        检测色卡并取出色块颜色
+        
+        Returns:
+            (标准参考颜色, 拍摄的颜色)，检测失败时为 None
         """
         # 检测色卡
-        detection_result = self.detector.detect(calibration_image)
+        with timed('detect', **self._context(calibration_image)):
+            detection_result = self.detector.detect(calibration_image)
         
         if not detection_result['detected']:
             print("未检测到色卡")
-            return False
+            return None
         
         print(f"色卡检测置信度: {detection_result['confidence']:.2%}")
         
@@ -54,21 +190,44 @@ class ColorCorrectionPipeline:
         # 确保颜色数量匹配
         if len(captured_colors) != len(reference_colors):
             print(f"颜色数量不匹配: 检测到 {len(captured_colors)}, 期望 {len(reference_colors)}")
+            return None
+        
+        return reference_colors, captured_colors
+    
+    @_hooked
+    def calibrate(self, calibration_image: np.ndarray) -> bool:
+        """
+        使用包含色卡的校准图像进行校准
+        
+        Args:
+            calibration_image: 包含色卡的图像 (H, W, 3) RGB
+            
+        Returns:
+            是否校准成功
+        """
+        colors = self._detect_colors(calibration_image)
+        if colors is None:
             return False
+        reference_colors, captured_colors = colors
         
         # 训练校正模型
-        self.corrector.train(reference_colors, captured_colors)
+        with timed('train', method=self.corrector.method, patches=len(captured_colors)):
+            self.corrector.train(reference_colors, captured_colors)
         self.is_trained = True
         
         print(f"校准成功，检测到 {len(captured_colors)} 个色块")
         return True
     
-    def correct_image(self, image: np.ndarray) -> np.ndarray:
+    @_hooked
+    def correct_image(self, image: np.ndarray, out: Optional[np.ndarray] = None,
+                      use_cache: bool = True) -> np.ndarray:
         """
         对图像进行颜色校正
         
         Args:
             image: 输入图像 (H, W, 3) RGB
+            out: 可选的预分配输出缓冲区 (H, W, 3) uint8
+            use_cache: 是否使用管道的转换缓存 (视频帧等只校正一次的图像不必缓存)
             
         Returns:
             校正后的图像 (H, W, 3) RGB
@@ -76,8 +235,117 @@ class ColorCorrectionPipeline:
         if not self.is_trained:
             raise ValueError("管道未校准，请先调用 calibrate() 方法")
         
-        return self.corrector.correct(image)
+        with timed('correct', **self._context(image)):
+            return self.corrector.correct(image, out=out, cache=self.cache if use_cache else None)
+    
+    @_hooked
+    def correct_progressive(self, image: np.ndarray, preview_max_side: int = PREVIEW_MAX_SIDE,
+                            executor=None) -> ProgressiveResult:
+        """
+        渐进式校正: 先校正缩小的预览图并立即返回，全分辨率校正在后台线程中完成
+        
+        预览图和全分辨率结果使用调用时的同一个模型快照；auto 方法按全分辨率图像的尺寸选择方案，
+        预览图沿用同一方案，两者颜色一致
+        
+        Args:
+            image: 输入图像 (H, W, 3) RGB
+            preview_max_side: 预览图最长边 (像素)
+            executor: 执行全分辨率校正的线程池，默认为本次调用新建一个线程
+            
+        Returns:
+            ProgressiveResult (preview、future、corrector、mode)
+        """
+        if not self.is_trained:
+            raise ValueError("管道未校准，请先调用 calibrate() 方法")
+        if preview_max_side < 1:
+            raise ValueError("预览图最长边至少为 1 像素")
+        
+        corrector, mode = self.corrector, 'dense'
+        if corrector.method == 'auto':
+            plan = corrector.plan(image.shape[1], image.shape[0])
+            corrector, mode = corrector.correction_model['candidates'][plan.method], plan.mode
+        # 重新校准和混合都替换 correction_model 而不修改原数组，浅复制即可固定当前模型
+        corrector = copy.copy(corrector)
+        
+        preview = downscale(image, preview_max_side)
+        with timed('preview', method=corrector.method, mode=mode,
+                   width=preview.shape[1], height=preview.shape[0]):
+            preview = corrector.correct(preview, mode=mode)
+        
+        def run():
+            with timed('correct', **self._context(image)):
+                return corrector.correct(image, cache=self.cache, mode=mode)
+        
+        # 复制当前上下文，钩子和内存分析在后台线程中同样生效
+        context = contextvars.copy_context()
+        if executor is None:
+            own = ThreadPoolExecutor(max_workers=1, thread_name_prefix='color-progressive')
+            future = own.submit(context.run, run)
+            # 不等待任务结束，线程在任务完成后退出
+            own.shutdown(wait=False)
+        else:
+            future = executor.submit(context.run, run)
+        
+        return ProgressiveResult(preview, future, corrector, mode)
     
+    def correct_stream(self, frames: Iterable[np.ndarray], calibrate_every: int = 0,
+                       smoothing: float = 0.0, buffers: int = 2,
+                       stats: Optional[dict] = None) -> Iterator[np.ndarray]:
+        """
+        逐帧校正视频帧序列
+        
+        每隔 calibrate_every 帧尝试用当前帧重新校准 (帧中需包含色卡)，检测失败时沿用当前模型；
+        重新校准得到的模型参数与之前的模型按 smoothing 加权混合，避免画面颜色跳变。
+        未校准之前的帧原样输出。
+        
+        输出写入预先分配的 buffers 个缓冲区中循环使用，不为每帧分配新数组：
+        返回的帧在之后再产生 buffers 帧前保持有效，需要长期保留时请复制。
+        
+        Args:
+            frames: 帧序列，每帧 (H, W, 3) RGB uint8
+            calibrate_every: 重新校准间隔 (帧)，0 表示不重新校准
+            smoothing: 之前模型所占的权重 [0, 1)，0 表示直接使用新模型
+            buffers: 输出缓冲区数量
+            stats: 可选的字典，持续更新 frames / corrected / calibrations 计数
+            
+        Yields:
+            校正后的帧 (H, W, 3) RGB
+        """
+        if calibrate_every < 0:
+            raise ValueError("重新校准间隔不能为负数")
+        if not 0.0 <= smoothing < 1.0:
+            raise ValueError("平滑权重必须在 [0, 1) 之间")
+        if buffers < 1:
+            raise ValueError("输出缓冲区数量至少为 1")
+        
+        if stats is None:
+            stats = {}
+        stats.update(frames=0, corrected=0, calibrations=0)
+        
+        ring = []
+        for index, frame in enumerate(frames):
+            if calibrate_every and index % calibrate_every == 0:
+                previous = copy.copy(self.corrector) if self.is_trained else None
+                if self.calibrate(frame):
+                    stats['calibrations'] += 1
+                    if previous is not None and smoothing > 0:
+                        self.corrector.blend(previous, smoothing)
+            
+            # 帧尺寸变化时重新分配输出缓冲区
+            if not ring or ring[0].shape != frame.shape:
+                ring = [np.empty(frame.shape, dtype=np.uint8) for _ in range(buffers)]
+            out = ring[index % buffers]
+            
+            if self.is_trained:
+                self.correct_image(frame, out=out, use_cache=False)
+                stats['corrected'] += 1
+            else:
+                np.copyto(out, frame)
+            
+            stats['frames'] += 1
+            yield out
+    
+    @_hooked
     def process(self, calibration_image: np.ndarray, 
                 target_image: np.ndarray) -> Tuple[np.ndarray, dict]:
         """
@@ -92,50 +360,188 @@ class ColorCorrectionPipeline:
         """
         info = {}
         
-        # 校准
+        with timed('process', **self._context(target_image)):
+            # 校准
+            if not self.calibrate(calibration_image):
+                info['status'] = 'calibration_failed'
+                return None, info
+            
+            info['calibration_success'] = True
+            
+            # 校正
+            corrected = self.correct_image(target_image)
+        
+        info['status'] = 'success'
+        info['correction_method'] = self.corrector.method
+        if self.corrector.method == 'auto':
+            info['plan'] = self.corrector.plan(target_image.shape[1], target_image.shape[0]).to_dict()
+        # 校正质量取自训练时的色块残差，不需要再对整幅图像计算色差
+        info.update(self.residual_info())
+        
+        return corrected, info
+    
+    @_hooked
+    def process_progressive(self, calibration_image: np.ndarray, target_image: np.ndarray,
+                            preview_max_side: int = PREVIEW_MAX_SIDE,
+                            executor=None) -> Tuple[Optional[ProgressiveResult], dict]:
+        """
+        渐进式完整处理流程：校准后先返回预览图，全分辨率校正在后台完成 (见 correct_progressive)
+        
+        Returns:
+            (ProgressiveResult，校准失败时为 None, 处理信息字典)
+        """
+        info = {}
         if not self.calibrate(calibration_image):
             info['status'] = 'calibration_failed'
             return None, info
         
         info['calibration_success'] = True
-        
-        # 校正
-        corrected = self.correct_image(target_image)
+        progressive = self.correct_progressive(target_image, preview_max_side, executor)
         
         info['status'] = 'success'
         info['correction_method'] = self.corrector.method
+        if self.corrector.method == 'auto':
+            info['plan'] = self.corrector.plan(target_image.shape[1], target_image.shape[0]).to_dict()
+        info.update(self.residual_info())
         
-        return corrected, info
+        return progressive, info
     
+    @_hooked
+    def compare_methods(self, calibration_image: np.ndarray, target_image: np.ndarray,
+                        methods: Sequence[str] = METHODS, workers: Optional[int] = None,
+                        metric: str = 'ciede2000',
+                        sample_size: Optional[int] = color_difference.SAMPLE_SIZE) -> dict:
+        """
+        比较多种校正方法：色卡只检测一次，各方法在线程池中并行训练和校正，
+        共用检测得到的色块颜色和目标图像的 LAB 转换结果 (self.cache，未设置时使用临时缓存)
+        
+        结果按留一法残差 (每个色块用其余色块训练的模型校正后的平均 CIEDE2000 色差) 从小到大排序，
+        相同时耗时短的在前；
+        比较完成后管道改用排名第一的方法的模型，可以直接调用 correct_image()
+        
+        Args:
+            calibration_image: 包含色卡的校准图像
+            target_image: 需要校正的目标图像
+            methods: 参与比较的校正方法
+            workers: 线程数，默认每种方法一个线程
+            metric: 目标图像与校正结果的色差公式
+            sample_size: 色差统计的抽样像素数，None 表示对全部像素精确计算
+            
+        Returns:
+            {'status', 'best': 排名第一的方法, 'results': 按排名排序的列表}，
+            每项包含 rank、method、image、holdout_delta_e (留一法残差)、mean_delta_e、max_delta_e (训练残差)、
+            train_seconds、correct_seconds、seconds、difference (目标图像与校正结果的色差统计)，
+            失败的方法带 error 并排在最后
+        """
+        methods = list(dict.fromkeys(methods))
+        unknown = [method for method in methods if method not in METHODS]
+        if not methods or unknown:
+            raise ValueError(f"不支持的校正方法: {', '.join(unknown) or '(空)'} (可选: {', '.join(METHODS)})")
+        
+        with timed('compare_methods', methods=len(methods), **self._context(target_image)):
+            colors = self._detect_colors(calibration_image)
+            if colors is None:
+                return {'status': 'calibration_failed', 'best': None, 'results': []}
+            
+            cache = self.cache if self.cache is not None else ConversionCache()
+            if 'polynomial' in methods or not sample_size:
+                # 先在当前线程转换一次，避免多个线程同时未命中而重复转换
+                cache.lab(target_image)
+            
+            with ThreadPoolExecutor(max_workers=workers or len(methods)) as executor:
+                # 每个任务复制当前上下文，钩子和内存分析在工作线程中同样生效
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._run_method, method,
+                                    colors, target_image, cache, metric, sample_size)
+                    for method in methods
+                ]
+                results = [future.result() for future in futures]
+        
+        results.sort(key=lambda result: ('error' in result, result.get('holdout_delta_e', 0.0),
+                                         result.get('seconds', 0.0)))
+        for rank, result in enumerate(results, 1):
+            result['rank'] = rank
+        
+        best = results[0]
+        if 'error' in best:
+            return {'status': 'failed', 'best': None, 'results': results}
+        
+        self.corrector = best.pop('corrector')
+        self.is_trained = True
+        for result in results:
+            result.pop('corrector', None)
+        return {'status': 'success', 'best': best['method'], 'results': results}
+    
+    def _run_method(self, method: str, colors: Tuple[np.ndarray, np.ndarray],
+                    target_image: np.ndarray, cache: ConversionCache,
+                    metric: str, sample_size: Optional[int]) -> dict:
+        """compare_methods 中单个方法的训练、校正和色差统计"""
+        reference_colors, captured_colors = colors
+        result = {'method': method}
+        try:
+            corrector = ColorCorrector(method=method)
+            start = time.perf_counter()
+            with timed('train', method=method, patches=len(captured_colors)):
+                corrector.train(reference_colors, captured_colors)
+            result['train_seconds'] = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            with timed('correct', method=method, width=target_image.shape[1], height=target_image.shape[0]):
+                corrected = corrector.correct(target_image, cache=cache)
+            result['correct_seconds'] = time.perf_counter() - start
+            result['seconds'] = result['train_seconds'] + result['correct_seconds']
+            
+            residuals = corrector.residuals
+            result.update(image=corrected, corrector=corrector,
+                          holdout_delta_e=corrector.holdout_residuals()['mean_delta_e'],
+                          mean_delta_e=residuals['mean_delta_e'], max_delta_e=residuals['max_delta_e'])
+            if sample_size:
+                result['difference'] = color_difference.sample_compare(
+                    target_image, corrected, metric=metric, sample_size=sample_size)
+            else:
+                result['difference'] = color_difference.compare_images(
+                    target_image, corrected, metric=metric, cache=cache)
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+    
+    def residual_info(self) -> dict:
+        """
+        训练残差 (色块校正结果与标准颜色的 CIEDE2000 色差)
+        
+        Returns:
+            {'mean_delta_e', 'max_delta_e', 'min_delta_e', 'patch_delta_e'}，
+            模型没有色块颜色时为空字典
+        """
+        residuals = self.corrector.residuals
+        if residuals is None:
+            return {}
+        return {key: residuals[key] for key in
+                ('mean_delta_e', 'max_delta_e', 'min_delta_e', 'patch_delta_e')}
+    
+    @_hooked
     def compare_images(self, original: np.ndarray, 
-                      corrected: np.ndarray) -> dict:
+                      corrected: np.ndarray, metric: str = 'ciede2000',
+                      sample_size: Optional[int] = None) -> dict:
         """
         比较原始图像和校正后的图像
         
         Args:
             original: 原始图像
             corrected: 校正后的图像
+            metric: 色差公式 ('ciede2000', 'cie94', 'cie76')
+            sample_size: 指定时只对分层抽样的这么多像素计算 (附带均值的 95% 置信区间)，
+                None 表示对全部像素精确计算
             
         Returns:
-            比较结果字典
+            比较结果字典: 色差的均值、标准差、最值、p50/p95/p99 分位数等 (见 color_difference 模块)
         """
-        # 转换到 LAB 颜色空间
-        original_lab = ColorSpace.rgb_to_lab(original)
-        corrected_lab = ColorSpace.rgb_to_lab(corrected)
-        
-        # 计算 Delta E (CIE76)
-        delta_e = np.sqrt(np.sum((original_lab - corrected_lab) ** 2, axis=2))
-        
-        # 统计信息
-        stats = {
-            'mean_delta_e': float(delta_e.mean()),
-            'max_delta_e': float(delta_e.max()),
-            'min_delta_e': float(delta_e.min()),
-            'std_delta_e': float(delta_e.std()),
-            'pixels_improved': int((delta_e > 0).sum())
-        }
-        
-        return stats
+        with timed('compare', metric=metric, sampled=bool(sample_size), **self._context(original)):
+            if sample_size:
+                return color_difference.sample_compare(original, corrected, metric=metric,
+                                                       sample_size=sample_size)
+            # 分块计算，内存占用与图像尺寸无关；指定了缓存时复用原始图像的 LAB 转换结果
+            return color_difference.compare_images(original, corrected, metric=metric, cache=self.cache)
     
     def create_comparison_image(self, original: np.ndarray,
                                corrected: np.ndarray) -> np.ndarray:
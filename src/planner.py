@@ -0,0 +1,155 @@
+"""
+校正方案选择
+auto 方法按单张图像的耗时预算和图像尺寸选择校正方法与执行方式：
+耗时由基准测试拟合的代价模型 (固定开销 + 每百万像素耗时) 预测，
+准确度取各方法的留一法残差 (烘焙 LUT 另加插值误差)；
+预算内选择最准确的方案，准确度相同时选择更快的，没有方案满足预算时选择最快的
+
+代价模型可以由基准测试结果重新拟合:
+    python -m src.benchmark --sizes 0.25,1,4 --modes dense,tiled,threaded,baked --cost-model cost_model.json
+并通过环境变量 COLOR_CORRECT_COST_MODEL 指定
+"""
+
+import os
+import json
+import numpy as np
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional, Tuple
+
+
+# 默认代价: (固定开销秒数, 每百万像素秒数)，由单核 x86 机器上的基准测试拟合 (--sizes 0.25,1,2)
+DEFAULT_COSTS = {
+    'polynomial.dense': (0.000, 0.646),
+    'polynomial.tiled': (0.018, 0.413),
+    'polynomial.threaded': (0.000, 0.510),
+    'polynomial.baked': (0.003, 0.227),
+    'lut_3d.dense': (0.000, 0.295),
+    'lut_3d.tiled': (0.000, 0.259),
+    'lut_3d.threaded': (0.001, 0.218),
+    'direct_mapping.dense': (0.102, 1.117),
+    'direct_mapping.tiled': (0.000, 1.479),
+    'direct_mapping.threaded': (0.203, 1.055),
+}
+
+# 指定代价模型文件的环境变量
+COST_MODEL_ENV = 'COLOR_CORRECT_COST_MODEL'
+
+
+@dataclass
+class CostModel:
+    """校正耗时的线性代价模型"""
+    coefficients: Dict[str, Tuple[float, float]] = field(default_factory=lambda: dict(DEFAULT_COSTS))
+    source: str = 'default'
+
+    def predict(self, method: str, mode: str, pixels: int) -> Optional[float]:
+        """
+        预测校正耗时 (秒)
+
+        Returns:
+            预测耗时，模型中没有该方案时为 None
+        """
+        coefficient = self.coefficients.get(f'{method}.{mode}')
+        if coefficient is None:
+            return None
+        fixed, per_megapixel = coefficient
+        return fixed + per_megapixel * pixels / 1e6
+
+    @classmethod
+    def from_benchmark(cls, results: dict, threads: Optional[int] = None) -> 'CostModel':
+        """
+        由基准测试结果拟合代价模型
+
+        使用 correct.<方法> (dense) 和 correct.<方法>.<执行方式> 用例，
+        对每个方案按 耗时 = 固定开销 + 每百万像素耗时 x 百万像素数 做最小二乘拟合
+
+        Args:
+            results: run_benchmarks 的结果
+            threads: 使用该线程数的用例，默认取结果中最大的线程数
+        """
+        cases = [r for r in results.get('results', [])
+                 if not r.get('skipped') and r.get('megapixels') and r['name'].startswith('correct.')]
+        if not cases:
+            raise ValueError("基准测试结果中没有校正用例")
+        threads = threads or max(r['threads'] for r in cases)
+
+        samples = {}
+        for result in cases:
+            if result['threads'] != threads:
+                continue
+            parts = result['name'].split('.')
+            key = f"{parts[1]}.{parts[2] if len(parts) > 2 else 'dense'}"
+            samples.setdefault(key, []).append((result['megapixels'], result['median_seconds']))
+
+        coefficients = {}
+        for key, points in samples.items():
+            sizes = np.array([size for size, _ in points], dtype=np.float64)
+            seconds = np.array([second for _, second in points], dtype=np.float64)
+            if len(np.unique(sizes)) >= 2:
+                per_megapixel, fixed = np.polyfit(sizes, seconds, 1)
+            else:
+                per_megapixel, fixed = float(np.mean(seconds / sizes)), 0.0
+            coefficients[key] = (max(float(fixed), 0.0), max(float(per_megapixel), 0.0))
+
+        return cls(coefficients, source=f"benchmark ({threads} 线程)")
+
+    @classmethod
+    def load(cls, path: str) -> 'CostModel':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls({key: tuple(value) for key, value in data['coefficients'].items()},
+                   source=data.get('source', path))
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'coefficients': self.coefficients}, f,
+                      indent=2, ensure_ascii=False)
+            f.write('\n')
+
+
+def default_cost_model() -> CostModel:
+    """环境变量 COLOR_CORRECT_COST_MODEL 指定的代价模型，未设置时使用内置默认值"""
+    path = os.environ.get(COST_MODEL_ENV)
+    return CostModel.load(path) if path else CostModel()
+
+
+@dataclass
+class Plan:
+    """选定的校正方案"""
+    method: str
+    mode: str
+    predicted_seconds: float
+    holdout_delta_e: float
+    within_budget: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def select_plan(accuracy: Dict[Tuple[str, str], float], pixels: int,
+                budget: Optional[float] = None, cost_model: Optional[CostModel] = None) -> Plan:
+    """
+    选择校正方案
+
+    Args:
+        accuracy: {(方法, 执行方式): 预计平均 Delta E}
+        pixels: 图像像素数
+        budget: 单张图像的耗时预算 (秒)，None 表示不限
+        cost_model: 代价模型，默认 default_cost_model()
+
+    Returns:
+        Plan
+    """
+    cost_model = cost_model or default_cost_model()
+    candidates = []
+    for (method, mode), delta_e in accuracy.items():
+        seconds = cost_model.predict(method, mode, pixels)
+        if seconds is not None:
+            candidates.append(Plan(method, mode, seconds, delta_e,
+                                   budget is None or seconds <= budget))
+    if not candidates:
+        raise ValueError("代价模型中没有可用的校正方案")
+
+    feasible = [plan for plan in candidates if plan.within_budget]
+    if feasible:
+        return min(feasible, key=lambda plan: (round(plan.holdout_delta_e, 3), plan.predicted_seconds))
+    return min(candidates, key=lambda plan: (plan.predicted_seconds, plan.holdout_delta_e))
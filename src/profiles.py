@@ -0,0 +1,160 @@
+"""
+校准配置注册表
+按名称保存训练好的校正模型 (同一相机/光照条件只需校准一次)，
+并在内存中以 LRU 方式缓存已加载的模型
+"""
+
+import os
+import re
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from .color_corrector import ColorCorrector
+from .model_io import load_model, save_model
+
+
+# 默认注册表目录，可通过环境变量覆盖
+DEFAULT_PROFILE_DIR = os.environ.get(
+    'COLOR_CORRECT_PROFILE_DIR',
+    os.path.join(os.path.expanduser('~'), '.color_correction', 'profiles')
+)
+
+PROFILE_SUFFIX = '.ccm'
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$')
+
+
+class ProfileRegistry:
+    """校准配置注册表"""
+
+    def __init__(self, root: Optional[str] = None, cache_size: int = 8):
+        """
+        初始化注册表
+
+        Args:
+            root: 配置文件目录，默认 DEFAULT_PROFILE_DIR
+            cache_size: 内存中最多缓存的模型数量
+        """
+        self.root = Path(root or DEFAULT_PROFILE_DIR)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        """配置文件路径"""
+        if not _NAME_PATTERN.match(name):
+            raise ValueError(f"无效的配置名称: {name} (只允许字母、数字、'_'、'-'、'.')")
+        return self.root / f'{name}{PROFILE_SUFFIX}'
+
+    def exists(self, name: str) -> bool:
+        return self.path(name).exists()
+
+    def save(self, name: str, corrector: ColorCorrector, metadata: Optional[dict] = None) -> Path:
+        """
+        保存配置 (同名配置会被覆盖)
+
+        Args:
+            name: 配置名称
+            corrector: 已训练的校正器
+            metadata: 附加的元数据，例如校准图像路径、检测置信度
+
+        Returns:
+            配置文件路径
+        """
+        path = self.path(name)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        info = dict(metadata or {})
+        info.update({
+            'name': name,
+            'method': corrector.method,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        })
+
+        # 先写临时文件再原子替换，正在读取旧配置的进程不受影响
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.root)
+        os.close(fd)
+        try:
+            save_model(corrector, temp_path, info)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self._cache.pop(name, None)
+
+        return path
+
+    def load(self, name: str) -> ColorCorrector:
+        """
+        加载配置，命中内存缓存时不读磁盘
+
+        文件被修改 (重新保存) 后会自动重新加载
+        """
+        path = self.path(name)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            raise KeyError(f"配置不存在: {name}") from None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._cache.get(name)
+            if entry is not None and entry[0] == signature:
+                self._cache.move_to_end(name)
+                return entry[1]
+
+        corrector = load_model(str(path), mmap=True)
+
+        with self._lock:
+            self._cache[name] = (signature, corrector)
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return corrector
+
+    def delete(self, name: str):
+        """删除配置"""
+        with self._lock:
+            self._cache.pop(name, None)
+        try:
+            self.path(name).unlink()
+        except FileNotFoundError:
+            raise KeyError(f"配置不存在: {name}") from None
+
+    def list(self) -> List[dict]:
+        """列出所有配置的元数据"""
+        if not self.root.exists():
+            return []
+
+        profiles = []
+        for path in sorted(self.root.glob(f'*{PROFILE_SUFFIX}')):
+            name = path.name[:-len(PROFILE_SUFFIX)]
+            if not _NAME_PATTERN.match(name):
+                continue
+            try:
+                metadata = dict(self.load(name).metadata)
+            except (KeyError, ValueError, OSError):
+                continue
+            metadata.setdefault('name', name)
+            metadata['size'] = path.stat().st_size
+            profiles.append(metadata)
+
+        return profiles
+
+
+_default_registry = None
+
+
+def get_default_registry() -> ProfileRegistry:
+    """进程内共享的默认注册表"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ProfileRegistry()
+    return _default_registry
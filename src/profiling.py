@@ -0,0 +1,152 @@
+"""
+内存分析模块
+基于 tracemalloc 记录各处理阶段 (检测、训练、LAB 转换、模型求值、LAB→RGB) 的
+峰值内存分配和耗时，作为阶段钩子接收 metrics.timed() 标记的阶段
+"""
+
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, List
+
+from .hooks import StageHook, use_hooks
+
+
+@dataclass
+class StageMemory:
+    """单个阶段的统计"""
+    stage: str
+    calls: int = 0
+    seconds: float = 0.0
+    peak_bytes: int = 0
+
+
+class MemoryProfiler(StageHook):
+    """
+    阶段内存分析器
+
+    activate() 期间作为当前线程的阶段钩子跟踪每个阶段，
+    阶段峰值为执行期间相对阶段开始时新增的最大分配量 (嵌套阶段计入外层阶段)，
+    peak_bytes 为最近一次 activate() 期间的总峰值。
+    tracemalloc 是进程全局的，同一时间只应在一个线程中激活。
+    Python 3.8 没有 tracemalloc.reset_peak()，改为重新开始跟踪 (见 _reset_peak)。
+
+    Example:
+        profiler = MemoryProfiler()
+        with profiler.activate():
+            pipeline.process(calibration_image, target_image)
+        print(profiler.format_report())
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, StageMemory] = {}
+        self._stack: List[list] = []
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._thread = None
+        self._started_tracing = False
+        self._base = 0
+        self._overall = 0
+        self._offset = 0
+        self.peak_bytes = 0
+
+    def _traced(self):
+        """(当前分配量, 峰值)，包含重新开始跟踪之前的分配量"""
+        current, peak = tracemalloc.get_traced_memory()
+        return current + self._offset, peak + self._offset
+
+    def _reset_peak(self):
+        """
+        把峰值重置为当前分配量
+        Python 3.8 没有 tracemalloc.reset_peak()，此时停止并重新开始跟踪，之前的分配量计入偏移；
+        重新开始后释放的旧内存不再扣除，峰值可能略偏高
+        """
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+            return
+        current = self._traced()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        self._offset = current
+
+    @contextmanager
+    def activate(self):
+        """开启分析 (可嵌套，最外层退出时停止)"""
+        with self._lock:
+            if self._depth == 0:
+                self._started_tracing = not tracemalloc.is_tracing()
+                if self._started_tracing:
+                    tracemalloc.start()
+                self._thread = threading.get_ident()
+                self._offset = 0
+                self._reset_peak()
+                self._base = self._overall = self._traced()[0]
+            self._depth += 1
+
+        try:
+            with use_hooks(self):
+                yield self
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.peak_bytes = max(self._overall, self._traced()[1]) - self._base
+                    self._stack.clear()
+                    self._thread = None
+                    if self._started_tracing:
+                        tracemalloc.stop()
+
+    @property
+    def active(self) -> bool:
+        return self._depth > 0
+
+    def stage_started(self, stage: str, context: dict):
+        if threading.get_ident() != self._thread or not tracemalloc.is_tracing():
+            return
+
+        current, peak = self._traced()
+        self._overall = max(self._overall, peak)
+        if self._stack:
+            # 保存外层阶段到目前为止的峰值，再为内层阶段重置
+            self._stack[-1][2] = max(self._stack[-1][2], peak)
+        self._reset_peak()
+        self._stack.append([stage, current, current])
+
+    def stage_finished(self, stage: str, seconds: float, context: dict):
+        if threading.get_ident() != self._thread or not self._stack or self._stack[-1][0] != stage:
+            return
+
+        _, start, previous_peak = self._stack.pop()
+        peak = max(previous_peak, self._traced()[1]) if tracemalloc.is_tracing() else previous_peak
+        self._overall = max(self._overall, peak)
+        if self._stack:
+            self._stack[-1][2] = max(self._stack[-1][2], peak)
+
+        record = self._stages.setdefault(stage, StageMemory(stage))
+        record.calls += 1
+        record.seconds += seconds
+        record.peak_bytes = max(record.peak_bytes, peak - start)
+
+    def reset(self):
+        """清空统计"""
+        self._stages.clear()
+        self.peak_bytes = 0
+
+    def report(self) -> Dict[str, dict]:
+        """
+        各阶段统计
+
+        Returns:
+            {阶段: {'calls', 'seconds', 'peak_bytes'}}，按阶段首次出现的顺序
+        """
+        return {name: {k: v for k, v in asdict(record).items() if k != 'stage'}
+                for name, record in self._stages.items()}
+
+    def format_report(self) -> str:
+        """格式化为文本表格"""
+        lines = [f"{'阶段':<12} {'次数':>6} {'耗时 (ms)':>12} {'峰值内存 (MB)':>14}"]
+        for record in self._stages.values():
+            lines.append(f"{record.stage:<14} {record.calls:>6} {record.seconds * 1000:>12.2f} "
+                         f"{record.peak_bytes / 1024 ** 2:>14.2f}")
+        return '\n'.join(lines)
@@ -0,0 +1,236 @@
+"""
+分阶段处理管道
+将批量处理拆分为 解码 → 校正 → 编码 三个阶段，阶段之间用有界队列连接，
+各阶段在独立线程中并行执行 (OpenCV 和 NumPy 运算会释放 GIL)，
+总吞吐量接近最慢的阶段而不是三者之和
+"""
+
+import time
+import queue
+import threading
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .metrics import timed
+from .pipeline import ColorCorrectionPipeline
+from .lazy import LazyModule
+
+cv2 = LazyModule('cv2')
+
+
+STAGES = ('decode', 'correct', 'encode')
+
+# 阶段结束标记
+_DONE = object()
+
+
+def read_image(source) -> np.ndarray:
+    """默认解码器：从文件读取 RGB 图像"""
+    image = cv2.imread(str(source))
+    if image is None:
+        raise FileNotFoundError(f"无法加载图像: {source}")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def write_image(image: np.ndarray, destination) -> str:
+    """默认编码器：将 RGB 图像写入文件"""
+    if not cv2.imwrite(str(destination), cv2.cvtColor(image, cv2.COLOR_RGB2BGR)):
+        raise IOError(f"无法保存图像: {destination}")
+    return str(destination)
+
+
+@dataclass
+class StagedItem:
+    """在各阶段之间传递的任务"""
+    index: int
+    source: Any
+    destination: Any
+    image: Optional[np.ndarray] = None
+    result: Any = None
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+class StagedPipeline:
+    """分阶段并行的批量校正管道"""
+
+    def __init__(self, pipeline: ColorCorrectionPipeline,
+                 decode_workers: int = 1, correct_workers: int = 1, encode_workers: int = 1,
+                 queue_size: int = 4,
+                 decoder: Callable[[Any], np.ndarray] = read_image,
+                 encoder: Callable[[np.ndarray, Any], Any] = write_image):
+        """
+        初始化分阶段管道
+
+        Args:
+            pipeline: 已校准的处理管道
+            decode_workers: 解码线程数
+            correct_workers: 校正线程数
+            encode_workers: 编码线程数
+            queue_size: 阶段之间队列的容量，限制同时驻留内存的图像数量
+            decoder: decoder(source) -> RGB 图像
+            encoder: encoder(image, destination) -> 结果 (保存在 StagedItem.result)
+        """
+        if not pipeline.is_trained:
+            raise ValueError("管道未校准，请先调用 calibrate() 方法")
+        if min(decode_workers, correct_workers, encode_workers, queue_size) < 1:
+            raise ValueError("线程数和队列容量至少为 1")
+
+        self.pipeline = pipeline
+        self.workers = {'decode': decode_workers, 'correct': correct_workers, 'encode': encode_workers}
+        self.queue_size = queue_size
+        self.decoder = decoder
+        self.encoder = encoder
+
+        # 最近一次运行的统计：各阶段累计耗时、总耗时、处理数量
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.elapsed = 0.0
+        self.processed = 0
+        self._stats_lock = threading.Lock()
+
+    def _apply(self, stage: str, item: StagedItem):
+        """执行单个阶段，异常记录在任务上，后续阶段跳过"""
+        if item.error is not None:
+            return
+
+        start = time.perf_counter()
+        try:
+            if stage == 'decode':
+                with timed('decode'):
+                    item.image = self.decoder(item.source)
+            elif stage == 'correct':
+                item.image = self.pipeline.correct_image(item.image)
+            else:
+                with timed('encode'):
+                    item.result = self.encoder(item.image, item.destination)
+                item.image = None
+        except Exception as e:
+            item.error = str(e)
+            item.image = None
+
+        seconds = time.perf_counter() - start
+        item.timings[stage] = seconds
+        with self._stats_lock:
+            self.stage_seconds[stage] += seconds
+
+    def run(self, items: Iterable[Tuple[Any, Any]], ordered: bool = True) -> Iterator[StagedItem]:
+        """
+        处理任务并逐个返回结果
+
+        Args:
+            items: (source, destination) 序列，source 传给解码器，destination 传给编码器
+            ordered: 是否按输入顺序返回；为 False 时按完成顺序返回
+
+        Yields:
+            StagedItem (失败的任务 error 不为空)
+        """
+        stop = threading.Event()
+        feed_error = []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(STAGES) + 1)]
+        # 限制已提交但尚未返回的任务数量，乱序完成时重排缓冲区也不会无限增长
+        in_flight = threading.Semaphore(self.queue_size * (len(STAGES) + 1) + sum(self.workers.values()))
+
+        def put(q, value):
+            while not stop.is_set():
+                try:
+                    q.put(value, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def feed():
+            try:
+                for index, (source, destination) in enumerate(items):
+                    while not in_flight.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    if not put(queues[0], StagedItem(index, source, destination)):
+                        return
+            except BaseException as e:
+                feed_error.append(e)
+            finally:
+                for _ in range(self.workers['decode']):
+                    put(queues[0], _DONE)
+
+        def work(position, stage, remaining):
+            inbox, outbox = queues[position], queues[position + 1]
+            while not stop.is_set():
+                try:
+                    item = inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                self._apply(stage, item)
+                if not put(outbox, item):
+                    return
+
+            # 本阶段最后一个退出的线程通知下一阶段结束
+            with remaining[1]:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                following = self.workers[STAGES[position + 1]] if position + 1 < len(STAGES) else 1
+                for _ in range(following):
+                    put(outbox, _DONE)
+
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.processed = 0
+        start = time.perf_counter()
+
+        threads = [threading.Thread(target=feed, name='staged-feed', daemon=True)]
+        for position, stage in enumerate(STAGES):
+            remaining = [self.workers[stage], threading.Lock()]
+            for n in range(self.workers[stage]):
+                threads.append(threading.Thread(target=work, args=(position, stage, remaining),
+                                                name=f'staged-{stage}-{n}', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        next_index = 0
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    if feed_error:
+                        raise feed_error[0]
+                    break
+                if not ordered:
+                    self.processed += 1
+                    in_flight.release()
+                    yield item
+                    continue
+
+                pending[item.index] = item
+                while next_index in pending:
+                    self.processed += 1
+                    in_flight.release()
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            # 调用方提前结束迭代时通知所有线程退出
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.perf_counter() - start
+
+    def process(self, items: Iterable[Tuple[Any, Any]]) -> List[StagedItem]:
+        """处理全部任务，按输入顺序返回结果列表"""
+        return list(self.run(items))
+
+    @property
+    def throughput(self) -> float:
+        """最近一次运行的吞吐量 (张/秒)"""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bottleneck(self) -> str:
+        """最近一次运行中平均耗时 (按线程数折算) 最长的阶段"""
+        return max(STAGES, key=lambda stage: self.stage_seconds[stage] / self.workers[stage])
@@ -0,0 +1,190 @@
+"""
+原始视频帧流处理
+从二进制流 (例如 ffmpeg 的 rawvideo rgb24 输出) 读取定长帧，校正后写回，
+读取和写入在独立线程中进行，与校正重叠 (双缓冲)
+"""
+
+import sys
+import time
+import queue
+import threading
+import numpy as np
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Tuple
+
+from .pipeline import ColorCorrectionPipeline
+
+
+# 流结束标记
+_EOF = object()
+
+
+def parse_frame_size(value: str) -> Tuple[int, int]:
+    """解析 'WxH' 格式的帧尺寸"""
+    try:
+        width, height = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"无效的帧尺寸: {value} (格式: 宽x高，例如 1920x1080)") from None
+    if width <= 0 or height <= 0:
+        raise ValueError(f"无效的帧尺寸: {value}")
+    return width, height
+
+
+def read_exact(stream: BinaryIO, buffer: memoryview) -> int:
+    """读满缓冲区，返回实际读取的字节数 (流结束时可能不足)"""
+    filled = 0
+    while filled < len(buffer):
+        count = stream.readinto(buffer[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+@dataclass
+class StreamStats:
+    """流处理统计"""
+    frames: int = 0
+    corrected: int = 0
+    calibrations: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class FrameStreamer:
+    """原始帧流校正器"""
+
+    def __init__(self, pipeline: ColorCorrectionPipeline, width: int, height: int,
+                 recalibrate_interval: int = 0, smoothing: float = 0.0, buffers: int = 2,
+                 report_interval: float = 2.0, log: Optional[BinaryIO] = None):
+        """
+        初始化
+
+        Args:
+            pipeline: 处理管道；未校准时需要设置 recalibrate_interval
+            width: 帧宽度
+            height: 帧高度
+            recalibrate_interval: 每隔多少帧尝试用当前帧重新校准，0 表示不重新校准
+            smoothing: 重新校准时之前模型所占的权重 [0, 1)，见 ColorCorrectionPipeline.correct_stream
+            buffers: 读取和写入各自的缓冲帧数 (2 即双缓冲)
+            report_interval: 向 log 输出帧率的间隔秒数，0 表示不输出
+            log: 进度输出流，默认 sys.stderr (stdout 用于输出帧)
+        """
+        if recalibrate_interval < 0:
+            raise ValueError("重新校准间隔不能为负数")
+        if not pipeline.is_trained and not recalibrate_interval:
+            raise ValueError("管道未校准，请使用校准配置或设置重新校准间隔")
+
+        self.pipeline = pipeline
+        self.shape = (height, width, 3)
+        self.frame_bytes = width * height * 3
+        self.recalibrate_interval = recalibrate_interval
+        self.smoothing = smoothing
+        self.buffers = max(1, buffers)
+        self.report_interval = report_interval
+        self.log = log or sys.stderr
+
+    def _read_frames(self, stream: BinaryIO, free: queue.Queue, frames: queue.Queue, errors: list):
+        """读取线程：把帧读入空闲缓冲区"""
+        try:
+            while True:
+                buffer = free.get()
+                if buffer is _EOF:
+                    break
+                count = read_exact(stream, memoryview(buffer).cast('B'))
+                if count < self.frame_bytes:
+                    if count:
+                        print(f"警告: 丢弃不完整的最后一帧 ({count}/{self.frame_bytes} 字节)", file=self.log)
+                    break
+                frames.put(buffer)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            frames.put(_EOF)
+
+    def _write_frames(self, stream: BinaryIO, pending: queue.Queue, errors: list):
+        """写入线程：按顺序写出校正后的帧"""
+        try:
+            while True:
+                frame = pending.get()
+                if frame is _EOF:
+                    break
+                stream.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+            stream.flush()
+        except BaseException as e:
+            errors.append(e)
+            # 下游关闭 (例如 ffmpeg 退出) 后继续消费队列，避免主线程阻塞
+            while pending.get() is not _EOF:
+                pass
+
+    def run(self, instream: BinaryIO, outstream: BinaryIO) -> StreamStats:
+        """
+        处理整个流直到输入结束
+
+        Returns:
+            StreamStats
+        """
+        # 读取线程 1 帧 + 队列中 buffers 帧 + 正在校正的 1 帧
+        free = queue.Queue()
+        for _ in range(self.buffers + 2):
+            free.put(np.empty(self.shape, dtype=np.uint8))
+        frames = queue.Queue(maxsize=self.buffers)
+        pending = queue.Queue(maxsize=self.buffers)
+        errors = []
+
+        reader = threading.Thread(target=self._read_frames, args=(instream, free, frames, errors),
+                                  name='stream-reader', daemon=True)
+        writer = threading.Thread(target=self._write_frames, args=(outstream, pending, errors),
+                                  name='stream-writer', daemon=True)
+        reader.start()
+        writer.start()
+
+        def incoming():
+            # correct_stream 处理完一帧才会请求下一帧，此时上一帧的缓冲区可以交还读取线程
+            previous = None
+            while not errors:
+                frame = frames.get()
+                if previous is not None:
+                    free.put(previous)
+                if frame is _EOF:
+                    return
+                previous = frame
+                yield frame
+
+        counts = {}
+        stats = StreamStats()
+        start = last_report = time.perf_counter()
+        try:
+            # 输出缓冲区：写入队列 buffers 帧 + 正在写出的 1 帧 + 正在校正的 1 帧
+            for output in self.pipeline.correct_stream(incoming(), self.recalibrate_interval,
+                                                       self.smoothing, buffers=self.buffers + 2,
+                                                       stats=counts):
+                pending.put(output)
+
+                now = time.perf_counter()
+                if self.report_interval and now - last_report >= self.report_interval:
+                    print(f"已处理 {counts['frames']} 帧，{counts['frames'] / (now - start):.1f} fps",
+                          file=self.log)
+                    last_report = now
+        finally:
+            free.put(_EOF)
+            pending.put(_EOF)
+            writer.join()
+            # 读取线程可能阻塞在 frames.put，清空队列让其退出；
+            # 出错时读取线程可能阻塞在输入流上，不再等待 (守护线程)
+            while not errors and reader.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            stats.elapsed = time.perf_counter() - start
+            stats.frames = counts.get('frames', 0)
+            stats.corrected = counts.get('corrected', 0)
+            stats.calibrations = counts.get('calibrations', 0)
+
+        if errors:
+            raise errors[0]
+        return stats
@@ -0,0 +1,236 @@
+"""
+合成测试图像生成模块
+由随机种子确定性地生成 ColorChecker 色卡图像和普通场景图像，
+可控制分辨率、透视、旋转、噪声和光源色偏，用于离线复现检测/校正的性能和精度测试
+"""
+
+import cv2
+import numpy as np
+from typing import Tuple
+
+from .color_checker_detector import ColorCheckerDetector
+
+
+# 常见光源相对 D65 的通道增益 (线性 RGB)
+ILLUMINANTS = {
+    'd65': (1.0, 1.0, 1.0),
+    'tungsten': (1.18, 1.0, 0.74),
+    'fluorescent': (0.94, 1.06, 0.9),
+    'shade': (0.88, 0.97, 1.14),
+    'sunset': (1.25, 0.95, 0.7),
+}
+
+# 标准色卡的网格 (列, 行)
+GRID = (6, 4)
+
+
+def image_size(megapixels: float, aspect: float = 4 / 3) -> Tuple[int, int]:
+    """
+    计算指定像素数的图像尺寸
+
+    Returns:
+        (宽, 高)
+    """
+    width = int(round((megapixels * 1e6 * aspect) ** 0.5))
+    height = int(round(width / aspect))
+    return max(width, 8), max(height, 8)
+
+
+def illuminant_gains(illuminant='d65') -> np.ndarray:
+    """光源名称或 (r, g, b) 增益转换为增益数组"""
+    if isinstance(illuminant, str):
+        if illuminant not in ILLUMINANTS:
+            raise ValueError(f"未知的光源: {illuminant} (可选: {', '.join(ILLUMINANTS)})")
+        illuminant = ILLUMINANTS[illuminant]
+    gains = np.asarray(illuminant, dtype=np.float32)
+    if gains.shape != (3,):
+        raise ValueError("光源增益必须是 3 个通道的数值")
+    return gains
+
+
+def apply_illuminant(image: np.ndarray, illuminant='d65') -> np.ndarray:
+    """
+    在线性光空间中施加光源色偏
+
+    Args:
+        image: RGB 图像 (..., 3) uint8
+        illuminant: 光源名称或 (r, g, b) 增益
+    """
+    gains = illuminant_gains(illuminant)
+    if np.allclose(gains, 1.0):
+        return image.copy()
+
+    # 按 256 级查找表逐通道处理，大图像无需浮点中间结果
+    levels = np.arange(256, dtype=np.float32) / 255.0
+    output = np.empty_like(image)
+    for channel in range(3):
+        table = np.clip(levels ** 2.2 * gains[channel], 0, 1) ** (1 / 2.2) * 255.0
+        output[..., channel] = np.round(table).astype(np.uint8)[image[..., channel]]
+    return output
+
+
+def expected_patch_colors(illuminant='d65') -> np.ndarray:
+    """在指定光源下色卡各色块应呈现的颜色 (不含噪声)，即检测结果的真值"""
+    return apply_illuminant(ColorCheckerDetector.STANDARD_COLORS.reshape(1, -1, 3), illuminant).reshape(-1, 3)
+
+
+def _add_noise(image: np.ndarray, sigma: float, rng: np.random.Generator) -> np.ndarray:
+    """叠加高斯噪声 (按行分块，避免为大图像分配整幅浮点数组)"""
+    if sigma <= 0:
+        return image
+    rows = max(1, (1 << 22) // (image.shape[1] * 3))
+    for y in range(0, image.shape[0], rows):
+        block = image[y:y + rows]
+        noise = rng.standard_normal(block.shape, dtype=np.float32) * sigma
+        image[y:y + rows] = np.clip(block + noise, 0, 255).astype(np.uint8)
+    return image
+
+
+def render_background(width: int, height: int, seed: int = 0, style: str = 'gradient') -> np.ndarray:
+    """
+    生成背景
+
+    Args:
+        style: 'flat' 纯色、'gradient' 渐变、'texture' 棋盘纹理
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(120, 210, 3).astype(np.float32)
+
+    if style == 'flat':
+        return np.broadcast_to(base.astype(np.uint8), (height, width, 3)).copy()
+
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    if style == 'gradient':
+        slope_x, slope_y = rng.uniform(-40, 40, (2, 3)).astype(np.float32)
+        x = np.linspace(-0.5, 0.5, width, dtype=np.float32)
+        y = np.linspace(-0.5, 0.5, height, dtype=np.float32)[:, None]
+        for channel in range(3):
+            image[..., channel] = np.clip(base[channel] + slope_x[channel] * x + slope_y[channel] * y, 0, 255)
+    elif style == 'texture':
+        cell = max(min(width, height) // 30, 2)
+        ys = (np.arange(height) // cell)[:, None]
+        xs = np.arange(width) // cell
+        shade = np.where((ys + xs) % 2 == 0, 0.95, 1.0).astype(np.float32)
+        for channel in range(3):
+            image[..., channel] = np.clip(base[channel] * shade, 0, 255)
+    else:
+        raise ValueError(f"未知的背景样式: {style}")
+
+    return image
+
+
+def chart_corners(width: int, height: int, seed: int = 0, scale: float = 0.6,
+                  rotation: float = 0.0, perspective: float = 0.0) -> np.ndarray:
+    """
+    计算色卡四个角点在图像中的位置
+
+    Args:
+        scale: 色卡宽度占图像宽度的比例 (同时受图像高度限制)
+        rotation: 旋转角度 (度)
+        perspective: 透视扰动幅度，角点随机偏移色卡尺寸的该比例
+
+    Returns:
+        角点 (4, 2) float32，顺序为 左上、右上、右下、左下
+    """
+    rng = np.random.default_rng(seed)
+    aspect = GRID[0] / GRID[1]
+    chart_w = min(width * scale, height * scale * aspect)
+    chart_h = chart_w / aspect
+
+    corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float32) * [chart_w / 2, chart_h / 2]
+    if perspective:
+        corners += rng.uniform(-perspective, perspective, (4, 2)).astype(np.float32) * [chart_w, chart_h]
+
+    theta = np.deg2rad(rotation)
+    rotate = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]], dtype=np.float32)
+    return (corners @ rotate.T + [width / 2, height / 2]).astype(np.float32)
+
+
+def render_chart(width: int = 800, height: int = 600, seed: int = 0, scale: float = 0.6,
+                 rotation: float = 0.0, perspective: float = 0.0, noise: float = 0.0,
+                 illuminant='d65', background: str = 'gradient', border: float = 0.06) -> np.ndarray:
+    """
+    生成包含 ColorChecker 色卡的图像 (相同参数总是生成相同图像)
+
+    Args:
+        width: 图像宽度
+        height: 图像高度
+        seed: 随机种子 (决定背景和透视扰动)
+        scale: 色卡宽度占图像宽度的比例
+        rotation: 旋转角度 (度)
+        perspective: 透视扰动幅度 [0, 0.2]
+        noise: 高斯噪声标准差 (8 位灰度单位)
+        illuminant: 光源名称 (见 ILLUMINANTS) 或 (r, g, b) 线性增益
+        background: 背景样式 'flat' / 'gradient' / 'texture'
+        border: 色卡外框宽度占色块边长的比例
+
+    Returns:
+        RGB 图像 (height, width, 3) uint8
+    """
+    image = render_background(width, height, seed, background)
+
+    # 标准姿态下的色卡：深色外框 + 6x4 色块
+    patch = 64
+    frame = max(int(round(patch * border)), 1)
+    canonical = np.full((GRID[1] * patch + 2 * frame, GRID[0] * patch + 2 * frame, 3), 30, dtype=np.uint8)
+    for index, color in enumerate(ColorCheckerDetector.STANDARD_COLORS):
+        row, col = divmod(index, GRID[0])
+        canonical[frame + row * patch:frame + (row + 1) * patch,
+                  frame + col * patch:frame + (col + 1) * patch] = color
+
+    # 角点对应色块网格的外缘，外框随同一透视变换落在角点之外
+    corners = chart_corners(width, height, seed, scale, rotation, perspective)
+    grid = np.array([[frame, frame], [frame + GRID[0] * patch, frame],
+                     [frame + GRID[0] * patch, frame + GRID[1] * patch], [frame, frame + GRID[1] * patch]],
+                    dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(grid, corners)
+
+    cv2.warpPerspective(canonical, matrix, (width, height), dst=image,
+                        flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_TRANSPARENT)
+
+    image = apply_illuminant(image, illuminant)
+    return _add_noise(image, noise, np.random.default_rng(seed + 1))
+
+
+def render_scene(width: int = 600, height: int = 400, seed: int = 0, shapes: int = 12,
+                 noise: float = 0.0, illuminant='d65', background: str = 'gradient') -> np.ndarray:
+    """
+    生成不含色卡的场景图像 (随机色块和圆形)，作为校正目标
+
+    Args:
+        shapes: 图形数量
+        其余参数同 render_chart
+
+    Returns:
+        RGB 图像 (height, width, 3) uint8
+    """
+    rng = np.random.default_rng(seed)
+    image = render_background(width, height, seed, background)
+    size = min(width, height)
+
+    for _ in range(shapes):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cx, cy = int(rng.integers(0, width)), int(rng.integers(0, height))
+        extent = int(rng.integers(max(size // 12, 1), max(size // 4, 2)))
+        if rng.random() < 0.5:
+            cv2.rectangle(image, (cx - extent, cy - extent // 2), (cx + extent, cy + extent // 2), color, -1)
+        else:
+            cv2.circle(image, (cx, cy), extent // 2 + 1, color, -1)
+
+    image = apply_illuminant(image, illuminant)
+    return _add_noise(image, noise, np.random.default_rng(seed + 1))
+
+
+def render_pair(megapixels: float = 0.48, seed: int = 0, illuminant='tungsten',
+                noise: float = 2.0, **chart_options) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    生成同一光源下的 (校准图像, 目标图像)
+
+    Args:
+        megapixels: 两幅图像的像素数 (百万)
+        chart_options: 传给 render_chart 的其他参数
+    """
+    width, height = image_size(megapixels)
+    calibration = render_chart(width, height, seed, noise=noise, illuminant=illuminant, **chart_options)
+    target = render_scene(width, height, seed + 100, noise=noise, illuminant=illuminant)
+    return calibration, target
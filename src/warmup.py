@@ -0,0 +1,121 @@
+"""
+服务预热模块
+在开始接受请求前导入依赖、触发编解码和颜色转换的首次调用开销、加载已注册的校准配置，
+并对每种校正方法执行一次小规模的训练和校正，第一个请求不必再承担这些一次性开销
+"""
+
+import sys
+import time
+import importlib
+import numpy as np
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from .color_space import ColorSpace
+from .color_checker_detector import ColorCheckerDetector
+from .color_corrector import ColorCorrector, METHODS
+
+
+# 预热时导入的依赖 (延迟导入的模块在这里提前加载)
+MODULES = ('cv2', 'sklearn.preprocessing', 'sklearn.linear_model')
+
+
+@dataclass
+class WarmupReport:
+    """预热结果"""
+    seconds: float = 0.0
+    steps: Dict[str, float] = field(default_factory=dict)
+    profiles: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    finished_at: Optional[float] = None
+
+    @property
+    def success(self) -> bool:
+        return not self.errors
+
+    def to_dict(self) -> dict:
+        result = asdict(self)
+        result['success'] = self.success
+        return result
+
+
+def _warm_conversions():
+    """颜色空间转换、OpenCV 编解码和 LUT 烘焙的首次调用"""
+    import cv2
+    from .model_io import bake_lut, format_cube
+
+    ramp = np.linspace(0, 255, 8 * 8 * 3).astype(np.uint8).reshape(8, 8, 3)
+    ColorSpace.lab_to_rgb(ColorSpace.rgb_to_lab(ramp))
+
+    bgr = cv2.cvtColor(ramp, cv2.COLOR_RGB2BGR)
+    for extension in ('.jpg', '.png', '.webp'):
+        ok, buffer = cv2.imencode(extension, bgr)
+        if ok:
+            cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    corrector = ColorCorrector(method='direct_mapping')
+    colors = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+    corrector.train(colors, colors)
+    format_cube(bake_lut(corrector, size=2))
+
+
+def _warm_detector():
+    """在小尺寸合成色卡上执行一次检测"""
+    from .synthetic import render_chart
+    ColorCheckerDetector().detect(render_chart(160, 120))
+
+
+def _warm_method(method: str):
+    """训练并校正一次小图像"""
+    from .synthetic import expected_patch_colors
+
+    corrector = ColorCorrector(method=method)
+    corrector.train(ColorCheckerDetector.STANDARD_COLORS.astype(np.float32),
+                    expected_patch_colors('tungsten').astype(np.float32))
+    corrector.correct(np.full((8, 8, 3), 128, dtype=np.uint8))
+
+
+def warm_up(registry=None, methods=METHODS, log=None) -> WarmupReport:
+    """
+    执行预热，单个步骤失败只记录错误，不影响其余步骤
+
+    Args:
+        registry: 校准配置注册表 (ProfileRegistry)，为 None 时不加载配置
+        methods: 需要预热的校正方法
+        log: 进度输出流 (默认 stderr)
+
+    Returns:
+        WarmupReport，steps 为各步骤耗时 (秒)
+    """
+    log = log or sys.stderr
+    report = WarmupReport()
+    start = time.perf_counter()
+
+    def step(name, func, *args):
+        step_start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            report.errors.append(f"{name}: {e}")
+            print(f"  ✗ 预热 {name} 失败: {e}", file=log)
+        report.steps[name] = time.perf_counter() - step_start
+
+    step('imports', lambda: [importlib.import_module(name) for name in MODULES])
+    step('conversions', _warm_conversions)
+    step('detector', _warm_detector)
+    for method in methods:
+        step(f'method.{method}', _warm_method, method)
+
+    if registry is not None:
+        def load_profiles():
+            # list() 会加载每个配置并放入注册表的缓存
+            for metadata in registry.list():
+                corrector = registry.load(metadata['name'])
+                corrector.correct(np.full((8, 8, 3), 128, dtype=np.uint8))
+                report.profiles.append(metadata['name'])
+        step('profiles', load_profiles)
+
+    report.seconds = time.perf_counter() - start
+    report.finished_at = time.time()
+    print(f"✓ 预热完成，耗时 {report.seconds:.2f} 秒 (配置 {len(report.profiles)} 个)", file=log)
+    return report
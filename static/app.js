@@ -200,18 +200,25 @@ async function correctImage() {
         const response = await fetch('/api/correct', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({method: state.method})
+            body: JSON.stringify({method: state.method, progressive: true})
         });
 
-        const data = await response.json();
+        let data = await response.json();
 
-        if (data.success) {
+        if (data.success && data.status === 'running') {
+            // 先显示预览图，再等待全分辨率结果
+            displayResult(data);
+            showProgress('预览已生成，全分辨率校正中...');
+            data = await waitForJob(data.job_id);
+        }
+
+        if (data.success && (data.status === undefined || data.status === 'done')) {
             state.hasResult = true;
             displayResult(data);
             updateUI();
             updateStatus('✓ 校正完成');
         } else {
-            updateStatus('✗ 校正失败: ' + data.error);
+            updateStatus('✗ 校正失败: ' + (data.error || '任务已被新的校正取代'));
         }
     } catch (error) {
         updateStatus('✗ 校正错误: ' + error.message);
@@ -220,6 +227,20 @@ async function correctImage() {
     }
 }
 
+/**
+ * 轮询渐进式校正任务，直到全分辨率结果完成或失败
+ */
+async function waitForJob(jobId) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 300));
+        const response = await fetch('/api/jobs/' + jobId);
+        const data = await response.json();
+        if (!data.success || data.status !== 'running') {
+            return data;
+        }
+    }
+}
+
 /**
  * 显示结果
  */
@@ -12,52 +12,24 @@ import numpy as np
 from io import BytesIO
 from PIL import Image
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.synthetic import render_chart, render_scene
+
 # 测试配置
 API_BASE = 'http://localhost:5000'
 TIMEOUT = 30
 
-def create_test_image(width=800, height=600, color_type='calibration'):
-    """创建测试图像"""
+def create_test_image(width=800, height=600, color_type='calibration', seed=0):
+    """创建测试图像 (BGR，供 cv2.imencode 编码)"""
     if color_type == 'calibration':
-        # 创建包含色块的校准图像
-        image = np.ones((height, width, 3), dtype=np.uint8) * 200
-        
-        # 添加 ColorChecker 模拟色块
-        colors = [
-            (255, 0, 0),      # 红
-            (0, 255, 0),      # 绿
-            (0, 0, 255),      # 蓝
-            (255, 255, 0),    # 黄
-            (255, 0, 255),    # 洋红
-            (0, 255, 255),    # 青
-        ]
-        
-        block_size = 100
-        for i, color in enumerate(colors):
-            x = (i % 3) * block_size + 50
-            y = (i // 3) * block_size + 50
-            image[y:y+block_size, x:x+block_size] = color
+        # 钨丝灯色偏下拍摄的色卡
+        image = render_chart(width, height, seed=seed, noise=2, illuminant='tungsten')
     else:
-        # 创建目标图像（模拟色差）
-        image = np.ones((height, width, 3), dtype=np.uint8) * 180
-        
-        # 添加色差的色块
-        colors = [
-            (255, 100, 100),  # 红（偏绿）
-            (100, 255, 100),  # 绿（偏红）
-            (100, 100, 255),  # 蓝（正常）
-            (255, 255, 100),  # 黄（偏蓝）
-            (255, 100, 255),  # 洋红（偏绿）
-            (100, 255, 255),  # 青（偏红）
-        ]
-        
-        block_size = 100
-        for i, color in enumerate(colors):
-            x = (i % 3) * block_size + 50
-            y = (i // 3) * block_size + 50
-            image[y:y+block_size, x:x+block_size] = color
+        # 同一光源下的目标场景
+        image = render_scene(width, height, seed=seed + 1, noise=2, illuminant='tungsten')
     
-    return image
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
 
 def image_to_bytes(image):
     """将 numpy 数组转换为字节"""
@@ -276,10 +248,43 @@ def test_download_image():
         print(f"✗ 下载异常: {e}")
         return False
 
+def test_batch_correct():
+    """测试批量校正"""
+    print("\n" + "="*60)
+    print("测试 8: 批量校正")
+    print("="*60)
+    
+    try:
+        files = [
+            ('files', (f'target_{i}.jpg', image_to_bytes(create_test_image(color_type='target')), 'image/jpeg'))
+            for i in range(3)
+        ]
+        
+        response = requests.post(
+            f'{API_BASE}/api/batch',
+            files=files,
+            data={'method': 'polynomial'},
+            timeout=TIMEOUT
+        )
+        
+        if response.status_code == 200:
+            import zipfile
+            archive = zipfile.ZipFile(BytesIO(response.content))
+            summary = json.loads(archive.read('summary.json'))
+            print("✓ 批量校正成功")
+            print(f"  - 成功: {summary['succeeded']}/{summary['total']}")
+            return summary['succeeded'] == summary['total']
+        else:
+            print(f"✗ 批量校正失败: {response.status_code}")
+            return False
+    except Exception as e:
+        print(f"✗ 批量校正异常: {e}")
+        return False
+
 def test_reset_session():
     """测试重置会话"""
     print("\n" + "="*60)
-    print("测试 8: 重置会话")
+    print("测试 9: 重置会话")
     print("="*60)
     
     try:
@@ -320,6 +325,7 @@ def run_all_tests():
     results.append(("颜色校正", test_correct_image('polynomial')))
     results.append(("生成对比图像", test_compare_images()))
     results.append(("下载图像", test_download_image()))
+    results.append(("批量校正", test_batch_correct()))
     results.append(("重置会话", test_reset_session()))
     
     # 打印总结
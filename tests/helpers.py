@@ -0,0 +1,21 @@
+"""
+测试共用的辅助函数
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_checker_detector import ColorCheckerDetector
+from src.color_corrector import ColorCorrector
+
+
+def train_corrector(method, gain=(1.1, 0.9, 0.95)):
+    """用模拟色偏 (按通道增益加固定偏移) 的色卡颜色训练校正器"""
+    reference = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+    captured = np.clip(reference * np.asarray(gain, dtype=np.float32) + 5, 0, 255)
+    corrector = ColorCorrector(method=method)
+    corrector.train(reference, captured)
+    return corrector
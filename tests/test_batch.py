@@ -0,0 +1,144 @@
+"""
+批量处理测试
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.batch import Manifest, expand_inputs, plan_outputs, run_batch
+from helpers import train_corrector
+
+
+def write_images(directory, count):
+    """写入随机测试图像，返回 RGB 图像列表"""
+    np.random.seed(0)
+    images = []
+    for i in range(count):
+        image = np.random.randint(0, 256, (16, 16, 3), dtype=np.uint8)
+        cv2.imwrite(os.path.join(directory, f'img{i}.png'), cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        images.append(image)
+    return images
+
+
+def test_expand_inputs():
+    """测试目录和通配符展开"""
+    print("测试输入展开...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_images(tmp, 3)
+        Path(tmp, 'notes.txt').write_text('x')
+
+        from_dir = expand_inputs([tmp])
+        assert [p.name for p in from_dir] == ['img0.png', 'img1.png', 'img2.png']
+
+        # 重复的输入只保留一次，顺序不变
+        mixed = expand_inputs([os.path.join(tmp, 'img2.png'), os.path.join(tmp, '*.png')])
+        assert [p.name for p in mixed] == ['img2.png', 'img0.png', 'img1.png']
+
+        outputs = plan_outputs([Path('a/x.png'), Path('b/x.png')], Path('out'))
+        assert outputs == [Path('out/x_corrected.png'), Path('out/x_corrected_1.png')]
+
+    print("✓ 输入展开测试通过\n")
+
+
+def test_run_batch():
+    """测试多进程批量校正结果与单张校正一致"""
+    print("测试多进程批量校正...")
+
+    corrector = train_corrector('polynomial')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = write_images(tmp, 4)
+        model_path = os.path.join(tmp, 'model.ccm')
+        corrector.save(model_path)
+
+        inputs = expand_inputs([tmp]) + [Path(tmp, 'missing.png')]
+        outputs = plan_outputs(inputs, Path(tmp, 'out'))
+
+        order = []
+        result = run_batch(model_path, inputs, outputs, jobs=2,
+                           on_result=lambda index, item: order.append(index))
+
+        assert order == list(range(len(inputs)))
+        assert result.succeeded == 4 and result.failed == 1
+        assert result.items[-1].error
+        assert result.throughput > 0
+
+        for image, output in zip(images, outputs):
+            saved = cv2.cvtColor(cv2.imread(str(output)), cv2.COLOR_BGR2RGB)
+            assert np.array_equal(saved, corrector.correct(image))
+
+        print(f"  吞吐量: {result.throughput:.1f} 张/秒")
+
+    print("✓ 多进程批量校正测试通过\n")
+
+
+def test_manifest_resume():
+    """测试清单记录和断点续跑"""
+    print("测试任务清单续跑...")
+
+    corrector = train_corrector('polynomial')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_images(tmp, 3)
+        model_path = os.path.join(tmp, 'model.ccm')
+        corrector.save(model_path)
+
+        inputs = expand_inputs([tmp])
+        outputs = plan_outputs(inputs, Path(tmp, 'out'))
+        manifest_path = os.path.join(tmp, 'out', 'manifest.jsonl')
+
+        with Manifest(manifest_path) as manifest:
+            run_batch(model_path, inputs[:2], outputs[:2],
+                      on_result=lambda index, item: manifest.record(item, 'camera@1'))
+
+        # 模拟中断后重新运行：只剩第 3 张未完成
+        manifest = Manifest(manifest_path)
+        done = [manifest.is_done(src, dst, 'camera@1') for src, dst in zip(inputs, outputs)]
+        assert done == [True, True, False]
+
+        # 模型变化、输出缺失、输入内容变化都需要重新处理
+        assert not manifest.is_done(inputs[0], outputs[0], 'camera@2')
+        os.remove(outputs[1])
+        assert not manifest.is_done(inputs[1], outputs[1], 'camera@1')
+        cv2.imwrite(str(inputs[0]), np.zeros((16, 16, 3), dtype=np.uint8))
+        assert not manifest.is_done(inputs[0], outputs[0], 'camera@1')
+        manifest.close()
+
+        # 不完整的最后一行被忽略
+        with open(manifest_path, 'a') as f:
+            f.write('{"input": ')
+        assert len(Manifest(manifest_path).entries) == 2
+
+    print("✓ 任务清单续跑测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("批量处理测试")
+    print("="*60 + "\n")
+
+    try:
+        test_expand_inputs()
+        test_run_batch()
+        test_manifest_resume()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+性能基准测试模块测试
+"""
+
+import sys
+import os
+import io
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.benchmark import run_benchmarks, run_startup_benchmarks, compare_to_baseline
+
+
+def test_run_benchmarks():
+    """测试基准结果结构和耗时估算跳过"""
+    print("测试运行基准...")
+
+    results = run_benchmarks([0.02], [1], methods=['polynomial', 'direct_mapping'], repeat=1,
+                             max_case_seconds=0.5, log=io.StringIO())
+
+    by_name = {r['name']: r for r in results['results']}
+    assert set(by_name) == {
+        'colorspace.rgb_to_lab', 'colorspace.lab_to_rgb', 'detector.detect', 'compare.ciede2000',
+        'train.polynomial', 'correct.polynomial', 'train.direct_mapping', 'correct.direct_mapping'
+    }
+    assert by_name['correct.polynomial']['median_seconds'] > 0
+    assert by_name['train.polynomial']['megapixels'] is None
+    assert 'numpy' in results['meta']
+    assert 'peak_bytes' not in by_name['correct.polynomial']
+
+    # 内存跟踪记录总峰值和各阶段峰值
+    traced = run_benchmarks([0.02], [1], methods=['polynomial'], repeat=1, memory=True,
+                            log=io.StringIO())
+    correct = next(r for r in traced['results'] if r['name'] == 'correct.polynomial')
+    assert correct['peak_bytes'] > 0
+    assert set(correct['stages']) == {'rgb_to_lab', 'evaluate', 'lab_to_rgb'}
+
+    # 估算耗时超过上限的用例被跳过
+    skipped = run_benchmarks([1000], [1], methods=[], repeat=1, max_case_seconds=0.001,
+                             log=io.StringIO())
+    assert all(r.get('skipped') for r in skipped['results'])
+
+    print("✓ 运行基准测试通过\n")
+
+
+def test_compare_to_baseline():
+    """测试与基线比较"""
+    print("测试基线比较...")
+
+    def result(name, seconds):
+        return {'name': name, 'megapixels': 1, 'threads': 1, 'median_seconds': seconds}
+
+    baseline = {'results': [result('a', 1.0), result('b', 1.0), result('c', 1.0)]}
+    current = {'results': [result('a', 1.05), result('b', 1.5), result('d', 1.0)]}
+
+    comparisons = compare_to_baseline(current, baseline, threshold=0.1)
+    assert [c['name'] for c in comparisons] == ['a', 'b']
+    assert [c['regression'] for c in comparisons] == [False, True]
+    assert abs(comparisons[1]['change'] - 0.5) < 1e-9
+    assert 'memory_change' not in comparisons[0]
+
+    # 峰值内存增加超过阈值同样视为退化
+    baseline['results'][0]['peak_bytes'] = 1000
+    current['results'][0]['peak_bytes'] = 1500
+    comparisons = compare_to_baseline(current, baseline, threshold=0.1)
+    assert comparisons[0]['memory_regression'] and comparisons[0]['regression']
+
+    print("✓ 基线比较测试通过\n")
+
+
+def test_startup():
+    """测试导入包和命令行工具时不加载 OpenCV、SciPy 和 scikit-learn"""
+    print("测试启动耗时...")
+
+    root = os.path.join(os.path.dirname(__file__), '..')
+    check = ("import sys, src, src.cli; from src import ColorCorrector; "
+             "print(','.join(m for m in ('cv2', 'scipy', 'sklearn') if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', check], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == ''
+
+    results = run_startup_benchmarks(repeat=1, log=io.StringIO())
+    assert [r['name'] for r in results][:2] == ['startup.python', 'startup.import_src']
+    assert all(r['median_seconds'] > 0 for r in results)
+
+    print("✓ 启动耗时测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("性能基准测试模块测试")
+    print("="*60 + "\n")
+
+    try:
+        test_run_benchmarks()
+        test_compare_to_baseline()
+        test_startup()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+颜色校正模块测试
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_corrector import ColorCorrector, METHODS
+from src.color_checker_detector import ColorCheckerDetector
+from src.color_difference import delta_e_ciede2000
+from src.color_space import ColorSpace
+from src.hooks import StageRecorder, use_hooks
+from src.model_io import deserialize_model, serialize_model
+from src.pipeline import ColorCorrectionPipeline, downscale
+from src.synthetic import expected_patch_colors, render_chart, render_scene
+
+
+def test_training_residuals():
+    """测试训练残差与逐色块校正的色差一致"""
+    print("测试训练残差...")
+
+    reference = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+    captured = expected_patch_colors('tungsten').astype(np.float32)
+
+    for method in METHODS:
+        corrector = ColorCorrector(method=method)
+        recorder = StageRecorder()
+        with use_hooks(recorder):
+            corrector.train(reference, captured)
+        # 计算残差不产生阶段事件
+        assert recorder.events == []
+
+        residuals = corrector.residuals
+        assert residuals['metric'] == 'ciede2000' and len(residuals['patch_delta_e']) == 24
+
+        patches = np.clip(np.rint(captured), 0, 255).astype(np.uint8).reshape(1, -1, 3)
+        expected = delta_e_ciede2000(ColorSpace.rgb_to_lab(reference.reshape(1, -1, 3)),
+                                     ColorSpace.rgb_to_lab(corrector.correct(patches))).reshape(-1)
+        assert np.allclose(residuals['patch_delta_e'], expected, atol=0.05), method
+        assert residuals['min_delta_e'] <= residuals['mean_delta_e'] <= residuals['max_delta_e']
+
+        # 从文件加载的模型由保存的色块颜色重新计算
+        restored = deserialize_model(serialize_model(corrector))
+        assert restored.residuals == residuals
+
+        print(f"  {method}: 平均 Delta E {residuals['mean_delta_e']:.3f}")
+
+    # 直接映射在训练色块上没有误差
+    assert corrector.residuals['max_delta_e'] < 1.0
+
+    # 混合后模型变化，残差重新计算 (完全采用恒等映射时残差即为未校正的色差)
+    corrector = ColorCorrector(method='polynomial')
+    corrector.train(reference, captured)
+    identity = ColorCorrector(method='polynomial')
+    identity.train(reference, reference)
+    corrector.blend(identity, 1.0)
+    assert corrector.residuals['mean_delta_e'] > 5.0
+
+    try:
+        ColorCorrector().training_residuals()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未训练的模型应抛出 ValueError")
+
+    print("✓ 训练残差测试通过\n")
+
+
+def test_holdout_residuals():
+    """测试留一法残差"""
+    print("测试留一法残差...")
+
+    reference = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+    captured = expected_patch_colors('tungsten').astype(np.float32)
+
+    corrector = ColorCorrector(method='direct_mapping')
+    corrector.train(reference, captured)
+    holdout = corrector.holdout_residuals()
+    assert len(holdout['patch_delta_e']) == 24
+    # 训练残差为 0 的直接映射，留出的色块只能映射到其他色块
+    assert holdout['mean_delta_e'] > corrector.residuals['mean_delta_e'] + 5
+
+    # 第一个色块的留一法残差与手动训练的结果一致
+    fold = ColorCorrector(method='polynomial')
+    fold.train(reference[1:], captured[1:])
+    patch = np.clip(np.rint(captured[:1]), 0, 255).astype(np.uint8).reshape(1, 1, 3)
+    expected = delta_e_ciede2000(ColorSpace.rgb_to_lab(reference[:1].reshape(1, 1, 3)),
+                                 ColorSpace.rgb_to_lab(fold.correct(patch))).item()
+    corrector = ColorCorrector(method='polynomial')
+    corrector.train(reference, captured)
+    assert abs(corrector.holdout_residuals()['patch_delta_e'][0] - expected) < 0.05
+
+    print("✓ 留一法残差测试通过\n")
+
+
+def test_compare_methods():
+    """测试多方法比较: 只检测一次、按留一法残差排序、管道改用最优方法"""
+    print("测试多方法比较...")
+
+    recorder = StageRecorder()
+    pipeline = ColorCorrectionPipeline(hooks=[recorder])
+    target = render_scene(48, 32, seed=4, illuminant='tungsten')
+    comparison = pipeline.compare_methods(render_chart(640, 480, illuminant='tungsten'), target)
+
+    assert comparison['status'] == 'success'
+    results = comparison['results']
+    assert [result['rank'] for result in results] == [1, 2, 3]
+    assert sorted(result['method'] for result in results) == ['direct_mapping', 'lut_3d', 'polynomial']
+    holdout = [result['holdout_delta_e'] for result in results]
+    assert holdout == sorted(holdout)
+    assert comparison['best'] == results[0]['method'] == pipeline.corrector.method
+
+    for result in results:
+        assert result['image'].shape == target.shape and result['seconds'] > 0
+        assert result['difference']['metric'] == 'ciede2000'
+        assert 'corrector' not in result
+
+    # 工作线程中的阶段同样通知管道的钩子；色卡只检测一次
+    stages = [event.stage for event in recorder.events]
+    assert stages.count('detect') == 1 and stages.count('train') == 3 and stages.count('correct') == 3
+
+    assert np.array_equal(pipeline.correct_image(target), results[0]['image'])
+
+    try:
+        pipeline.compare_methods(target, target, methods=['unknown'])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知方法应抛出 ValueError")
+
+    print("✓ 多方法比较测试通过\n")
+
+
+def test_process_info():
+    """测试处理信息包含训练残差"""
+    print("测试处理信息中的训练残差...")
+
+    pipeline = ColorCorrectionPipeline(correction_method='polynomial')
+    corrected, info = pipeline.process(render_chart(640, 480, illuminant='tungsten'),
+                                       np.full((16, 16, 3), 128, dtype=np.uint8))
+
+    assert info['status'] == 'success'
+    assert info['mean_delta_e'] == pipeline.corrector.residuals['mean_delta_e']
+    assert 0 < info['mean_delta_e'] < 10
+    assert len(info['patch_delta_e']) == 24
+
+    print("✓ 处理信息测试通过\n")
+
+
+def test_progressive():
+    """测试渐进式校正: 预览图立即可用，全分辨率结果与预览使用同一模型"""
+    print("测试渐进式校正...")
+
+    recorder = StageRecorder()
+    pipeline = ColorCorrectionPipeline(hooks=[recorder])
+    calibration = render_chart(640, 480, illuminant='tungsten')
+    target = render_scene(300, 200, seed=7, illuminant='tungsten')
+
+    progressive, info = pipeline.process_progressive(calibration, target, preview_max_side=120)
+    assert info['status'] == 'success' and len(info['patch_delta_e']) == 24
+    assert progressive.preview.shape == (80, 120, 3)
+    expected = pipeline.correct_image(target)
+
+    # 重新校准为另一模型后，未完成的全分辨率结果仍使用调用时的模型
+    pipeline.corrector = ColorCorrector(method='lut_3d')
+    pipeline.calibrate(render_chart(640, 480, illuminant='shade'))
+    assert np.array_equal(progressive.result(timeout=30), expected)
+    assert progressive.done() and progressive.corrector.method == 'polynomial'
+    assert np.array_equal(progressive.preview, progressive.corrector.correct(downscale(target, 120)))
+
+    # 后台线程中的校正同样通知管道的钩子
+    stages = [event.stage for event in recorder.events]
+    assert stages.count('preview') == 1 and stages.count('correct') == 2
+
+    # auto 方法的预览沿用全分辨率图像的方案
+    pipeline = ColorCorrectionPipeline(correction_method='auto', latency_budget=1e-6)
+    progressive, info = pipeline.process_progressive(calibration, target, preview_max_side=120)
+    assert (progressive.corrector.method, progressive.mode) == (info['plan']['method'], info['plan']['mode'])
+    assert np.array_equal(progressive.result(timeout=30), pipeline.correct_image(target))
+
+    # 小于预览尺寸的图像不缩小
+    assert downscale(target, 1024) is target
+
+    try:
+        ColorCorrectionPipeline().correct_progressive(target)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未校准的管道应抛出 ValueError")
+
+    print("✓ 渐进式校正测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("颜色校正模块测试")
+    print("="*60 + "\n")
+
+    try:
+        test_training_residuals()
+        test_holdout_residuals()
+        test_compare_methods()
+        test_process_info()
+        test_progressive()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
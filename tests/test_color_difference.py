@@ -0,0 +1,169 @@
+"""
+色差计算模块测试
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_difference import (
+    DeltaEAccumulator, compare_images, delta_e, delta_e_cie76, delta_e_cie94, delta_e_ciede2000,
+    sample_compare, stratified_sample
+)
+from src.color_space import ColorSpace
+from src.synthetic import render_scene
+
+
+# Sharma 等人发布的 CIEDE2000 测试数据 (部分)
+SHARMA_PAIRS = [
+    ((50.0, 2.6772, -79.7751), (50.0, 0.0, -82.7485), 2.0425),
+    ((50.0, 0.0, 0.0), (50.0, -1.0, 2.0), 2.3669),
+    ((50.0, 2.49, -0.001), (50.0, -2.49, 0.0011), 7.2195),
+    ((50.0, -0.001, 2.49), (50.0, 0.0009, -2.49), 4.8045),
+    ((50.0, -0.001, 2.49), (50.0, 0.0011, -2.49), 4.7461),
+    ((50.0, 2.5, 0.0), (73.0, 25.0, -18.0), 27.1492),
+    ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ((22.7233, 20.0904, -46.694), (23.0331, 14.973, -42.5619), 2.0373),
+    ((2.0776, 0.0795, -1.135), (0.9033, -0.0636, -0.5514), 0.9082),
+]
+
+
+def test_formulas():
+    """测试色差公式"""
+    print("测试色差公式...")
+
+    lab1 = np.array([pair[0] for pair in SHARMA_PAIRS])
+    lab2 = np.array([pair[1] for pair in SHARMA_PAIRS])
+    expected = np.array([pair[2] for pair in SHARMA_PAIRS])
+
+    result = delta_e_ciede2000(lab1, lab2)
+    assert result.dtype == np.float32
+    assert np.allclose(result, expected, atol=1e-3), result
+    # CIEDE2000 是对称的
+    assert np.allclose(delta_e_ciede2000(lab2, lab1), result, atol=1e-4)
+
+    assert np.allclose(delta_e_cie76(lab1, lab2), np.linalg.norm(lab1 - lab2, axis=1), atol=1e-4)
+
+    # CIE94 按定义逐项计算
+    for (L1, a1, b1), (L2, a2, b2), _ in SHARMA_PAIRS:
+        C1, C2 = np.hypot(a1, b1), np.hypot(a2, b2)
+        dH2 = max((a1 - a2) ** 2 + (b1 - b2) ** 2 - (C1 - C2) ** 2, 0)
+        value = np.sqrt((L1 - L2) ** 2 + ((C1 - C2) / (1 + 0.045 * C1)) ** 2 + dH2 / (1 + 0.015 * C1) ** 2)
+        assert abs(delta_e_cie94((L1, a1, b1), (L2, a2, b2)) - value) < 1e-3
+
+    assert np.array_equal(delta_e(lab1, lab2, 'ciede2000'), result)
+    try:
+        delta_e(lab1, lab2, 'cie2050')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知公式应抛出 ValueError")
+
+    print("✓ 色差公式测试通过\n")
+
+
+def test_accumulator():
+    """测试流式统计与一次性计算一致"""
+    print("测试流式统计...")
+
+    rng = np.random.default_rng(0)
+    values = rng.gamma(2.0, 3.0, 100000).astype(np.float32)
+
+    accumulator = DeltaEAccumulator()
+    for chunk in np.array_split(values, 7):
+        accumulator.update(chunk)
+
+    stats = accumulator.stats()
+    assert abs(stats['mean_delta_e'] - values.mean(dtype=np.float64)) < 1e-6
+    assert abs(stats['std_delta_e'] - values.std(dtype=np.float64)) < 1e-4
+    assert stats['max_delta_e'] == float(values.max()) and stats['min_delta_e'] == float(values.min())
+    for q in (50, 95, 99):
+        assert abs(stats[f'p{q}_delta_e'] - np.percentile(values, q)) <= 0.05
+
+    # 合并两个累加器等价于一起统计
+    first, second = DeltaEAccumulator(), DeltaEAccumulator()
+    first.update(values[:30000])
+    second.update(values[30000:])
+    first.merge(second)
+    assert abs(first.mean - accumulator.mean) < 1e-9 and first.count == values.size
+
+    print("✓ 流式统计测试通过\n")
+
+
+def test_compare_images():
+    """测试分块比较与整幅计算一致"""
+    print("测试分块色差统计...")
+
+    original = render_scene(97, 61, seed=5)
+    corrected = render_scene(97, 61, seed=5, illuminant='tungsten')
+
+    full = delta_e_ciede2000(ColorSpace.rgb_to_lab(original), ColorSpace.rgb_to_lab(corrected))
+    stats = compare_images(original, corrected, chunk_pixels=500)
+
+    assert stats['metric'] == 'ciede2000'
+    assert abs(stats['mean_delta_e'] - full.mean(dtype=np.float64)) < 1e-4
+    assert abs(stats['max_delta_e'] - full.max()) < 1e-4
+    assert abs(stats['p95_delta_e'] - np.percentile(full, 95)) <= 0.05
+    assert stats['pixels_improved'] == int(np.count_nonzero(full))
+
+    same = compare_images(original, original, metric='cie94')
+    assert same['max_delta_e'] == 0 and same['pixels_improved'] == 0
+
+    print("✓ 分块色差统计测试通过\n")
+
+
+def test_sample_compare():
+    """测试抽样估计与精确统计接近，置信区间覆盖精确均值"""
+    print("测试抽样色差统计...")
+
+    ys, xs = stratified_sample(300, 400, 1200, seed=1)
+    assert len(ys) == 1200 and ys.max() < 300 and xs.max() < 400
+    # 每个网格恰好一个样本
+    assert len(set(zip((ys // 10).tolist(), (xs // 10).tolist()))) == 1200
+
+    original = render_scene(640, 480, seed=6)
+    corrected = render_scene(640, 480, seed=6, illuminant='shade', noise=3)
+
+    exact = compare_images(original, corrected)
+    sampled = sample_compare(original, corrected, sample_size=5000)
+    assert sampled['sampled'] and abs(sampled['sample_size'] - 5000) < 100
+    low, high = sampled['mean_delta_e_ci']
+    assert low <= exact['mean_delta_e'] <= high
+    assert abs(sampled['p95_delta_e'] - exact['p95_delta_e']) < 1.0
+    # 相同种子结果相同
+    assert sample_compare(original, corrected, sample_size=5000) == sampled
+
+    # 像素数不超过样本数时精确计算
+    small = sample_compare(original[:40, :40], corrected[:40, :40], sample_size=5000)
+    assert not small['sampled'] and small['sample_size'] == 1600
+    assert small['mean_delta_e_ci'][0] == small['mean_delta_e']
+
+    print("✓ 抽样色差统计测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("色差计算模块测试")
+    print("="*60 + "\n")
+
+    try:
+        test_formulas()
+        test_accumulator()
+        test_compare_images()
+        test_sample_compare()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+颜色空间转换缓存测试
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_checker_detector import ColorCheckerDetector
+from src.color_corrector import ColorCorrector
+from src.color_difference import compare_images
+from src.color_space import ColorSpace
+from src.conversion_cache import ConversionCache
+from src.synthetic import expected_patch_colors, render_scene
+
+
+def test_lab_cache():
+    """测试按内容命中、结果一致和只读"""
+    print("测试 LAB 转换缓存...")
+
+    cache = ConversionCache(memory_fraction=None)
+    image = render_scene(64, 48, seed=1)
+
+    lab = cache.lab(image)
+    assert np.array_equal(lab, ColorSpace.rgb_to_lab(image))
+    assert not lab.flags.writeable
+
+    # 内容相同的另一个数组也能命中
+    assert cache.lab(image.copy()) is lab
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 原地修改后内容不同，不会误用旧结果
+    image[0, 0] = 255 - image[0, 0]
+    assert cache.lab(image) is not lab
+    assert cache.misses == 2 and len(cache) == 2 and cache.size == 2 * lab.nbytes
+
+    # 只读图像按对象记住内容键
+    frozen = render_scene(64, 48, seed=2)
+    frozen.setflags(write=False)
+    assert cache.lab(frozen) is cache.lab(frozen)
+    assert len(cache._keys) == 1
+    # 图像被回收后内容键随之删除
+    del frozen
+    assert len(cache._keys) == 0
+
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+    print("✓ LAB 转换缓存测试通过\n")
+
+
+def test_eviction():
+    """测试按字节数的 LRU 淘汰"""
+    print("测试缓存淘汰...")
+
+    images = [render_scene(32, 32, seed=seed) for seed in range(4)]
+    entry_bytes = ColorSpace.rgb_to_lab(images[0]).nbytes
+    cache = ConversionCache(max_bytes=2 * entry_bytes, memory_fraction=None)
+
+    cache.lab(images[0])
+    cache.lab(images[1])
+    cache.lab(images[0])  # 最近使用
+    cache.lab(images[2])  # 淘汰 images[1]
+    assert len(cache) == 2 and cache.size <= cache.max_bytes
+
+    misses = cache.misses
+    cache.lab(images[0])
+    assert cache.misses == misses
+    cache.lab(images[1])
+    assert cache.misses == misses + 1
+
+    # 超过上限的结果不缓存
+    cache.lab(render_scene(64, 64, seed=9))
+    assert cache.size <= cache.max_bytes
+
+    # 上限不超过可用内存的比例
+    limited = ConversionCache(max_bytes=1 << 60)
+    assert limited.limit() < 1 << 60
+
+    print("✓ 缓存淘汰测试通过\n")
+
+
+def test_correction_reuse():
+    """测试校正和色差统计复用缓存，结果与不使用缓存相同"""
+    print("测试校正复用转换结果...")
+
+    corrector = ColorCorrector(method='polynomial')
+    corrector.train(ColorCheckerDetector.STANDARD_COLORS.astype(np.float32),
+                    expected_patch_colors('tungsten').astype(np.float32))
+    image = render_scene(80, 60, seed=3, illuminant='tungsten')
+
+    cache = ConversionCache(memory_fraction=None)
+    corrected = corrector.correct(image, cache=cache)
+    assert np.array_equal(corrected, corrector.correct(image))
+    assert cache.misses == 1
+
+    stats = compare_images(image, corrected, cache=cache)
+    assert cache.hits == 1
+    expected = compare_images(image, corrected)
+    assert abs(stats['mean_delta_e'] - expected['mean_delta_e']) < 1e-4
+
+    print("✓ 校正复用转换结果测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("颜色空间转换缓存测试")
+    print("="*60 + "\n")
+
+    try:
+        test_lab_cache()
+        test_eviction()
+        test_correction_reuse()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+阶段钩子模块测试
+"""
+
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.hooks import CallbackHook, StageRecorder, add_global_hook, remove_global_hook, use_hooks
+from src.metrics import timed
+from src.pipeline import ColorCorrectionPipeline
+from src.synthetic import render_pair
+
+
+def test_pipeline_hooks():
+    """测试管道各阶段通知钩子"""
+    print("测试管道钩子...")
+
+    calibration, target = render_pair(megapixels=0.05, seed=4)
+    started = []
+    recorder = StageRecorder()
+    hook = CallbackHook(on_start=lambda stage, context: started.append(stage))
+    pipeline = ColorCorrectionPipeline(hooks=[recorder, hook])
+
+    corrected, info = pipeline.process(calibration, target)
+    assert info['status'] == 'success'
+    pipeline.compare_images(target, corrected)
+
+    stages = [event.stage for event in recorder.events]
+    # 结束顺序：内层阶段先于外层阶段
+    assert stages == ['detect', 'train', 'rgb_to_lab', 'evaluate', 'lab_to_rgb', 'correct',
+                      'process', 'compare']
+    assert started[0] == 'process' and started[-1] == 'compare'
+
+    by_stage = {event.stage: event for event in recorder.events}
+    assert by_stage['correct'].context == {
+        'method': 'polynomial', 'width': target.shape[1], 'height': target.shape[0]
+    }
+    assert by_stage['train'].context['patches'] == 24
+    assert by_stage['process'].seconds >= by_stage['correct'].seconds
+    assert set(recorder.totals()) == set(stages)
+
+    # 移除后不再通知
+    pipeline.remove_hook(recorder)
+    recorder.clear()
+    pipeline.correct_image(target)
+    assert recorder.events == []
+
+    print("✓ 管道钩子测试通过\n")
+
+
+def test_hook_scope():
+    """测试上下文钩子只对当前线程生效，全局钩子对所有线程生效"""
+    print("测试钩子作用范围...")
+
+    local, shared = StageRecorder(), StageRecorder()
+    add_global_hook(shared)
+    try:
+        with use_hooks(local, local):
+            with timed('main'):
+                pass
+            worker = threading.Thread(target=_run_stage, args=('worker',))
+            worker.start()
+            worker.join()
+    finally:
+        remove_global_hook(shared)
+
+    with timed('after'):
+        pass
+
+    assert [event.stage for event in local.events] == ['main']
+    assert sorted(event.stage for event in shared.events) == ['main', 'worker']
+
+    print("✓ 钩子作用范围测试通过\n")
+
+
+def _run_stage(stage):
+    with timed(stage):
+        pass
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("阶段钩子模块测试")
+    print("="*60 + "\n")
+
+    try:
+        test_pipeline_hooks()
+        test_hook_scope()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+性能指标模块测试
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.metrics import MetricsRegistry, timed
+
+
+def test_histogram_render():
+    """测试直方图导出为 Prometheus 文本格式"""
+    print("测试直方图导出...")
+    
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', '测试耗时', ('stage',), buckets=(0.1, 1.0))
+    
+    histogram.observe(0.05, stage='detect')
+    histogram.observe(0.5, stage='detect')
+    histogram.observe(5.0, stage='detect')
+    
+    text = registry.render()
+    print(text)
+    
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="detect",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="detect",le="1"} 2' in text
+    assert 'test_seconds_bucket{stage="detect",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="detect"} 3' in text
+    
+    print("✓ 直方图导出测试通过\n")
+
+
+def test_counter_and_gauge():
+    """测试计数器和仪表"""
+    print("测试计数器和仪表...")
+    
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', '测试计数', ('method',))
+    gauge = registry.gauge('test_depth', '测试深度')
+    
+    counter.inc(method='polynomial')
+    counter.inc(2, method='polynomial')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    
+    assert counter.get(method='polynomial') == 3
+    assert gauge.get() == 1
+    assert registry.counter('test_total', '测试计数', ('method',)) is counter
+    
+    text = registry.render()
+    assert 'test_total{method="polynomial"} 3' in text
+    assert 'test_depth 1' in text
+
+    # 标签值按 Prometheus 文本格式转义
+    counter.inc(method='a"b\\c\nd')
+    assert 'test_total{method="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+    print("✓ 计数器和仪表测试通过\n")
+
+
+def test_timed_context():
+    """测试阶段计时上下文"""
+    print("测试阶段计时...")
+    
+    registry = MetricsRegistry()
+    histogram = registry.histogram('stage_seconds', '阶段耗时', ('stage',))
+    
+    with timed('train', histogram=histogram):
+        sum(range(1000))
+    
+    total, count = histogram.get(stage='train')
+    assert count == 1
+    assert total >= 0
+    
+    print("✓ 阶段计时测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("性能指标测试")
+    print("="*60 + "\n")
+    
+    try:
+        test_histogram_render()
+        test_counter_and_gauge()
+        test_timed_context()
+        
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+        
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+校正模型序列化测试
+"""
+
+import sys
+import os
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from helpers import train_corrector
+from src.color_corrector import ColorCorrector, METHODS
+from src.model_io import (
+    serialize_model, deserialize_model, load_model, bake_lut,
+    format_cube, parse_cube, export_cube, load_cube
+)
+
+
+def test_binary_roundtrip():
+    """测试二进制格式往返"""
+    print("测试二进制格式往返...")
+    
+    np.random.seed(0)
+    image = np.random.randint(0, 256, (8, 8, 3), dtype=np.uint8)
+    
+    for method in METHODS:
+        corrector = train_corrector(method)
+        expected = corrector.correct(image)
+        
+        data = serialize_model(corrector, metadata={'camera': 'test'})
+        restored = deserialize_model(data)
+        assert restored.method == method
+        assert restored.metadata == {'camera': 'test'}
+        assert np.array_equal(restored.correct(image), expected)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model.ccm')
+            corrector.save(path)
+            for mmap in (True, False):
+                loaded = ColorCorrector.load(path, mmap=mmap)
+                assert np.array_equal(loaded.correct(image), expected)
+            
+            assert isinstance(load_model(path).captured_colors, np.memmap)
+        
+        print(f"  {method}: {len(data)} 字节")
+    
+    print("✓ 二进制格式往返测试通过\n")
+
+
+def test_invalid_model():
+    """测试无效文件的错误处理"""
+    print("测试无效模型文件...")
+    
+    try:
+        deserialize_model(b'not a model file')
+    except ValueError as e:
+        print(f"  预期错误: {e}")
+    else:
+        raise AssertionError("无效数据应抛出 ValueError")
+    
+    try:
+        ColorCorrector('polynomial').save(os.devnull)
+    except ValueError as e:
+        print(f"  预期错误: {e}")
+    else:
+        raise AssertionError("未训练模型应抛出 ValueError")
+    
+    print("✓ 无效模型文件测试通过\n")
+
+
+def test_cube_roundtrip():
+    """测试 .cube 导出和导入"""
+    print("测试 .cube 导出和导入...")
+    
+    corrector = train_corrector('polynomial')
+    lut = bake_lut(corrector, size=9)
+    assert lut.shape == (9, 9, 9, 3)
+    
+    text = format_cube(lut, title='test')
+    assert 'LUT_3D_SIZE 9' in text
+    
+    parsed, title = parse_cube(text)
+    assert title == 'test'
+    assert np.allclose(parsed, lut, atol=1e-6)
+    
+    # .cube 中红色通道变化最快
+    first_rows = [line for line in text.splitlines() if line[0].isdigit()][:2]
+    assert first_rows[0].split()[1:] == first_rows[1].split()[1:]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.cube')
+        export_cube(corrector, path, size=17)
+        lut_corrector = load_cube(path)
+        
+        np.random.seed(1)
+        image = np.random.randint(0, 256, (6, 6, 3), dtype=np.uint8)
+        error = np.abs(lut_corrector.correct(image).astype(np.float32) -
+                       corrector.correct(image).astype(np.float32))
+        print(f"  LUT 近似最大误差: {error.max():.1f}")
+        assert error.mean() < 5
+    
+    print("✓ .cube 导出和导入测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("校正模型序列化测试")
+    print("="*60 + "\n")
+    
+    try:
+        test_binary_roundtrip()
+        test_invalid_model()
+        test_cube_roundtrip()
+        
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+        
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+校正方案选择测试
+"""
+
+import sys
+import os
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_checker_detector import ColorCheckerDetector
+from src.color_corrector import ColorCorrector, METHODS, _apply_lut
+from src.model_io import bake_lut
+from src.planner import CostModel, select_plan
+from src.synthetic import expected_patch_colors, render_scene
+from helpers import train_corrector
+
+
+def test_cost_model():
+    """测试由基准测试结果拟合代价模型及保存加载"""
+    print("测试代价模型...")
+
+    results = {'results': [
+        {'name': 'correct.polynomial', 'threads': 1, 'megapixels': size,
+         'median_seconds': 0.01 + 0.5 * size}
+        for size in (0.25, 1.0, 4.0)
+    ] + [
+        {'name': 'correct.polynomial.baked', 'threads': 1, 'megapixels': size,
+         'median_seconds': 0.2 * size}
+        for size in (0.25, 1.0)
+    ] + [
+        {'name': 'correct.lut_3d', 'threads': 2, 'megapixels': 1.0, 'median_seconds': 9.0},
+        {'name': 'detect', 'threads': 1, 'megapixels': 0.3, 'median_seconds': 1.0},
+    ]}
+
+    model = CostModel.from_benchmark(results, threads=1)
+    assert set(model.coefficients) == {'polynomial.dense', 'polynomial.baked'}
+    fixed, per_megapixel = model.coefficients['polynomial.dense']
+    assert abs(fixed - 0.01) < 1e-6 and abs(per_megapixel - 0.5) < 1e-6
+    assert abs(model.predict('polynomial', 'baked', 2_000_000) - 0.4) < 1e-6
+    assert model.predict('lut_3d', 'dense', 1_000_000) is None
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cost_model.json')
+        model.save(path)
+        loaded = CostModel.load(path)
+    assert loaded.coefficients == model.coefficients and loaded.source == model.source
+
+    try:
+        CostModel.from_benchmark({'results': []})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("没有校正用例时应抛出 ValueError")
+
+    print("✓ 代价模型测试通过\n")
+
+
+def test_select_plan():
+    """测试预算内选最准确的方案，预算不足时选最快的方案"""
+    print("测试方案选择...")
+
+    model = CostModel({'a.dense': (0.0, 1.0), 'a.baked': (0.0, 0.2), 'b.dense': (0.0, 0.5)})
+    accuracy = {('a', 'dense'): 1.0, ('a', 'baked'): 1.5, ('b', 'dense'): 3.0, ('c', 'dense'): 0.1}
+
+    # 不限预算: 最准确的方案 (没有代价的方案不参与选择)
+    plan = select_plan(accuracy, 1_000_000, None, model)
+    assert (plan.method, plan.mode) == ('a', 'dense') and plan.within_budget
+
+    # 预算只够烘焙 LUT 和 b
+    plan = select_plan(accuracy, 1_000_000, 0.6, model)
+    assert (plan.method, plan.mode) == ('a', 'baked') and plan.within_budget
+
+    # 没有方案满足预算: 最快的方案
+    plan = select_plan(accuracy, 1_000_000, 0.01, model)
+    assert (plan.method, plan.mode) == ('a', 'baked') and not plan.within_budget
+    assert abs(plan.to_dict()['predicted_seconds'] - 0.2) < 1e-9
+
+    print("✓ 方案选择测试通过\n")
+
+
+def test_modes():
+    """测试各执行方式的结果: 分块与整幅一致，烘焙 LUT 接近直接计算"""
+    print("测试执行方式...")
+
+    image = render_scene(96, 64, seed=5, illuminant='tungsten')
+
+    for method in METHODS:
+        corrector = train_corrector(method)
+        corrector.workers = 2
+        dense = corrector.correct(image)
+        for mode in ('tiled', 'threaded'):
+            assert np.array_equal(corrector.correct(image, mode=mode), dense), (method, mode)
+
+    corrector = train_corrector('polynomial')
+    baked = corrector.correct(image, mode='baked')
+    difference = np.abs(baked.astype(np.int16) - corrector.correct(image).astype(np.int16))
+    assert difference.mean() < 1.0
+    assert 0 < corrector.baked_lut_error() < 1.0
+
+    # LUT 最大值落在最后一个采样点上
+    lut = np.zeros((3, 3, 3, 3), dtype=np.float32)
+    lut[2, 2, 2] = 200
+    assert _apply_lut(lut, np.full((1, 1, 3), 255, dtype=np.uint8))[0, 0].tolist() == [200] * 3
+
+    try:
+        corrector.correct(image, mode='unknown')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知执行方式应抛出 ValueError")
+
+    print("✓ 执行方式测试通过\n")
+
+
+def test_auto_method():
+    """测试 auto 方法按预算选择方案"""
+    print("测试 auto 方法...")
+
+    model = CostModel({'polynomial.dense': (0.0, 1.0), 'polynomial.baked': (0.0, 0.1),
+                       'lut_3d.dense': (0.0, 0.5), 'direct_mapping.dense': (0.0, 0.5)})
+    image = render_scene(100, 100, seed=6, illuminant='tungsten')
+
+    corrector = ColorCorrector(method='auto', cost_model=model)
+    corrector.train(ColorCheckerDetector.STANDARD_COLORS.astype(np.float32),
+                    expected_patch_colors('tungsten').astype(np.float32))
+    accuracy = corrector.correction_model['accuracy']
+    assert accuracy[('polynomial', 'baked')] > accuracy[('polynomial', 'dense')]
+
+    # 不限预算时选择留一法残差最小的方法
+    plan = corrector.plan(100, 100)
+    assert plan.mode == 'dense'
+    assert plan.holdout_delta_e == min(accuracy[(method, 'dense')]
+                                       for method in METHODS)
+
+    # 预算只够烘焙 LUT (1 万像素: dense 0.01 秒，baked 0.001 秒)
+    corrector.latency_budget = 0.002
+    corrector._plans.clear()
+    plan = corrector.plan(100, 100)
+    assert (plan.method, plan.mode) == ('polynomial', 'baked') and plan.within_budget
+    expected = corrector.correction_model['candidates']['polynomial'].correct(image, mode='baked')
+    assert np.array_equal(corrector.correct(image), expected)
+
+    # LUT 网格的像素数与目标图像不同，auto 方法不能直接烘焙
+    try:
+        bake_lut(corrector, size=9)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("auto 方法烘焙 LUT 应抛出 ValueError")
+
+    try:
+        ColorCorrector(method='unknown').train(np.zeros((24, 3)), np.zeros((24, 3)))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知方法应抛出 ValueError")
+
+    print("✓ auto 方法测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("校正方案选择测试")
+    print("="*60 + "\n")
+
+    try:
+        test_cost_model()
+        test_select_plan()
+        test_modes()
+        test_auto_method()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
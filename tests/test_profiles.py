@@ -0,0 +1,113 @@
+"""
+校准配置注册表测试
+"""
+
+import sys
+import os
+import copy
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from helpers import train_corrector
+from src.pipeline import ColorCorrectionPipeline
+from src.profiles import ProfileRegistry
+from src.synthetic import render_chart
+
+
+def test_save_and_load():
+    """测试保存、缓存和重新加载"""
+    print("测试配置保存和加载...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ProfileRegistry(tmp, cache_size=2)
+        registry.save('camera_a', train_corrector('polynomial'), {'lighting': 'D65'})
+        
+        first = registry.load('camera_a')
+        assert registry.load('camera_a') is first  # 命中内存缓存
+        assert first.metadata['lighting'] == 'D65'
+        assert first.metadata['method'] == 'polynomial'
+        
+        # 重新保存后自动重新加载
+        registry.save('camera_a', train_corrector('direct_mapping'))
+        assert registry.load('camera_a').method == 'direct_mapping'
+        
+        # LRU 淘汰
+        registry.save('camera_b', train_corrector('polynomial', 0.9))
+        registry.save('camera_c', train_corrector('polynomial', 0.8))
+        for name in ('camera_a', 'camera_b', 'camera_c'):
+            registry.load(name)
+        assert len(registry._cache) == 2
+        
+        names = [profile['name'] for profile in registry.list()]
+        assert names == ['camera_a', 'camera_b', 'camera_c']
+        
+        registry.delete('camera_b')
+        assert not registry.exists('camera_b')
+    
+    print("✓ 配置保存和加载测试通过\n")
+
+
+def test_pipeline_from_profile():
+    """测试管道使用配置时跳过校准"""
+    print("测试管道加载配置...")
+    
+    np.random.seed(0)
+    image = np.random.randint(0, 256, (8, 8, 3), dtype=np.uint8)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ProfileRegistry(tmp)
+        corrector = train_corrector('polynomial')
+        registry.save('camera_a', corrector)
+        
+        pipeline = ColorCorrectionPipeline.from_profile('camera_a', registry)
+        assert pipeline.is_trained
+        assert np.array_equal(pipeline.correct_image(image), corrector.correct(image))
+        
+        # 重新校准和混合只改变管道的副本，注册表缓存的校正器保持为保存的配置
+        previous = copy.copy(pipeline.corrector)
+        assert pipeline.calibrate(render_chart(640, 480, illuminant='shade'))
+        pipeline.corrector.blend(previous, 0.5)
+        assert not np.array_equal(pipeline.correct_image(image), corrector.correct(image))
+        assert np.array_equal(registry.load('camera_a').correct(image), corrector.correct(image))
+        
+        try:
+            ColorCorrectionPipeline.from_profile('missing', registry)
+        except KeyError:
+            pass
+        else:
+            raise AssertionError("不存在的配置应抛出 KeyError")
+        
+        try:
+            registry.path('../escape')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("无效名称应抛出 ValueError")
+    
+    print("✓ 管道加载配置测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("校准配置注册表测试")
+    print("="*60 + "\n")
+    
+    try:
+        test_save_and_load()
+        test_pipeline_from_profile()
+        
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+        
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+内存分析模块测试
+"""
+
+import sys
+import os
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.metrics import timed
+from src.pipeline import ColorCorrectionPipeline
+from src.profiling import MemoryProfiler
+from src.synthetic import render_pair
+
+
+def test_nested_stages():
+    """测试嵌套阶段的峰值统计"""
+    print("测试嵌套阶段峰值...")
+
+    profiler = MemoryProfiler()
+    with profiler.activate():
+        with timed('outer'):
+            with timed('inner'):
+                block = np.ones(1 << 20, dtype=np.uint8)
+                del block
+            # 外层阶段之后的较小分配不会覆盖内层的峰值
+            small = np.ones(1 << 10, dtype=np.uint8)
+            del small
+
+    report = profiler.report()
+    assert list(report) == ['inner', 'outer']
+    assert report['inner']['calls'] == 1
+    assert report['inner']['peak_bytes'] >= 1 << 20
+    assert report['outer']['peak_bytes'] >= report['inner']['peak_bytes']
+    assert profiler.peak_bytes >= report['outer']['peak_bytes']
+    assert not tracemalloc.is_tracing()
+
+    # 未激活时不记录
+    with timed('outer'):
+        pass
+    assert profiler.report()['outer']['calls'] == 1
+
+    print("✓ 嵌套阶段峰值测试通过\n")
+
+
+def test_without_reset_peak():
+    """测试没有 tracemalloc.reset_peak 时 (Python 3.8) 重新开始跟踪的回退"""
+    print("测试 reset_peak 回退...")
+
+    reset_peak = getattr(tracemalloc, 'reset_peak', None)
+    if reset_peak is not None:
+        del tracemalloc.reset_peak
+    try:
+        profiler = MemoryProfiler()
+        with profiler.activate():
+            with timed('outer'):
+                with timed('inner'):
+                    block = np.ones(1 << 20, dtype=np.uint8)
+                    del block
+    finally:
+        if reset_peak is not None:
+            tracemalloc.reset_peak = reset_peak
+
+    report = profiler.report()
+    assert report['inner']['peak_bytes'] >= 1 << 20
+    assert report['outer']['peak_bytes'] >= report['inner']['peak_bytes']
+    assert profiler.peak_bytes >= report['outer']['peak_bytes']
+    assert not tracemalloc.is_tracing()
+
+    print("✓ reset_peak 回退测试通过\n")
+
+
+def test_pipeline_profiling():
+    """测试管道内存分析模式"""
+    print("测试管道内存分析...")
+
+    calibration, target = render_pair(megapixels=0.1, seed=3)
+    pipeline = ColorCorrectionPipeline(memory_profiling=True)
+    corrected, info = pipeline.process(calibration, target)
+    assert info['status'] == 'success'
+
+    report = pipeline.profiler.report()
+    for stage in ('detect', 'train', 'correct', 'rgb_to_lab', 'evaluate', 'lab_to_rgb'):
+        assert stage in report, stage
+        assert report[stage]['calls'] == 1
+    # LAB 转换至少分配一幅 float32 的 LAB 图像
+    assert report['rgb_to_lab']['peak_bytes'] >= target.size * 4
+    assert report['correct']['peak_bytes'] >= report['lab_to_rgb']['peak_bytes']
+
+    text = pipeline.profiler.format_report()
+    assert 'lab_to_rgb' in text
+    print(text)
+
+    # 关闭分析时没有分析器
+    assert ColorCorrectionPipeline().profiler is None
+
+    print("✓ 管道内存分析测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("内存分析模块测试")
+    print("="*60 + "\n")
+
+    try:
+        test_nested_stages()
+        test_without_reset_peak()
+        test_pipeline_profiling()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
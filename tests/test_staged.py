@@ -0,0 +1,106 @@
+"""
+分阶段处理管道测试
+"""
+
+import sys
+import os
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_corrector import ColorCorrector
+from src.color_checker_detector import ColorCheckerDetector
+from src.pipeline import ColorCorrectionPipeline
+from src.staged import StagedPipeline
+
+
+def create_pipeline():
+    """用模拟色偏的色卡颜色训练管道"""
+    reference = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+    captured = np.clip(reference * np.array([1.1, 0.9, 0.95]) + 5, 0, 255)
+    corrector = ColorCorrector(method='polynomial')
+    corrector.train(reference, captured)
+    return ColorCorrectionPipeline.from_corrector(corrector)
+
+
+def make_image(seed):
+    return np.random.RandomState(seed).randint(0, 256, (8, 8, 3), dtype=np.uint8)
+
+
+def test_ordering_and_errors():
+    """测试乱序完成时仍按输入顺序返回，失败任务不影响其他任务"""
+    print("测试结果顺序和错误处理...")
+
+    pipeline = create_pipeline()
+
+    def decoder(seed):
+        if seed == 3:
+            raise ValueError("损坏的图像")
+        time.sleep(0.001 * (seed % 4))
+        return make_image(seed)
+
+    staged = StagedPipeline(pipeline, decode_workers=3, correct_workers=2, encode_workers=2,
+                            queue_size=2, decoder=decoder, encoder=lambda image, dst: image)
+    results = staged.process((seed, None) for seed in range(20))
+
+    assert [item.index for item in results] == list(range(20))
+    assert not results[3].success and '损坏' in results[3].error
+    for item in results:
+        if item.success:
+            assert np.array_equal(item.result, pipeline.correct_image(make_image(item.source)))
+    assert staged.processed == 20
+
+    # 提前结束迭代不会挂起
+    for item in staged.run((seed, None) for seed in range(100)):
+        break
+
+    print("✓ 结果顺序和错误处理测试通过\n")
+
+
+def test_stages_overlap():
+    """测试各阶段重叠执行，总耗时接近最慢阶段"""
+    print("测试阶段重叠...")
+
+    delay, count = 0.02, 10
+
+    def decoder(seed):
+        time.sleep(delay)
+        return make_image(seed)
+
+    def encoder(image, destination):
+        time.sleep(delay)
+        return destination
+
+    staged = StagedPipeline(create_pipeline(), decoder=decoder, encoder=encoder)
+    staged.process((seed, seed) for seed in range(count))
+
+    sequential = 2 * delay * count
+    print(f"  耗时: {staged.elapsed:.3f}s (顺序执行约 {sequential:.3f}s)，瓶颈: {staged.bottleneck}")
+    assert staged.elapsed < sequential * 0.8
+
+    print("✓ 阶段重叠测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("分阶段处理管道测试")
+    print("="*60 + "\n")
+
+    try:
+        test_ordering_and_errors()
+        test_stages_overlap()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+原始帧流处理测试
+"""
+
+import sys
+import os
+import io
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_corrector import ColorCorrector
+from src.color_checker_detector import ColorCheckerDetector
+from src.pipeline import ColorCorrectionPipeline
+from src.stream import FrameStreamer, parse_frame_size
+from src.synthetic import render_chart
+
+
+def create_pipeline():
+    """用模拟色偏的色卡颜色训练管道"""
+    reference = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+    captured = np.clip(reference * np.array([1.1, 0.9, 0.95]) + 5, 0, 255)
+    corrector = ColorCorrector(method='polynomial')
+    corrector.train(reference, captured)
+    return ColorCorrectionPipeline.from_corrector(corrector)
+
+
+def make_frames(count, width=16, height=8):
+    np.random.seed(0)
+    return [np.random.randint(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def test_correct_stream():
+    """测试帧迭代接口：定期重新校准、参数平滑、输出缓冲区复用"""
+    print("测试帧迭代校正...")
+
+    frames = ([render_chart(seed=0, illuminant='tungsten')] * 2 +
+              [render_chart(seed=0, illuminant='shade')] * 2)
+
+    expected = []
+    for frame in (frames[0], frames[2]):
+        single = ColorCorrectionPipeline()
+        assert single.calibrate(frame)
+        expected.append(single.corrector.correction_model)
+
+    pipeline = ColorCorrectionPipeline()
+    stats = {}
+    outputs = []
+    for output in pipeline.correct_stream(frames, calibrate_every=2, smoothing=0.25,
+                                          buffers=2, stats=stats):
+        outputs.append(output)
+        # 返回的帧就是当前模型的校正结果
+        assert np.array_equal(output, pipeline.correct_image(frames[len(outputs) - 1]))
+
+    assert stats == {'frames': 4, 'corrected': 4, 'calibrations': 2}
+    # 输出缓冲区循环复用
+    assert outputs[0] is outputs[2] and outputs[1] is outputs[3] and outputs[0] is not outputs[1]
+
+    coef = pipeline.corrector.correction_model['coef']
+    assert np.allclose(coef, 0.75 * expected[1]['coef'] + 0.25 * expected[0]['coef'])
+
+    out = np.empty_like(frames[0])
+    assert pipeline.correct_image(frames[0], out=out) is out
+
+    print("✓ 帧迭代校正测试通过\n")
+
+
+def test_stream_roundtrip():
+    """测试逐帧校正结果和顺序"""
+    print("测试帧流校正...")
+
+    assert parse_frame_size('1920x1080') == (1920, 1080)
+
+    pipeline = create_pipeline()
+    frames = make_frames(7)
+    # 末尾附带不完整的一帧，应被丢弃
+    instream = io.BytesIO(b''.join(f.tobytes() for f in frames) + b'\x00' * 10)
+    outstream = io.BytesIO()
+
+    log = io.StringIO()
+    stats = FrameStreamer(pipeline, 16, 8, log=log).run(instream, outstream)
+
+    assert stats.frames == 7 and stats.corrected == 7
+    assert '不完整' in log.getvalue()
+
+    output = np.frombuffer(outstream.getvalue(), dtype=np.uint8).reshape(7, 8, 16, 3)
+    for frame, corrected in zip(frames, output):
+        assert np.array_equal(corrected, pipeline.correct_image(frame))
+
+    print(f"  {stats.fps:.1f} fps")
+    print("✓ 帧流校正测试通过\n")
+
+
+def test_stream_uncalibrated():
+    """测试未校准且重新校准失败时帧原样输出"""
+    print("测试未校准帧流...")
+
+    pipeline = ColorCorrectionPipeline()
+    try:
+        FrameStreamer(pipeline, 16, 8)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未校准且不重新校准时应抛出 ValueError")
+
+    frames = make_frames(3)
+    outstream = io.BytesIO()
+    stats = FrameStreamer(pipeline, 16, 8, recalibrate_interval=2, log=io.StringIO()).run(
+        io.BytesIO(b''.join(f.tobytes() for f in frames)), outstream)
+
+    assert stats.frames == 3 and stats.corrected == 0
+    assert outstream.getvalue() == b''.join(f.tobytes() for f in frames)
+
+    print("✓ 未校准帧流测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("原始帧流处理测试")
+    print("="*60 + "\n")
+
+    try:
+        test_correct_stream()
+        test_stream_roundtrip()
+        test_stream_uncalibrated()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
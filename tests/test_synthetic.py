@@ -0,0 +1,87 @@
+"""
+合成测试图像生成测试
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_checker_detector import ColorCheckerDetector
+from src.synthetic import (
+    image_size, render_chart, render_scene, render_pair, expected_patch_colors
+)
+
+
+def test_deterministic():
+    """测试相同种子生成相同图像"""
+    print("测试确定性生成...")
+
+    assert image_size(12) == (4000, 3000)
+
+    first = render_chart(320, 240, seed=7, rotation=5, perspective=0.05, noise=3)
+    assert first.shape == (240, 320, 3) and first.dtype == np.uint8
+    assert np.array_equal(first, render_chart(320, 240, seed=7, rotation=5, perspective=0.05, noise=3))
+    assert not np.array_equal(first, render_chart(320, 240, seed=8, rotation=5, perspective=0.05, noise=3))
+
+    scene = render_scene(320, 240, seed=7, noise=3)
+    assert np.array_equal(scene, render_scene(320, 240, seed=7, noise=3))
+
+    calibration, target = render_pair(0.05, seed=1)
+    assert calibration.shape == target.shape
+
+    print("✓ 确定性生成测试通过\n")
+
+
+def test_detection_accuracy():
+    """测试不同姿态和光源下色卡都能被检测，且颜色接近真值"""
+    print("测试合成色卡检测...")
+
+    detector = ColorCheckerDetector()
+    cases = [
+        {},
+        {'rotation': 12, 'perspective': 0.05, 'noise': 3},
+        {'illuminant': 'tungsten', 'background': 'texture', 'noise': 5},
+        {'illuminant': (1.1, 1.0, 0.9), 'rotation': -20, 'scale': 0.4},
+    ]
+
+    for options in cases:
+        result = detector.detect(render_chart(800, 600, seed=3, **options))
+        assert result['detected']
+
+        captured = np.array([patch['color'] for patch in result['patches']], dtype=np.float32)
+        expected = expected_patch_colors(options.get('illuminant', 'd65'))
+        error = np.abs(captured - expected).mean()
+        print(f"  {options}: 平均误差 {error:.1f}")
+        assert error < 12
+
+    # 色偏改变色卡颜色
+    assert not np.array_equal(expected_patch_colors('tungsten'), ColorCheckerDetector.STANDARD_COLORS)
+    assert np.array_equal(expected_patch_colors('d65'), ColorCheckerDetector.STANDARD_COLORS)
+
+    print("✓ 合成色卡检测测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("合成测试图像生成测试")
+    print("="*60 + "\n")
+
+    try:
+        test_deterministic()
+        test_detection_accuracy()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+服务预热测试
+"""
+
+import sys
+import os
+import io
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.color_corrector import ColorCorrector, METHODS
+from src.color_checker_detector import ColorCheckerDetector
+from src.profiles import ProfileRegistry
+from src.warmup import warm_up
+
+
+def test_warm_up():
+    """测试预热步骤、配置加载和错误记录"""
+    print("测试服务预热...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ProfileRegistry(tmp)
+        reference = ColorCheckerDetector.STANDARD_COLORS.astype(np.float32)
+        corrector = ColorCorrector(method='direct_mapping')
+        corrector.train(reference, np.clip(reference * 1.1, 0, 255))
+        registry.save('camera_a', corrector)
+
+        log = io.StringIO()
+        report = warm_up(registry, log=log)
+
+        assert report.success, report.errors
+        assert report.profiles == ['camera_a']
+        assert set(report.steps) == {'imports', 'conversions', 'detector', 'profiles'} | {
+            f'method.{method}' for method in METHODS
+        }
+        assert report.seconds >= sum(report.steps.values()) * 0.99
+        assert '预热完成' in log.getvalue()
+
+        status = report.to_dict()
+        assert status['success'] and status['finished_at'] is not None
+
+    # 单个步骤失败不影响其他步骤
+    report = warm_up(methods=['unknown'], log=io.StringIO())
+    assert not report.success
+    assert report.errors[0].startswith('method.unknown')
+    assert 'detector' in report.steps and 'profiles' not in report.steps
+
+    print("✓ 服务预热测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("服务预热测试")
+    print("="*60 + "\n")
+
+    try:
+        test_warm_up()
+
+        print("="*60)
+        print("所有测试通过！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()